@@ -1,9 +1,26 @@
-from .main_agent import TravelAgent
+import importlib
 
-from .fallback_agent import FallbackAgent
+# Submodules are imported on first attribute access so that importing the
+# package (e.g. from app.py) doesn't pull in LangChain until an agent is needed.
+_EXPORTS = {
+    "TravelAgent": ".main_agent",
+    "FallbackAgent": ".fallback_agent",
+    "TravelPlanningWorkflow": ".workflow",
+    "BatchQueryRunner": ".batch_runner",
+    "TravelAgentServer": ".server",
+    "ModelRouter": ".router",
+    "create_primary_agent": ".router",
+    "AgentWorkerPool": ".worker_pool",
+}
 
-from .workflow import TravelPlanningWorkflow
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
 
 
 
-__all__ = ["TravelAgent", "FallbackAgent", "TravelPlanningWorkflow"]
\ No newline at end of file
+__all__ = ["TravelAgent", "FallbackAgent", "TravelPlanningWorkflow", "BatchQueryRunner", "TravelAgentServer",
+           "ModelRouter", "create_primary_agent", "AgentWorkerPool"]
\ No newline at end of file
@@ -0,0 +1,74 @@
+import asyncio
+
+from config import Config
+from .rate_limiter import BATCH, set_llm_priority
+
+
+class BatchQueryRunner:
+    """Run many queries concurrently through a FallbackAgent."""
+
+    def __init__(self, agent, concurrency=None, timeout=None):
+        """
+        Initialize the batch runner.
+        Args:
+            agent (FallbackAgent): Agent exposing `arun_with_fallback`
+            concurrency (int): Maximum number of queries in flight (defaults to Config.BATCH_CONCURRENCY)
+            timeout (float): Per-query timeout in seconds (defaults to Config.BATCH_QUERY_TIMEOUT)
+        """
+        self.agent = agent
+        self.concurrency = max(1, concurrency or Config.BATCH_CONCURRENCY)
+        self.timeout = timeout if timeout is not None else Config.BATCH_QUERY_TIMEOUT
+
+    async def _run_one(self, index, query, semaphore):
+        """Run a single query under the concurrency limit."""
+        # Runs in its own task, so this only lowers the priority of this query's LLM calls
+        set_llm_priority(BATCH)
+        async with semaphore:
+            try:
+                response = await asyncio.wait_for(
+                    self.agent.arun_with_fallback(query),
+                    timeout=self.timeout or None
+                )
+            except asyncio.TimeoutError:
+                response = f"Query timed out after {self.timeout}s. Please try again later."
+            except Exception as e:
+                response = f"I apologize, but this query failed: {str(e)}"
+        return index, response
+
+    async def stream(self, queries):
+        """
+        Run queries concurrently and yield results as they complete.
+        Args:
+            queries (list): Queries to run
+        Yields:
+            tuple: (index, response) where index is the query's position in `queries`
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tasks = [
+            asyncio.ensure_future(self._run_one(index, query, semaphore))
+            for index, query in enumerate(queries)
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Consumer stopped early: don't leave queries running in the background
+            for task in tasks:
+                task.cancel()
+
+    async def arun(self, queries):
+        """
+        Run queries concurrently.
+        Args:
+            queries (list): Queries to run
+        Returns:
+            list: Responses in the same order as `queries`
+        """
+        results = [None] * len(queries)
+        async for index, response in self.stream(queries):
+            results[index] = response
+        return results
+
+    def run(self, queries):
+        """Blocking wrapper around `arun`."""
+        return asyncio.run(self.arun(queries))
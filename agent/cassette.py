@@ -0,0 +1,429 @@
+"""
+Record and replay LLM and tool calls.
+
+Calls are stored in a cassette: a directory holding an append-only JSON-lines
+file of records and an index of (key, offset, length) entries, so any record
+is one dict lookup and one positioned read away. Keys are hashes of the
+request content (model, settings, messages and tool schemas for LLM calls;
+tool name and arguments for tool calls), so identical requests share one
+record and a cassette recorded on one machine replays on another.
+
+Modes:
+    record  call the live backends and store each new request/response
+    replay  answer only from the cassette; a request never seen raises CassetteMiss
+    auto    replay what was recorded, record the rest
+
+Replays wait the recorded latency times `latency_scale` (0 replays instantly),
+which makes it possible to re-run production traffic offline at any speed.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessageChunk, message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.pydantic_v1 import PrivateAttr
+from langchain_core.tools import ToolException
+
+from config import Config
+from tools.results import ToolResult, from_dict
+from .llm import create_groq_model, get_chat_model_factory, set_chat_model_factory
+from .metrics import metrics
+
+RECORD, REPLAY, AUTO = "record", "replay", "auto"
+MODES = (RECORD, REPLAY, AUTO)
+
+
+class CassetteMiss(Exception):
+    """Raised in replay mode for a request the cassette has no record of."""
+
+
+def request_key(*parts) -> str:
+    """Content address of a request."""
+    payload = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+class Cassette:
+    """Append-only, content-addressed store of recorded calls with an O(1) index."""
+
+    DATA_FILE = "calls.jsonl"
+    INDEX_FILE = "index.tsv"
+
+    def __init__(self, path):
+        """
+        Open (or create) a cassette.
+        Args:
+            path (str): Cassette directory
+        """
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self._data_path = os.path.join(path, self.DATA_FILE)
+        self._index_path = os.path.join(path, self.INDEX_FILE)
+        self._index = {}
+        self._lock = threading.Lock()
+        self._open()
+
+    def _open(self):
+        open(self._data_path, "ab").close()
+        indexed_end = 0
+        if os.path.exists(self._index_path):
+            with open(self._index_path, encoding="utf-8") as f:
+                for line in f:
+                    fields = line.rstrip("\n").split("\t")
+                    if len(fields) == 3:
+                        key, offset, length = fields[0], int(fields[1]), int(fields[2])
+                        self._index[key] = (offset, length)
+                        indexed_end = max(indexed_end, offset + length)
+
+        self._data = open(self._data_path, "r+b")
+        self._index_file = open(self._index_path, "a", encoding="utf-8")
+        size = self._data.seek(0, os.SEEK_END)
+        if indexed_end < size:
+            # Records appended after the index was last written (e.g. a crash in between)
+            self._data.seek(indexed_end)
+            offset = indexed_end
+            for line in self._data:
+                if not line.endswith(b"\n"):
+                    break
+                key = json.loads(line)["key"]
+                if key not in self._index:
+                    self._index[key] = (offset, len(line))
+                    self._index_file.write(f"{key}\t{offset}\t{len(line)}\n")
+                offset += len(line)
+            # Drop a half-written last record so the next append starts on a fresh line
+            self._data.truncate(offset)
+            self._data.seek(offset)
+            self._index_file.flush()
+        self._reader = os.open(self._data_path, os.O_RDONLY)
+
+    def get(self, key):
+        """The record stored under `key`, or None."""
+        entry = self._index.get(key)
+        if entry is None:
+            return None
+        offset, length = entry
+        return json.loads(os.pread(self._reader, length, offset))
+
+    def put(self, key, record):
+        """Append `record` under `key`. Returns False if the key was already recorded."""
+        line = (json.dumps({"key": key, **record}, separators=(",", ":"), default=str) + "\n").encode("utf-8")
+        with self._lock:
+            if key in self._index:
+                return False
+            offset = self._data.seek(0, os.SEEK_END)
+            self._data.write(line)
+            self._data.flush()
+            self._index_file.write(f"{key}\t{offset}\t{len(line)}\n")
+            self._index_file.flush()
+            self._index[key] = (offset, len(line))
+        return True
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    def close(self):
+        with self._lock:
+            self._data.close()
+            self._index_file.close()
+            os.close(self._reader)
+
+
+class Recorder:
+    """Applies a mode and latency scale to a cassette; shared by the wrapped LLMs and tools."""
+
+    def __init__(self, cassette, mode=AUTO, latency_scale=1.0):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cassette mode {mode!r}; expected one of {', '.join(MODES)}")
+        self.cassette = cassette
+        self.mode = mode
+        self.latency_scale = latency_scale
+
+    def lookup(self, key, kind):
+        """The record to replay for `key`, or None if the call should go live."""
+        if self.mode == RECORD:
+            return None
+        record = self.cassette.get(key)
+        if record is None:
+            if self.mode == REPLAY:
+                metrics.inc("cassette_calls_total", kind=kind, result="missed")
+                raise CassetteMiss(f"No recorded {kind} call for key {key} in {self.cassette.path}")
+            return None
+        metrics.inc("cassette_calls_total", kind=kind, result="replayed")
+        return record
+
+    def record(self, key, kind, record):
+        if self.cassette.put(key, record):
+            metrics.inc("cassette_calls_total", kind=kind, result="recorded")
+
+    def delay(self, seconds):
+        return max(0.0, (seconds or 0.0) * self.latency_scale)
+
+
+def _message_key(message):
+    # Run ids differ between runs of the same conversation, so they can't be part of the key
+    data = message_to_dict(message)
+    data["data"] = {name: value for name, value in data["data"].items() if name != "id"}
+    return data
+
+
+class CassetteChatModel(BaseChatModel):
+    """
+    Chat model that replays recorded responses and records live ones.
+    The live model is built by the wrapped factory only when a call isn't replayed,
+    so replay mode needs no API key or network.
+    """
+
+    model: str
+    temperature: float = 0.7
+    max_tokens: int = 1024
+    streaming: bool = False
+    recorder: Any
+    base_factory: Any
+    inner_kwargs: dict = {}
+    _live_model: Any = PrivateAttr(default=None)
+
+    @property
+    def _llm_type(self) -> str:
+        return "cassette-chat"
+
+    @property
+    def _identifying_params(self):
+        return {"model_name": self.model, "temperature": self.temperature, "max_tokens": self.max_tokens}
+
+    def _live(self):
+        # Private, so a copy made by configurable_fields builds its own client with the new settings
+        if self._live_model is None:
+            self._live_model = self.base_factory(
+                model=self.model, temperature=self.temperature, max_tokens=self.max_tokens,
+                streaming=self.streaming, **self.inner_kwargs
+            )
+        return self._live_model
+
+    def _key(self, messages, stop, kwargs):
+        return request_key(
+            "llm", self.model, self.temperature, self.max_tokens,
+            [_message_key(message) for message in messages], stop,
+            {name: value for name, value in kwargs.items() if name != "run_manager"}
+        )
+
+    @staticmethod
+    def _message(record):
+        return messages_from_dict([record["message"]])[0]
+
+    def _replay_result(self, record):
+        return ChatResult(generations=[ChatGeneration(message=self._message(record))], llm_output=record.get("llm_output"))
+
+    def _replay_chunks(self, record):
+        """(delay, chunk) pairs spreading the recorded generation time over the answer's words."""
+        message = self._message(record)
+        chunks = [
+            AIMessageChunk(content="", tool_call_chunks=[{
+                "name": call["name"], "args": json.dumps(call["args"]), "id": call.get("id"), "index": index
+            }])
+            for index, call in enumerate(getattr(message, "tool_calls", None) or [])
+        ]
+        words = str(message.content).split(" ") if message.content else []
+        chunks += [AIMessageChunk(content=word if i == len(words) - 1 else word + " ") for i, word in enumerate(words)]
+        first = self.recorder.delay(record.get("first_token", record["latency"]))
+        rest = self.recorder.delay(record["latency"]) - first
+        gap = rest / max(1, len(chunks) - 1)
+        return [(first if index == 0 else gap, chunk) for index, chunk in enumerate(chunks)]
+
+    def _store(self, key, message, llm_output, latency, first_token=None):
+        record = {"kind": "llm", "model": self.model, "latency": latency, "message": message_to_dict(message)}
+        if first_token is not None:
+            record["first_token"] = first_token
+        if llm_output:
+            record["llm_output"] = llm_output
+        self.recorder.record(key, "llm", record)
+
+    def _generate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs):
+        key = self._key(messages, stop, kwargs)
+        record = self.recorder.lookup(key, "llm")
+        if record is not None:
+            time.sleep(self.recorder.delay(record["latency"]))
+            return self._replay_result(record)
+        start = time.perf_counter()
+        result = self._live()._generate(messages, stop=stop, **kwargs)
+        self._store(key, result.generations[0].message, result.llm_output, time.perf_counter() - start)
+        return result
+
+    async def _agenerate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs):
+        key = self._key(messages, stop, kwargs)
+        record = self.recorder.lookup(key, "llm")
+        if record is not None:
+            await asyncio.sleep(self.recorder.delay(record["latency"]))
+            return self._replay_result(record)
+        start = time.perf_counter()
+        result = await self._live()._agenerate(messages, stop=stop, **kwargs)
+        self._store(key, result.generations[0].message, result.llm_output, time.perf_counter() - start)
+        return result
+
+    def _stream(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs):
+        key = self._key(messages, stop, kwargs)
+        record = self.recorder.lookup(key, "llm")
+        if record is not None:
+            for delay, chunk in self._replay_chunks(record):
+                if delay:
+                    time.sleep(delay)
+                generation = ChatGenerationChunk(message=chunk)
+                if run_manager:
+                    run_manager.on_llm_new_token(chunk.content, chunk=generation)
+                yield generation
+            return
+        start, first_token, message = time.perf_counter(), None, None
+        for generation in self._live()._stream(messages, stop=stop, run_manager=run_manager, **kwargs):
+            if first_token is None:
+                first_token = time.perf_counter() - start
+            message = generation.message if message is None else message + generation.message
+            yield generation
+        if message is not None:
+            self._store(key, message, None, time.perf_counter() - start, first_token)
+
+    async def _astream(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs):
+        key = self._key(messages, stop, kwargs)
+        record = self.recorder.lookup(key, "llm")
+        if record is not None:
+            for delay, chunk in self._replay_chunks(record):
+                if delay:
+                    await asyncio.sleep(delay)
+                generation = ChatGenerationChunk(message=chunk)
+                if run_manager:
+                    await run_manager.on_llm_new_token(chunk.content, chunk=generation)
+                yield generation
+            return
+        start, first_token, message = time.perf_counter(), None, None
+        async for generation in self._live()._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+            if first_token is None:
+                first_token = time.perf_counter() - start
+            message = generation.message if message is None else message + generation.message
+            yield generation
+        if message is not None:
+            self._store(key, message, None, time.perf_counter() - start, first_token)
+
+
+def _tool_key(tool, args, kwargs):
+    return request_key("tool", tool.name, list(args), kwargs)
+
+
+def _replay_tool(record):
+    if "error" in record:
+        raise ToolException(record["error"])
+    if "result" in record:
+        return from_dict(record["result"])
+    return record["output"]
+
+
+def _tool_record(tool, latency, output):
+    record = {"kind": "tool", "name": tool.name, "latency": latency}
+    if isinstance(output, ToolResult):
+        record["result"] = output.to_dict()
+    else:
+        record["output"] = output
+    return record
+
+
+def wrap_tool(tool, recorder):
+    """Route a tool's sync and async functions through `recorder`. Returns the originals for `unwrap_tool`."""
+    original = (tool.func, tool.coroutine)
+    func, coroutine = original
+
+    def recorded_func(*args, **kwargs):
+        key = _tool_key(tool, args, kwargs)
+        record = recorder.lookup(key, tool.name)
+        if record is not None:
+            time.sleep(recorder.delay(record["latency"]))
+            return _replay_tool(record)
+        start = time.perf_counter()
+        try:
+            output = func(*args, **kwargs)
+        except ToolException as e:
+            recorder.record(key, tool.name, {"kind": "tool", "name": tool.name, "latency": time.perf_counter() - start, "error": str(e)})
+            raise
+        recorder.record(key, tool.name, _tool_record(tool, time.perf_counter() - start, output))
+        return output
+
+    async def recorded_coroutine(*args, **kwargs):
+        key = _tool_key(tool, args, kwargs)
+        record = recorder.lookup(key, tool.name)
+        if record is not None:
+            await asyncio.sleep(recorder.delay(record["latency"]))
+            return _replay_tool(record)
+        start = time.perf_counter()
+        try:
+            output = await coroutine(*args, **kwargs)
+        except ToolException as e:
+            recorder.record(key, tool.name, {"kind": "tool", "name": tool.name, "latency": time.perf_counter() - start, "error": str(e)})
+            raise
+        recorder.record(key, tool.name, _tool_record(tool, time.perf_counter() - start, output))
+        return output
+
+    tool.func = recorded_func
+    if coroutine is not None:
+        tool.coroutine = recorded_coroutine
+    return original
+
+
+_installed = None
+
+
+def install_cassettes(path=None, mode=None, latency_scale=None, tools=None):
+    """
+    Record/replay every chat model created through `agent.llm.create_chat_model` and the given tools.
+    Call before agents are created; cached agent executors are dropped so they pick up the wrapped model.
+    Args:
+        path (str): Cassette directory (defaults to Config.CASSETTE_PATH)
+        mode (str): "record", "replay" or "auto" (defaults to Config.CASSETTE_MODE)
+        latency_scale (float): Multiplier on recorded latencies (defaults to Config.CASSETTE_LATENCY_SCALE)
+        tools (list): Tools to wrap (defaults to every tool the agent uses)
+    Returns:
+        Recorder: The active recorder
+    """
+    global _installed
+    from .main_agent import TOOLS, clear_executor_cache
+
+    uninstall_cassettes()
+    recorder = Recorder(
+        Cassette(path or Config.CASSETTE_PATH),
+        mode or Config.CASSETTE_MODE,
+        Config.CASSETTE_LATENCY_SCALE if latency_scale is None else latency_scale
+    )
+    previous_factory = get_chat_model_factory()
+    base_factory = previous_factory or create_groq_model
+
+    def factory(model, temperature=0.7, max_tokens=1024, streaming=False, callbacks=None, **kwargs):
+        return CassetteChatModel(
+            model=model, temperature=temperature, max_tokens=max_tokens, streaming=streaming,
+            callbacks=callbacks, recorder=recorder, base_factory=base_factory, inner_kwargs=kwargs
+        )
+
+    set_chat_model_factory(factory)
+    wrapped = [(tool, wrap_tool(tool, recorder)) for tool in (TOOLS if tools is None else tools)]
+    _installed = (recorder, previous_factory, wrapped)
+    clear_executor_cache()
+    return recorder
+
+
+def uninstall_cassettes():
+    """Restore the previous chat model factory and the original tool functions."""
+    global _installed
+    from .main_agent import clear_executor_cache
+
+    if _installed is None:
+        return
+    recorder, previous_factory, wrapped = _installed
+    set_chat_model_factory(previous_factory)
+    for tool, (func, coroutine) in wrapped:
+        tool.func, tool.coroutine = func, coroutine
+    recorder.cassette.close()
+    _installed = None
+    clear_executor_cache()
@@ -1,42 +1,310 @@
-from langchain.agents import AgentExecutor
-from langchain_groq import ChatGroq
+import asyncio
+import queue
+import threading
+import time
 from config import Config
+from .main_agent import TravelAgent
+from .llm import create_chat_model
+from .memory import SessionStore
+from .metrics import metrics
+from .response_cache import ResponseCache
+from .streaming import StreamEventHandler
+from .workflow import extract_places
 
 class FallbackAgent:
-    def __init__(self, primary_agent: AgentExecutor):
+    def __init__(self, primary_agent: TravelAgent, response_cache: ResponseCache = None, memory: SessionStore = None):
         self.primary_agent = primary_agent
-        # Use a faster Groq model for fallback
-        self.fallback_llm = ChatGroq(
-            model=Config.FALLBACK_MODEL,
-            temperature=0.3,
-            max_tokens=512,
-            timeout=30
-        )
-    
-    def run_with_fallback(self, query: str) -> str:
+        # Answer repeated questions without a Groq round trip
+        if response_cache is None and Config.RESPONSE_CACHE_ENABLED:
+            response_cache = ResponseCache()
+        self.response_cache = response_cache
+        # Token-budgeted history for calls that pass a session_id
+        if memory is None and Config.MEMORY_ENABLED:
+            memory = SessionStore()
+        self.memory = memory
+        # The fallback LLM is created on first use
+        self._fallback_llm = None
+    
+    @property
+    def fallback_llm(self):
+        """Faster Groq model used when the tool-calling agent fails."""
+        if self._fallback_llm is None:
+            self._fallback_llm = create_chat_model(
+                model=Config.FALLBACK_MODEL,
+                temperature=0.3,
+                max_tokens=512,
+                timeout=30
+            )
+        return self._fallback_llm
+    
+    @fallback_llm.setter
+    def fallback_llm(self, llm):
+        self._fallback_llm = llm
+    
+    def warm(self):
+        """Build the agent executors and the response cache's embedding collection now so the first request doesn't pay for it."""
+        self.primary_agent.agent_executor
+        if self.response_cache is not None:
+            self.response_cache.warm()
+    
+    def run_with_fallback(self, query: str, callbacks=None, session_id: str = None) -> str:
         """Run the primary agent with fallback handling."""
+        history = self._history(session_id)
+        cached = self._cached_response(query, history)
+        if cached is not None:
+            self._remember(session_id, query, cached)
+            return cached
+        
         try:
             # Try primary agent first
             print("🤖 Using Groq-powered agent with tools...")
-            result = self.primary_agent.invoke({"input": query})
+            start = time.perf_counter()
+            result = self.primary_agent.invoke(query, chat_history=history, callbacks=callbacks)
+            self._cache_response(query, result["output"], time.perf_counter() - start, history)
+            self._remember(session_id, query, result["output"])
             return result["output"]
         
         except Exception as e:
             print(f"⚠️  Primary agent failed: {str(e)}")
             print("🔄 Switching to fallback mode...")
+            metrics.inc("fallback_activations_total")
             
             # Fallback to simple LLM response
-            fallback_prompt = f"""You are a helpful travel assistant. I'm experiencing technical difficulties with my travel planning tools, but I can still provide general travel advice.
-
-User question: {query}
-
-Please provide a helpful response about travel planning. Be concise but informative. If the question requires specific real-time data (like current weather or exact prices), acknowledge that you cannot provide that information due to technical issues, but offer general guidance instead."""
+            try:
+                fallback_response = self.fallback_llm.invoke(self._fallback_prompt(query, history))
+                output = f"[Fallback Mode - Groq Direct] {fallback_response.content}"
+                self._remember(session_id, query, output)
+                return output
+            except Exception as fallback_error:
+                return self._failure_message(fallback_error)
+    
+    async def arun_with_fallback(self, query: str, callbacks=None, session_id: str = None) -> str:
+        """Asynchronously run the primary agent with fallback handling."""
+        history = self._history(session_id)
+        cached = await self._acached_response(query, history)
+        if cached is not None:
+            self._remember(session_id, query, cached)
+            return cached
+        
+        try:
+            start = time.perf_counter()
+            result = await self.primary_agent.ainvoke(query, chat_history=history, callbacks=callbacks)
+            await self._acache_response(query, result["output"], time.perf_counter() - start, history)
+            self._remember(session_id, query, result["output"])
+            return result["output"]
+        
+        except Exception as e:
+            print(f"⚠️  Primary agent failed: {str(e)}")
+            print("🔄 Switching to fallback mode...")
+            metrics.inc("fallback_activations_total")
             
             try:
-                fallback_response = self.fallback_llm.invoke(fallback_prompt)
-                return f"[Fallback Mode - Groq Direct] {fallback_response.content}"
+                fallback_response = await self.fallback_llm.ainvoke(self._fallback_prompt(query, history))
+                output = f"[Fallback Mode - Groq Direct] {fallback_response.content}"
+                self._remember(session_id, query, output)
+                return output
             except Exception as fallback_error:
-                return f"I apologize, but I'm currently experiencing technical difficulties with both my tools and fallback systems. Please try again later. Error: {str(fallback_error)}"
+                return self._failure_message(fallback_error)
+    
+    def stream_with_fallback(self, query: str, session_id: str = None):
+        """
+        Stream the answer as it is generated, switching to the fallback LLM if the agent fails.
+        Yields:
+            dict: Events with a "type" of "token", "tool_start", "tool_end", "tool_error",
+                "fallback" (primary agent failed) or "end" (carries the full "output")
+        """
+        history = self._history(session_id)
+        cached = self._cached_response(query, history)
+        if cached is not None:
+            self._remember(session_id, query, cached)
+            yield {"type": "token", "content": cached}
+            yield {"type": "end", "output": cached}
+            return
+        
+        # The agent runs in a worker thread and reports progress through the queue
+        events = queue.Queue()
+        outcome = {}
+        
+        def run_primary():
+            try:
+                start = time.perf_counter()
+                result = self.primary_agent.invoke(
+                    query, chat_history=history, callbacks=[StreamEventHandler(events)]
+                )
+                outcome["output"] = result["output"]
+                outcome["latency"] = time.perf_counter() - start
+            except Exception as e:
+                outcome["error"] = e
+            finally:
+                events.put(None)
+        
+        threading.Thread(target=run_primary, daemon=True).start()
+        
+        answer_streamed = False
+        while True:
+            event = events.get()
+            if event is None:
+                break
+            if event["type"] == "tool_start":
+                answer_streamed = False
+            elif event["type"] == "token":
+                answer_streamed = True
+            yield event
+        
+        if "error" not in outcome:
+            output = outcome["output"]
+            if not answer_streamed:
+                # The final answer did not come from a streamed LLM call (e.g. early stopping)
+                yield {"type": "token", "content": output}
+            self._cache_response(query, output, outcome["latency"], history)
+            self._remember(session_id, query, output)
+            yield {"type": "end", "output": output}
+            return
+        
+        yield {"type": "fallback", "error": str(outcome["error"])}
+        metrics.inc("fallback_activations_total")
+        
+        prefix = "[Fallback Mode - Groq Direct] "
+        content = ""
+        try:
+            yield {"type": "token", "content": prefix}
+            for chunk in self.fallback_llm.stream(self._fallback_prompt(query, history)):
+                content += chunk.content
+                yield {"type": "token", "content": chunk.content}
+            output = prefix + content
+            self._remember(session_id, query, output)
+        except Exception as fallback_error:
+            output = self._failure_message(fallback_error)
+            yield {"type": "token", "content": output}
+        yield {"type": "end", "output": output}
+    
+    async def astream_with_fallback(self, query: str, session_id: str = None):
+        """
+        Asynchronously stream the answer, switching to the fallback LLM if the agent fails.
+        Yields the same events as `stream_with_fallback`. If the consumer stops early
+        (e.g. an HTTP client disconnects), the agent run is cancelled.
+        """
+        history = self._history(session_id)
+        cached = await self._acached_response(query, history)
+        if cached is not None:
+            self._remember(session_id, query, cached)
+            yield {"type": "token", "content": cached}
+            yield {"type": "end", "output": cached}
+            return
+        
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
+        outcome = {}
+        
+        async def run_primary():
+            try:
+                start = time.perf_counter()
+                result = await self.primary_agent.ainvoke(
+                    query, chat_history=history, callbacks=[StreamEventHandler(events, loop)]
+                )
+                outcome["output"] = result["output"]
+                outcome["latency"] = time.perf_counter() - start
+            except Exception as e:
+                outcome["error"] = e
+            finally:
+                # Queued behind any events still being handed over from worker threads
+                loop.call_soon_threadsafe(events.put_nowait, None)
+        
+        task = asyncio.ensure_future(run_primary())
+        try:
+            answer_streamed = False
+            while True:
+                event = await events.get()
+                if event is None:
+                    break
+                if event["type"] == "tool_start":
+                    answer_streamed = False
+                elif event["type"] == "token":
+                    answer_streamed = True
+                yield event
+        finally:
+            task.cancel()
+        
+        if "error" not in outcome:
+            output = outcome["output"]
+            if not answer_streamed:
+                yield {"type": "token", "content": output}
+            await self._acache_response(query, output, outcome["latency"], history)
+            self._remember(session_id, query, output)
+            yield {"type": "end", "output": output}
+            return
+        
+        yield {"type": "fallback", "error": str(outcome["error"])}
+        metrics.inc("fallback_activations_total")
+        
+        prefix = "[Fallback Mode - Groq Direct] "
+        content = ""
+        try:
+            yield {"type": "token", "content": prefix}
+            async for chunk in self.fallback_llm.astream(self._fallback_prompt(query, history)):
+                content += chunk.content
+                yield {"type": "token", "content": chunk.content}
+            output = prefix + content
+            self._remember(session_id, query, output)
+        except Exception as fallback_error:
+            output = self._failure_message(fallback_error)
+            yield {"type": "token", "content": output}
+        yield {"type": "end", "output": output}
+    
+    def _history(self, session_id):
+        """Chat history for the session, or None for stateless calls."""
+        if self.memory is None:
+            return None
+        return self.memory.history(session_id)
+    
+    def _remember(self, session_id, query: str, response: str):
+        """Record the exchange in the session's memory."""
+        if self.memory is not None:
+            self.memory.record(session_id, query, response)
+    
+    @staticmethod
+    def _cacheable(query: str, history) -> bool:
+        """Follow-ups without a place name ("and hotels there?") depend on the history, so they bypass the cache."""
+        return not history or bool(extract_places(query))
+    
+    def _cached_response(self, query: str, history=None):
+        """Return a cached answer for the query, if any."""
+        if self.response_cache is None or not self._cacheable(query, history):
+            return None
+        return self.response_cache.get(query)
+    
+    def _cache_response(self, query: str, response: str, latency: float, history=None):
+        """Cache an answer from the primary agent (fallback answers are never cached)."""
+        if self.response_cache is not None and self._cacheable(query, history):
+            self.response_cache.set(query, response, latency)
+    
+    async def _acached_response(self, query: str, history=None):
+        """Async `_cached_response`; the semantic lookup runs off the event loop."""
+        if self.response_cache is None or not self._cacheable(query, history):
+            return None
+        return await self.response_cache.aget(query)
+    
+    async def _acache_response(self, query: str, response: str, latency: float, history=None):
+        """Async `_cache_response`; the embedding is computed off the event loop."""
+        if self.response_cache is not None and self._cacheable(query, history):
+            await self.response_cache.aset(query, response, latency)
+    
+    def _fallback_prompt(self, query: str, history=None) -> str:
+        """Build the prompt used when the tool-based agent is unavailable."""
+        conversation = ""
+        if history:
+            lines = "\n".join(f"{message.type}: {message.content}" for message in history)
+            conversation = f"\nConversation so far:\n{lines}\n"
+        return f"""You are a helpful travel assistant. I'm experiencing technical difficulties with my travel planning tools, but I can still provide general travel advice.
+{conversation}
+User question: {query}
+
+Please provide a helpful response about travel planning. Be concise but informative. If the question requires specific real-time data (like current weather or exact prices), acknowledge that you cannot provide that information due to technical issues, but offer general guidance instead."""
+    
+    def _failure_message(self, error: Exception) -> str:
+        """Message returned when both the agent and the fallback LLM fail."""
+        metrics.inc("fallback_errors_total")
+        return f"I apologize, but I'm currently experiencing technical difficulties with both my tools and fallback systems. Please try again later. Error: {str(error)}"
     
     def test_connection(self) -> bool:
         """Test if Groq connection is working."""
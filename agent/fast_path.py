@@ -0,0 +1,92 @@
+import datetime
+import re
+import threading
+
+from config import Config
+from tools.gazetteer import resolve_place
+from tools.results import ToolResult
+from .llm import create_chat_model
+from .workflow import COMPLEX_PATTERN, PLACE_ARGS, TravelPlanningWorkflow, parse_trip_request
+
+# Questions that need judgement rather than a lookup, even when they name one tool's topic
+OPEN_ENDED_PATTERN = re.compile(
+    r"\b(why|should|worth|safe|visa|tips?|advice|best time|when|cheaper|better|instead|if)\b", re.IGNORECASE
+)
+FORECAST_PATTERN = re.compile(r"\b(forecast|tomorrow)\b", re.IGNORECASE)
+# Constraints the single-step plan would silently drop: prices and budgets, times other
+# than now/tomorrow, and negation
+QUALIFIER_PATTERN = re.compile(
+    r"[$€£\d]|\b(under|over|below|above|less|more|cheap\w*|budget|luxury|expensive|dollars?|euros?|pounds?|usd|eur"
+    r"|yesterday|today|tonight|morning|afternoon|evening|night|weekend|week|month|year|next|last|ago|later|until"
+    r"|during|season|summer|winter|spring|autumn|fall|mon|tues|wednes|thurs|fri|satur|sun)(day)?\b"
+    r"|\b(january|february|march|april|may|june|july|august|september|october|november|december)\b"
+    r"|\b(not|no|never|without|except|avoid|nothing|none)\b|n't\b",
+    re.IGNORECASE
+)
+
+# Longest query the rules are trusted with
+MAX_QUERY_CHARS = 120
+
+REPHRASE_PROMPT = """Answer the traveller's question using only the tool result below. Be friendly and brief (at most 3 sentences), and keep every number.
+
+Question: {query}
+Tool result: {result}
+
+Answer:"""
+
+
+def classify_intent(query: str):
+    """
+    Return (tool name, tool arguments) when `query` is an obvious single-tool lookup
+    ("weather in Paris", "hotels in Rome", "flight cost from NYC to Tokyo"), else None.
+    Only places the gazetteer knows qualify, so typos and unusual requests still go to the agent,
+    and so do queries with qualifiers (price, date, negation) the tool arguments can't carry.
+    """
+    if len(query) > MAX_QUERY_CHARS or COMPLEX_PATTERN.search(query) or OPEN_ENDED_PATTERN.search(query):
+        return None
+    if QUALIFIER_PATTERN.search(query):
+        return None
+    trip = parse_trip_request(query)
+    # Every need the parser saw must be covered by the single step, or the LLM is needed after all
+    needs = int(trip["wants_weather"]) + int(trip["wants_cost"]) + len(trip["categories"])
+    steps = TravelPlanningWorkflow.plan(trip)
+    if needs != 1 or len(steps) != 1:
+        return None
+
+    step = steps[0]
+    places = [value for name, value in step.args.items() if name in PLACE_ARGS]
+    if not places or any(resolve_place(place) is None for place in places):
+        return None
+    if step.tool == "weather_lookup" and FORECAST_PATTERN.search(query):
+        args = {"cities": [step.args["city"]]}
+        if re.search(r"\btomorrow\b", query, re.IGNORECASE):
+            tomorrow = (datetime.date.today() + datetime.timedelta(days=1)).isoformat()
+            args.update(start_date=tomorrow, end_date=tomorrow)
+        return "weather_forecast", args
+    return step.tool, dict(step.args)
+
+
+def render(tool_name: str, output) -> str:
+    """Template answer for a tool result."""
+    if isinstance(output, ToolResult):
+        return output.describe()
+    return str(output)
+
+
+_rephraser = None
+_rephraser_lock = threading.Lock()
+
+
+def default_rephraser():
+    """Shared streaming client on the cheaper FALLBACK_MODEL for opt-in rephrasing."""
+    global _rephraser
+    with _rephraser_lock:
+        if _rephraser is None:
+            _rephraser = create_chat_model(
+                model=Config.FALLBACK_MODEL,
+                temperature=0.3,
+                max_tokens=256,
+                timeout=30,
+                streaming=True
+            )
+        return _rephraser
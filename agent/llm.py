@@ -0,0 +1,52 @@
+from config import Config
+
+_chat_model_factory = None
+
+
+def create_chat_model(model, temperature=0.7, max_tokens=1024, **kwargs):
+    """
+    Create the chat model used by the agents.
+    Args:
+        model (str): Groq model name
+        temperature (float): Sampling temperature
+        max_tokens (int): Maximum tokens for responses
+        **kwargs: Extra ChatGroq options (timeout, max_retries, streaming, callbacks)
+    Returns:
+        BaseChatModel: A ChatGroq instance (rate limited per model when Config.RATE_LIMIT_ENABLED),
+            or whatever the installed factory returns
+    """
+    if _chat_model_factory is not None:
+        return _chat_model_factory(model=model, temperature=temperature, max_tokens=max_tokens, **kwargs)
+    return create_groq_model(model=model, temperature=temperature, max_tokens=max_tokens, **kwargs)
+
+
+def create_groq_model(model, temperature=0.7, max_tokens=1024, **kwargs):
+    """The ChatGroq client `create_chat_model` builds when no factory is installed."""
+    from langchain_groq import ChatGroq
+
+    if Config.RATE_LIMIT_ENABLED:
+        from .rate_limiter import rate_limited
+
+        # The scheduler owns retries so that 429s back off together instead of stampeding
+        retries = kwargs.pop("max_retries", 2)
+        return rate_limited(ChatGroq)(
+            model=model, temperature=temperature, max_tokens=max_tokens,
+            max_retries=0, scheduler_retries=retries, **kwargs
+        )
+
+    return ChatGroq(model=model, temperature=temperature, max_tokens=max_tokens, **kwargs)
+
+
+def get_chat_model_factory():
+    """The installed factory, or None when ChatGroq is used directly."""
+    return _chat_model_factory
+
+
+def set_chat_model_factory(factory):
+    """
+    Replace ChatGroq for every agent created afterwards (e.g. with a local fake for benchmarks).
+    Args:
+        factory (callable): Called with the `create_chat_model` arguments; None restores ChatGroq
+    """
+    global _chat_model_factory
+    _chat_model_factory = factory
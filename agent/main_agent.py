@@ -1,18 +1,202 @@
-from langchain.agents import AgentExecutor, create_tool_calling_agent
+import threading
+from collections import OrderedDict
+
+from langchain.agents.output_parsers.tools import ToolsAgentOutputParser
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_groq import ChatGroq
 from langchain.schema import SystemMessage
 from langchain.callbacks import LangChainTracer
 from langchain.callbacks.manager import CallbackManager
+from langchain_core.runnables import ConfigurableField, RunnableLambda, RunnablePassthrough
+from langchain_core.utils.function_calling import convert_to_openai_tool
 
-from tools import get_weather, calculate_travel_cost, get_recommendations
+from tools import get_weather, get_weather_forecast, calculate_travel_cost, calculate_cost_matrix, get_recommendations
+from tools.forecast import prefetch_forecasts
 from config import Config
+from .llm import create_chat_model
+from .fast_path import REPHRASE_PROMPT, classify_intent, default_rephraser, render
+from .metrics import MetricsCallbackHandler, metrics
+from .parallel_executor import ParallelAgentExecutor
+from .scratchpad import compact_scratchpad
+from .workflow import parse_trip_request
+
+# Agent prompt (optimized for Groq models)
+SYSTEM_MESSAGE = """You are a helpful travel planning assistant powered by Groq. You can help users with:
+        1. Weather information for destinations
+        2. Travel cost calculations  
+        3. Destination recommendations (attractions, restaurants, hotels)
+
+        Instructions:
+        - Be friendly and provide comprehensive travel advice
+        - Use the available tools to get accurate information
+        - If you encounter errors, acknowledge them and suggest alternatives
+        - Ask for clarification if the user's request is ambiguous
+        - Provide context and helpful additional information
+        - Suggest related services when appropriate
+        - Keep responses concise but informative
+
+        Available tools:
+        - weather_lookup: Get current weather for any city
+        - weather_forecast: Get daily forecasts for several cities and dates in one call
+        - travel_cost_calculator: Calculate travel costs between cities
+        - travel_cost_matrix: Compare costs for several origins and/or destinations in one call
+        - destination_recommendations: Get recommendations for attractions, restaurants, or hotels
+        """
+
+TOOLS = [get_weather, get_weather_forecast, calculate_travel_cost, calculate_cost_matrix, get_recommendations]
+TOOLS_BY_NAME = {tool.name: tool for tool in TOOLS}
+
+# Prompt, tool schemas and tracer are built once per process and shared by every executor
+_shared = {}
+_shared_lock = threading.Lock()
+
+# Executors keyed by (model, temperature, max_tokens, verbose), least recently used evicted first
+_executors = OrderedDict()
+_executors_lock = threading.Lock()
+
+
+def _shared_component(name, build):
+    with _shared_lock:
+        if name not in _shared:
+            _shared[name] = build()
+        return _shared[name]
+
+
+def agent_prompt():
+    """The agent prompt, built once."""
+    return _shared_component("prompt", lambda: ChatPromptTemplate.from_messages([
+        SystemMessage(content=SYSTEM_MESSAGE),
+        MessagesPlaceholder(variable_name="chat_history", optional=True),
+        ("human", "{input}"),
+        MessagesPlaceholder(variable_name="agent_scratchpad")
+    ]))
+
+
+def tool_schemas():
+    """OpenAI-format tool definitions sent with every call, serialized once."""
+    return _shared_component("tool_schemas", lambda: [convert_to_openai_tool(tool) for tool in TOOLS])
+
+
+def shared_tracers():
+    """The LangSmith tracer if cloud tracing is enabled (one instance per process)."""
+    if not Config.tracing_enabled():
+        return []
+    return [_shared_component("tracer", LangChainTracer)]
+
+
+def _direct_answer(inputs, config):
+    """Fast path: run the one tool the query needs and answer from a template (rephrased by the LLM if asked)."""
+    tool_name, args = inputs["intent"]
+    try:
+        answer = render(tool_name, TOOLS_BY_NAME[tool_name].invoke(args, config=config))
+    except Exception:
+        # Let the agent deal with it (it can explain the failure or try something else)
+        return None
+    if inputs["rephrase"]:
+        try:
+            prompt = REPHRASE_PROMPT.format(query=inputs["input"], result=answer)
+            answer = default_rephraser().invoke(prompt, config=config).content
+        except Exception as e:
+            print(f"⚠️  Rephrasing failed, using the template answer: {str(e)}")
+    return {"input": inputs["input"], "output": answer}
+
+
+async def _adirect_answer(inputs, config):
+    tool_name, args = inputs["intent"]
+    try:
+        answer = render(tool_name, await TOOLS_BY_NAME[tool_name].ainvoke(args, config=config))
+    except Exception:
+        return None
+    if inputs["rephrase"]:
+        try:
+            prompt = REPHRASE_PROMPT.format(query=inputs["input"], result=answer)
+            answer = (await default_rephraser().ainvoke(prompt, config=config)).content
+        except Exception as e:
+            print(f"⚠️  Rephrasing failed, using the template answer: {str(e)}")
+    return {"input": inputs["input"], "output": answer}
+
+
+fast_path_runnable = RunnableLambda(_direct_answer, afunc=_adirect_answer, name="fast_path")
+
+
+def get_agent_executor(model, temperature=0.7, max_tokens=1024, verbose=True):
+    """Return the cached executor for these settings, building it on first use."""
+    key = (model, temperature, max_tokens, verbose)
+    with _executors_lock:
+        executor = _executors.get(key)
+        if executor is not None:
+            _executors.move_to_end(key)
+            return executor
+
+    executor = build_agent_executor(model, temperature, max_tokens, verbose)
+    with _executors_lock:
+        # Another thread may have built the same executor meanwhile; keep the first
+        executor = _executors.setdefault(key, executor)
+        _executors.move_to_end(key)
+        while len(_executors) > Config.EXECUTOR_CACHE_SIZE:
+            _executors.popitem(last=False)
+    return executor
+
+
+def clear_executor_cache():
+    """Drop cached executors, e.g. after installing a different chat model factory."""
+    with _executors_lock:
+        _executors.clear()
+
+
+def _with_call_overrides(llm):
+    """
+    Runnable that prompts `llm` with the per-call overrides (e.g. {"temperature": 0.2}) of the run,
+    reusing the same client. ParallelAgentExecutor passes the call's config["configurable"] as the
+    "configurable" input.
+    """
+    def select(inputs):
+        overrides = inputs.get("configurable")
+        return agent_prompt() | (llm.with_config(configurable=overrides) if overrides else llm)
+    return RunnableLambda(select, name="agent_llm")
+
+
+def build_agent_executor(model, temperature=0.7, max_tokens=1024, verbose=True):
+    """Create and configure an agent executor from the shared prompt and tool definitions."""
+
+    # Initialize the Groq LLM; temperature and max_tokens can be overridden per call
+    llm = create_chat_model(
+        model=model,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        timeout=60,
+        max_retries=2,
+        streaming=True,  # emit tokens to callbacks as they are generated
+        callbacks=shared_tracers()
+    )
+    llm = llm.configurable_fields(**{
+        field: ConfigurableField(id=field) for field in ("temperature", "max_tokens") if field in llm.__fields__
+    })
+
+    # Same pipeline as create_tool_calling_agent, binding the pre-serialized tool schemas
+    agent = (
+        RunnablePassthrough.assign(agent_scratchpad=lambda x: compact_scratchpad(x["intermediate_steps"]))
+        | _with_call_overrides(llm.bind(tools=tool_schemas()))
+        | ToolsAgentOutputParser()
+    )
+
+    # Create agent executor (tool calls within one step run concurrently, lookups may start mid-stream)
+    return ParallelAgentExecutor(
+        agent=agent,
+        tools=TOOLS,
+        callback_manager=CallbackManager(shared_tracers()),
+        verbose=verbose,
+        handle_parsing_errors=True,
+        max_iterations=5,
+        early_stopping_method="generate",
+        max_tool_concurrency=Config.TOOL_CONCURRENCY,
+        speculative_tools=tuple(Config.SPECULATIVE_TOOLS)
+    )
 
 
 class TravelAgent:
     """Main travel planning agent class using Groq."""
 
-    def __init__(self, model=None, temperature=0.7, max_tokens=1024, verbose=True):
+    def __init__(self, model=None, temperature=0.7, max_tokens=1024, verbose=True, fast_path=None, rephrase=None):
         """
         Initialize the travel agent.
         Args:
@@ -20,127 +204,170 @@ class TravelAgent:
             temperature (float): Sampling temperature
             max_tokens (int): Maximum tokens for responses
             verbose (bool): Enable verbose logging
+            fast_path (bool): Answer obvious single-tool queries without the agent loop
+                (defaults to Config.FAST_PATH_ENABLED)
+            rephrase (bool): Have the LLM rephrase fast-path answers (defaults to Config.FAST_PATH_REPHRASE)
         """
         self.model = model or Config.DEFAULT_MODEL
         self.temperature = temperature
         self.max_tokens = max_tokens
         self.verbose = verbose
+        self.fast_path = Config.FAST_PATH_ENABLED if fast_path is None else fast_path
+        self.rephrase = Config.FAST_PATH_REPHRASE if rephrase is None else rephrase
 
         # Initialize tools
-        self.tools = [get_weather, calculate_travel_cost, get_recommendations]
+        self.tools = TOOLS
 
-        # Create callback manager for tracing
-        self.callback_manager = CallbackManager([LangChainTracer()])
+        # Create callback manager for tracing (LangSmith only when LANGCHAIN_TRACING_V2 is on)
+        self.callback_manager = CallbackManager(shared_tracers())
 
-        # Initialize the agent executor
-        self.agent_executor = self._create_agent()
+        # Local timings and token counts, passed per call so tool and LLM runs inherit it
+        self.metrics_handler = MetricsCallbackHandler() if Config.METRICS_ENABLED else None
 
-    def _create_agent(self):
-        """Create and configure the agent executor."""
+        # The agent executor is looked up in the shared cache on first use
+        self._agent_executor = None
 
-        # Initialize the Groq LLM
-        llm = ChatGroq(
-            model=self.model,
-            temperature=self.temperature,
-            max_tokens=self.max_tokens,
-            timeout=60,
-            max_retries=2,
-            callbacks=[LangChainTracer()]
-        )
+    @property
+    def agent_executor(self):
+        """The executor for the current configuration, shared with other agents using the same settings."""
+        if self._agent_executor is None:
+            self._agent_executor = get_agent_executor(self.model, self.temperature, self.max_tokens, self.verbose)
+        return self._agent_executor
 
-        # Create agent prompt (optimized for Groq models)
-        system_message = """You are a helpful travel planning assistant powered by Groq. You can help users with:
-        1. Weather information for destinations
-        2. Travel cost calculations  
-        3. Destination recommendations (attractions, restaurants, hotels)
-
-        Instructions:
-        - Be friendly and provide comprehensive travel advice
-        - Use the available tools to get accurate information
-        - If you encounter errors, acknowledge them and suggest alternatives
-        - Ask for clarification if the user's request is ambiguous
-        - Provide context and helpful additional information
-        - Suggest related services when appropriate
-        - Keep responses concise but informative
+    def _callbacks(self, callbacks=None):
+        """Per-call callbacks plus the metrics handler."""
+        if self.metrics_handler is None:
+            return callbacks
+        return [self.metrics_handler] + list(callbacks or [])
 
-        Available tools:
-        - weather_lookup: Get current weather for any city
-        - travel_cost_calculator: Calculate travel costs between cities
-        - destination_recommendations: Get recommendations for attractions, restaurants, or hotels
+    @staticmethod
+    def _prefetch(input_text):
+        """
+        Start fetching forecasts for the destinations in the query while the LLM plans its tool calls.
+        Only queries naming dates or a multi-day range are likely to need a forecast; current
+        conditions come from weather_lookup, and a prefetch would spend upstream quota for nothing.
         """
+        if not Config.WEATHER_PREFETCH:
+            return
+        try:
+            trip = parse_trip_request(input_text)
+        except Exception:
+            return
+        if trip["wants_forecast"] and trip["destinations"]:
+            prefetch_forecasts(trip["destinations"])
 
-        prompt = ChatPromptTemplate.from_messages([
-            SystemMessage(content=system_message),
-            MessagesPlaceholder(variable_name="chat_history", optional=True),
-            ("human", "{input}"),
-            MessagesPlaceholder(variable_name="agent_scratchpad")
-        ])
-
-        # Create the agent (using tool calling for Groq)
-        agent = create_tool_calling_agent(
-            llm=llm,
-            tools=self.tools,
-            prompt=prompt
-        )
+    def _fast_path_inputs(self, input_text, chat_history):
+        """Inputs for the fast path, or None when the query needs the agent (follow-ups always do)."""
+        if not self.fast_path or chat_history:
+            return None
+        intent = classify_intent(input_text)
+        if intent is None:
+            return None
+        return {"input": input_text, "intent": intent, "rephrase": self.rephrase}
 
-        # Create agent executor
-        agent_executor = AgentExecutor(
-            agent=agent,
-            tools=self.tools,
-            callback_manager=self.callback_manager,
-            verbose=self.verbose,
-            handle_parsing_errors=True,
-            max_iterations=5,
-            early_stopping_method="generate"
-        )
+    @staticmethod
+    def _fast_path_done(inputs, result):
+        if result is None:
+            metrics.inc("fast_path_total", tool=inputs["intent"][0], result="fallthrough")
+            return False
+        metrics.inc("fast_path_total", tool=inputs["intent"][0], result="answered")
+        return True
 
-        return agent_executor
+    def _run(self, overrides):
+        """
+        Resolve per-call overrides to an executor and the LLM settings to override.
+        A different model selects another cached executor; temperature and
+        max_tokens are applied to the existing one without rebuilding it.
+        """
+        unknown = set(overrides) - {"model", "temperature", "max_tokens"}
+        if unknown:
+            raise TypeError(f"Unsupported per-call overrides: {', '.join(sorted(unknown))}")
+        model = overrides.get("model") or self.model
+        executor = self.agent_executor if model == self.model else get_agent_executor(
+            model, self.temperature, self.max_tokens, self.verbose
+        )
+        configurable = {
+            key: overrides[key] for key in ("temperature", "max_tokens")
+            if overrides.get(key) is not None and overrides[key] != getattr(self, key)
+        }
+        return executor, configurable
 
-    def invoke(self, input_text, chat_history=None):
+    def invoke(self, input_text, chat_history=None, callbacks=None, **overrides):
         """
         Process user input and return agent response.
         Args:
             input_text (str): User's travel query
             chat_history (list): Optional chat history
+            callbacks (list): Optional per-call callback handlers
+            **overrides: Optional per-call model, temperature or max_tokens
         Returns:
             dict: Agent response with output and metadata
         """
+        fast = self._fast_path_inputs(input_text, chat_history)
+        if fast is not None:
+            result = fast_path_runnable.invoke(fast, config={"callbacks": self._callbacks(callbacks)})
+            if self._fast_path_done(fast, result):
+                return result
+
         inputs = {"input": input_text}
         if chat_history:
             inputs["chat_history"] = chat_history
 
-        return self.agent_executor.invoke(inputs)
+        self._prefetch(input_text)
+        executor, configurable = self._run(overrides)
+        return executor.invoke(inputs, config={"callbacks": self._callbacks(callbacks), "configurable": configurable})
 
-    def stream(self, input_text, chat_history=None):
+    def stream(self, input_text, chat_history=None, callbacks=None, **overrides):
         """
         Stream agent response for real-time interaction.
         Args:
             input_text (str): User's travel query
             chat_history (list): Optional chat history
+            callbacks (list): Optional per-call callback handlers
+            **overrides: Optional per-call model, temperature or max_tokens
         Yields:
             dict: Streaming response chunks
         """
+        fast = self._fast_path_inputs(input_text, chat_history)
+        if fast is not None:
+            result = fast_path_runnable.invoke(fast, config={"callbacks": self._callbacks(callbacks)})
+            if self._fast_path_done(fast, result):
+                yield result
+                return
+
         inputs = {"input": input_text}
         if chat_history:
             inputs["chat_history"] = chat_history
 
-        for chunk in self.agent_executor.stream(inputs):
+        self._prefetch(input_text)
+        executor, configurable = self._run(overrides)
+        for chunk in executor.stream(inputs, config={"callbacks": self._callbacks(callbacks), "configurable": configurable}):
             yield chunk
 
-    async def ainvoke(self, input_text, chat_history=None):
+    async def ainvoke(self, input_text, chat_history=None, callbacks=None, **overrides):
         """
         Asynchronously process user input.
         Args:
             input_text (str): User's travel query
             chat_history (list): Optional chat history
+            callbacks (list): Optional per-call callback handlers
+            **overrides: Optional per-call model, temperature or max_tokens
         Returns:
             dict: Agent response with output and metadata
         """
+        fast = self._fast_path_inputs(input_text, chat_history)
+        if fast is not None:
+            result = await fast_path_runnable.ainvoke(fast, config={"callbacks": self._callbacks(callbacks)})
+            if self._fast_path_done(fast, result):
+                return result
+
         inputs = {"input": input_text}
         if chat_history:
             inputs["chat_history"] = chat_history
 
-        return await self.agent_executor.ainvoke(inputs)
+        self._prefetch(input_text)
+        executor, configurable = self._run(overrides)
+        return await executor.ainvoke(inputs, config={"callbacks": self._callbacks(callbacks), "configurable": configurable})
 
     def get_tools(self):
         """Return list of available tools."""
@@ -148,7 +375,7 @@ class TravelAgent:
 
     def update_config(self, **kwargs):
         """
-        Update agent configuration and recreate agent.
+        Update agent configuration; the matching cached executor is used from the next call.
         Args:
             **kwargs: Configuration parameters to update
         """
@@ -160,9 +387,13 @@ class TravelAgent:
             self.max_tokens = kwargs['max_tokens']
         if 'verbose' in kwargs:
             self.verbose = kwargs['verbose']
+        if 'fast_path' in kwargs:
+            self.fast_path = kwargs['fast_path']
+        if 'rephrase' in kwargs:
+            self.rephrase = kwargs['rephrase']
 
-        # Recreate agent with new configuration
-        self.agent_executor = self._create_agent()
+        # Look up (or build) the executor for the new configuration on next use
+        self._agent_executor = None
 
     def get_config(self):
         """Return current agent configuration."""
@@ -170,7 +401,9 @@ class TravelAgent:
             'model': self.model,
             'temperature': self.temperature,
             'max_tokens': self.max_tokens,
-            'verbose': self.verbose
+            'verbose': self.verbose,
+            'fast_path': self.fast_path,
+            'rephrase': self.rephrase
         }
 
 
@@ -0,0 +1,259 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config
+from tools.cache import TTLCache
+from .llm import create_chat_model
+from .rate_limiter import BATCH, llm_priority
+
+SUMMARY_PROMPT = """Update the running summary of a travel-planning conversation.
+Keep destinations, dates, budget, travel class, preferences and any facts the assistant already gave (weather, prices, recommendations). Drop pleasantries. Reply with the summary only, at most {max_words} words.
+
+Current summary:
+{summary}
+
+New turns:
+{turns}
+
+Updated summary:"""
+
+
+def estimate_tokens(text):
+    """Rough token count (about 4 characters per token for English text)."""
+    return len(text) // 4 + 1
+
+
+def clip(text, max_tokens):
+    """Shorten `text` to roughly `max_tokens`, keeping the start."""
+    max_chars = max_tokens * 4
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rsplit(" ", 1)[0] + " …"
+
+
+class SessionMemory:
+    """
+    Conversation history for one session, kept under a token budget.
+
+    Turns are stored as (user, assistant) strings with each message clipped.
+    Once the history outgrows the budget, the oldest turns are folded into a
+    running summary by the cheap model, so the prompt stays roughly the same
+    size however long the conversation runs. The most recent turns are always
+    kept verbatim.
+    """
+
+    def __init__(self, token_budget=None, recent_turns=None, max_turn_tokens=None, summary_tokens=None, summarizer=None):
+        """
+        Initialize the memory.
+        Args:
+            token_budget (int): Token budget for summary plus turns (defaults to Config.MEMORY_TOKEN_BUDGET)
+            recent_turns (int): Turns never summarized (defaults to Config.MEMORY_RECENT_TURNS)
+            max_turn_tokens (int): Each stored message is clipped to this (defaults to Config.MEMORY_MAX_TURN_TOKENS)
+            summary_tokens (int): Size limit of the running summary (defaults to Config.MEMORY_SUMMARY_TOKENS)
+            summarizer (callable): Returns a chat model for summaries (defaults to FALLBACK_MODEL)
+        """
+        self.token_budget = token_budget or Config.MEMORY_TOKEN_BUDGET
+        self.recent_turns = Config.MEMORY_RECENT_TURNS if recent_turns is None else recent_turns
+        self.max_turn_tokens = max_turn_tokens or Config.MEMORY_MAX_TURN_TOKENS
+        self.summary_tokens = summary_tokens or Config.MEMORY_SUMMARY_TOKENS
+        self.summarizer = summarizer or default_summarizer
+        self.summary = ""
+        self.turns = []
+        self._lock = threading.Lock()
+        self._compacting = threading.Lock()
+        # Bumped whenever the front of `turns` changes other than by compaction (clear, restore),
+        # so a compaction that was summarizing the old turns doesn't write back over the new ones
+        self._generation = 0
+
+    def tokens(self):
+        """Estimated tokens the history adds to a prompt."""
+        with self._lock:
+            return estimate_tokens(self.summary) + sum(
+                estimate_tokens(user) + estimate_tokens(assistant) for user, assistant in self.turns
+            )
+
+    def add_turn(self, user, assistant):
+        """Record one exchange. Returns whether the memory is now over budget."""
+        with self._lock:
+            self.turns.append((clip(user, self.max_turn_tokens), clip(assistant, self.max_turn_tokens)))
+        return self.needs_compaction()
+
+    def needs_compaction(self):
+        with self._lock:
+            foldable = len(self.turns) > self.recent_turns
+        return foldable and self.tokens() > self.token_budget
+
+    def messages(self):
+        """Return the history as chat messages for the agent's `chat_history` slot."""
+        from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+        with self._lock:
+            summary, turns = self.summary, list(self.turns)
+        history = []
+        if summary:
+            history.append(SystemMessage(content=f"Summary of the conversation so far: {summary}"))
+        for user, assistant in turns:
+            history.append(HumanMessage(content=user))
+            history.append(AIMessage(content=assistant))
+        return history
+
+    def compact(self):
+        """
+        Fold the oldest turns into the summary until the history fits the budget.
+        Safe to call from a background thread; concurrent calls are skipped.
+        """
+        if not self._compacting.acquire(blocking=False):
+            return
+        try:
+            while self.needs_compaction():
+                with self._lock:
+                    summary, generation = self.summary, self._generation
+                    # Fold half of the older turns at once so one call frees plenty of room
+                    count = max(1, (len(self.turns) - self.recent_turns + 1) // 2)
+                    folded = self.turns[:count]
+                new_summary = self._summarize(summary, folded)
+                with self._lock:
+                    if self._generation != generation:
+                        # Cleared or restored meanwhile: start over from what is there now
+                        continue
+                    self.summary = new_summary
+                    del self.turns[:count]
+        finally:
+            self._compacting.release()
+
+    def _summarize(self, summary, turns):
+        """Merge `turns` into `summary` with the summarizer, or by clipping if it fails."""
+        text = "\n".join(f"User: {user}\nAssistant: {assistant}" for user, assistant in turns)
+        try:
+            # Background work: let live requests go first under rate limits
+            with llm_priority(BATCH):
+                response = self.summarizer().invoke(SUMMARY_PROMPT.format(
+                    max_words=self.summary_tokens * 3 // 4,
+                    summary=summary or "(none)",
+                    turns=text
+                ))
+            return clip(response.content.strip(), self.summary_tokens)
+        except Exception as e:
+            print(f"⚠️  Conversation summary failed: {str(e)}")
+            # Keep what the user asked for; it carries most of the context
+            asked = " ".join(f"User asked: {clip(user, 40)}" for user, _ in turns)
+            return clip(f"{summary} {asked}".strip(), self.summary_tokens)
+
+    def merge(self, summary, turns, blocking=True):
+        """
+        Put earlier history (e.g. from another process) in front of this session's turns.
+        Waits for a running compaction first, unless `blocking` is False, in which case nothing
+        is merged and False is returned.
+        """
+        if not self._compacting.acquire(blocking=blocking):
+            return False
+        try:
+            with self._lock:
+                self.summary = self.summary or summary
+                self.turns = [tuple(turn) for turn in turns] + self.turns
+                self._generation += 1
+        finally:
+            self._compacting.release()
+        return True
+
+    def clear(self):
+        with self._lock:
+            self.summary = ""
+            self.turns = []
+            self._generation += 1
+
+
+_summarizer = None
+_summarizer_lock = threading.Lock()
+
+
+def default_summarizer():
+    """Shared low-temperature client on the cheaper FALLBACK_MODEL."""
+    global _summarizer
+    with _summarizer_lock:
+        if _summarizer is None:
+            _summarizer = create_chat_model(
+                model=Config.FALLBACK_MODEL,
+                temperature=0.0,
+                max_tokens=Config.MEMORY_SUMMARY_TOKENS,
+                timeout=30
+            )
+        return _summarizer
+
+
+class SessionStore:
+    """Per-session memories with LRU eviction and an idle timeout; summaries run in the background."""
+
+    def __init__(self, max_sessions=None, ttl=None, **memory_options):
+        """
+        Initialize the store.
+        Args:
+            max_sessions (int): Sessions kept before the least recently used is dropped
+                (defaults to Config.MEMORY_MAX_SESSIONS)
+            ttl (float): Seconds an idle session is kept (defaults to Config.MEMORY_SESSION_TTL)
+            **memory_options: Passed to every SessionMemory
+        """
+        self._sessions = TTLCache(
+            ttl=Config.MEMORY_SESSION_TTL if ttl is None else ttl,
+            max_size=max_sessions or Config.MEMORY_MAX_SESSIONS
+        )
+        self._memory_options = memory_options
+        self._lock = threading.Lock()
+        self._compactor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="memory")
+
+    def get(self, session_id):
+        """Return the memory for `session_id`, creating it if needed."""
+        with self._lock:
+            memory = self._sessions.get(session_id)
+            if memory is None:
+                memory = SessionMemory(**self._memory_options)
+            # Re-set on every access so the TTL counts idle time
+            self._sessions.set(session_id, memory)
+            return memory
+
+    def history(self, session_id):
+        """Chat history for the agent, or None for a stateless request."""
+        if session_id is None:
+            return None
+        return self.get(session_id).messages() or None
+
+    def record(self, session_id, user, assistant):
+        """Store a finished exchange and summarize older turns off the request path if needed."""
+        if session_id is None:
+            return
+        memory = self.get(session_id)
+        if memory.add_turn(user, assistant):
+            self._compactor.submit(memory.compact)
+
+    def clear(self, session_id):
+        with self._lock:
+            memory = self._sessions.get(session_id)
+        if memory is not None:
+            memory.clear()
+
+    def export(self):
+        """Plain-data copy of every live session ({session_id: {"summary", "turns"}}), e.g. to hand to another process."""
+        sessions = {}
+        for session_id, memory in self._sessions.items():
+            with memory._lock:
+                sessions[session_id] = {"summary": memory.summary, "turns": list(memory.turns)}
+        return sessions
+
+    def restore(self, sessions):
+        """
+        Load sessions produced by `export`.
+        Turns already recorded here for the same session are kept after the restored ones.
+        """
+        for session_id, state in sessions.items():
+            memory = self.get(session_id)
+            if memory.merge(state["summary"], state["turns"], blocking=False):
+                if memory.needs_compaction():
+                    self._compactor.submit(memory.compact)
+            else:
+                # Being compacted: merge once that is done, off the caller's thread
+                self._compactor.submit(self._merge_later, memory, state)
+
+    def _merge_later(self, memory, state):
+        memory.merge(state["summary"], state["turns"])
+        if memory.needs_compaction():
+            memory.compact()
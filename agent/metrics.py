@@ -0,0 +1,320 @@
+import json
+import os
+import threading
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Latency buckets in seconds, from cache hits up to the 60 s LLM timeout
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimate a quantile as the upper bound of the bucket containing it."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return self.buckets[index] if index < len(self.buckets) else float("inf")
+        return float("inf")
+
+
+class MetricsRegistry:
+    """Thread-safe in-process counters and histograms keyed by name and labels."""
+
+    def __init__(self):
+        self._counters = {}
+        self._histograms = {}
+        self._help = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def describe(self, name, help_text):
+        """Set the help text shown for a metric in the Prometheus export."""
+        self._help[name] = help_text
+
+    def inc(self, name, value=1, **labels):
+        """Increment a counter."""
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """Record a value (usually seconds) in a histogram."""
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def register_collector(self, collector):
+        """
+        Register a callable polled at export time.
+        Args:
+            collector (callable): Returns a list of (name, labels dict, value) counter samples
+        """
+        self._collectors.append(collector)
+
+    def _counter_samples(self):
+        with self._lock:
+            samples = dict(self._counters)
+        for collector in self._collectors:
+            for name, labels, value in collector():
+                key = self._key(name, labels)
+                samples[key] = samples.get(key, 0) + value
+        return samples
+
+    def snapshot(self):
+        """Return all metrics as a JSON-serializable dict."""
+        with self._lock:
+            histograms = list(self._histograms.items())
+        return {
+            "timestamp": time.time(),
+            "counters": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._counter_samples().items())
+            ],
+            "histograms": [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": h.count,
+                    "sum": h.sum,
+                    "p50": h.quantile(0.5),
+                    "p95": h.quantile(0.95),
+                    "p99": h.quantile(0.99)
+                }
+                for (name, labels), h in sorted(histograms, key=lambda item: item[0])
+            ]
+        }
+
+    def to_prometheus(self):
+        """Render all metrics in the Prometheus text exposition format."""
+        lines = []
+        described = set()
+
+        def header(name, kind):
+            if name not in described:
+                described.add(name)
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        def fmt(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"') for _, v in pairs)
+            return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+        for (name, labels), value in sorted(self._counter_samples().items()):
+            header(name, "counter")
+            lines.append(f"{name}{fmt(labels)} {value}")
+
+        with self._lock:
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+            for (name, labels), h in histograms:
+                header(name, "histogram")
+                cumulative = 0
+                for bound, count in zip(h.buckets, h.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{fmt(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_bucket{fmt(labels, [('le', '+Inf')])} {h.count}")
+                lines.append(f"{name}_sum{fmt(labels)} {h.sum}")
+                lines.append(f"{name}_count{fmt(labels)} {h.count}")
+
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        """Clear all recorded values (collectors stay registered)."""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+# Process-wide registry used by the agents, tools and exporters
+metrics = MetricsRegistry()
+metrics.describe("llm_call_seconds", "Latency of each LLM call")
+metrics.describe("llm_tokens_total", "Prompt and completion tokens reported by the LLM")
+metrics.describe("tool_call_seconds", "Latency of each tool call")
+metrics.describe("agent_iteration_seconds", "Latency of one agent step (LLM decision plus tool calls)")
+metrics.describe("agent_run_seconds", "End-to-end latency of an agent run")
+metrics.describe("cache_requests_total", "Cache lookups by cache and result")
+
+
+def _weather_cache_samples():
+    # The tools package stays free of agent imports, so its cache is polled here
+    from tools.weather_tool import weather_cache, weather_requests
+    from tools.forecast import forecast_cache, forecast_requests
+    return [
+        ("cache_requests_total", {"cache": "weather", "result": "hit"}, weather_cache.hits),
+        ("cache_requests_total", {"cache": "weather", "result": "miss"}, weather_cache.misses),
+        ("cache_requests_total", {"cache": "forecast", "result": "hit"}, forecast_cache.hits),
+        ("cache_requests_total", {"cache": "forecast", "result": "miss"}, forecast_cache.misses),
+        ("coalesced_requests_total", {"api": "weather"}, weather_requests.coalesced),
+        ("coalesced_requests_total", {"api": "forecast"}, forecast_requests.coalesced)
+    ]
+
+
+metrics.register_collector(_weather_cache_samples)
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """Record LLM, tool and agent-run timings and token counts into a MetricsRegistry."""
+
+    def __init__(self, registry=None):
+        self.registry = registry or metrics
+        self._starts = {}
+
+    def _model_name(self, serialized, kwargs):
+        params = kwargs.get("invocation_params") or {}
+        metadata = kwargs.get("metadata") or {}
+        return (
+            params.get("model_name") or params.get("model") or metadata.get("ls_model_name")
+            or ((serialized or {}).get("kwargs") or {}).get("model_name") or "unknown"
+        )
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._starts[run_id] = (time.perf_counter(), self._model_name(serialized, kwargs))
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._starts[run_id] = (time.perf_counter(), self._model_name(serialized, kwargs))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        start, model = self._starts.pop(run_id, (None, "unknown"))
+        if start is not None:
+            self.registry.observe("llm_call_seconds", time.perf_counter() - start, model=model)
+        self.registry.inc("llm_calls_total", model=model)
+
+        prompt_tokens, completion_tokens = self._token_usage(response)
+        if prompt_tokens or completion_tokens:
+            self.registry.inc("llm_tokens_total", prompt_tokens, model=model, kind="prompt")
+            self.registry.inc("llm_tokens_total", completion_tokens, model=model, kind="completion")
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        _, model = self._starts.pop(run_id, (None, "unknown"))
+        self.registry.inc("llm_errors_total", model=model)
+
+    @staticmethod
+    def _token_usage(response):
+        """Read token counts from llm_output (non-streaming) or message usage metadata (streaming)."""
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        if usage:
+            return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                metadata = getattr(message, "usage_metadata", None)
+                if metadata:
+                    return metadata.get("input_tokens", 0), metadata.get("output_tokens", 0)
+        return 0, 0
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self._starts[run_id] = (time.perf_counter(), (serialized or {}).get("name", "unknown"))
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        start, tool = self._starts.pop(run_id, (None, kwargs.get("name", "unknown")))
+        if start is not None:
+            self.registry.observe("tool_call_seconds", time.perf_counter() - start, tool=tool)
+        self.registry.inc("tool_calls_total", tool=tool)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        _, tool = self._starts.pop(run_id, (None, kwargs.get("name", "unknown")))
+        self.registry.inc("tool_errors_total", tool=tool)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, **kwargs):
+        if parent_run_id is None:
+            self._starts[run_id] = (time.perf_counter(), None)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        entry = self._starts.pop(run_id, None)
+        if entry is not None:
+            self.registry.observe("agent_run_seconds", time.perf_counter() - entry[0])
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        if self._starts.pop(run_id, None) is not None:
+            self.registry.inc("agent_run_errors_total")
+
+
+class JsonLinesExporter:
+    """Append a metrics snapshot to a JSON-lines file at a fixed interval."""
+
+    def __init__(self, path, interval=60.0, registry=None):
+        self.path = path
+        self.interval = interval
+        self.registry = registry or metrics
+        self._stop = threading.Event()
+        self._thread = None
+
+    def export_once(self):
+        with open(self.path, "a") as f:
+            f.write(json.dumps(self.registry.snapshot()) + "\n")
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.export_once()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self.export_once()
+
+
+class PrometheusFileExporter(JsonLinesExporter):
+    """Rewrite a Prometheus text file at a fixed interval (for node_exporter's textfile collector)."""
+
+    def export_once(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.registry.to_prometheus())
+        os.replace(tmp_path, self.path)
+
+
+def start_exporter(kind, path, interval=60.0):
+    """
+    Start a background exporter.
+    Args:
+        kind (str): "jsonl" or "prometheus"
+        path (str): Output file
+        interval (float): Seconds between exports
+    Returns:
+        The started exporter, or None if `kind` is empty
+    """
+    if not kind:
+        return None
+    exporters = {"jsonl": JsonLinesExporter, "prometheus": PrometheusFileExporter}
+    if kind not in exporters:
+        raise ValueError(f"Unknown metrics exporter: {kind} (expected 'jsonl' or 'prometheus')")
+    return exporters[kind](path, interval).start()
@@ -0,0 +1,303 @@
+import asyncio
+import contextvars
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain.agents import AgentExecutor
+from langchain_core.agents import AgentAction
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.pydantic_v1 import PrivateAttr
+from langchain_core.runnables import ensure_config
+
+from config import Config
+from .metrics import metrics
+
+_speculation_pool = None
+_speculation_pool_lock = threading.Lock()
+
+
+def _get_speculation_pool():
+    """Shared pool for tool calls started while the model is still streaming, created on first use."""
+    global _speculation_pool
+    if _speculation_pool is None:
+        with _speculation_pool_lock:
+            if _speculation_pool is None:
+                _speculation_pool = ThreadPoolExecutor(
+                    max_workers=Config.TOOL_CONCURRENCY * 4, thread_name_prefix="speculative"
+                )
+    return _speculation_pool
+
+
+# Speculative runs would otherwise inherit the streaming LLM run's callbacks; the reused result is reported
+# once, when the executor runs the action
+_UNTRACED = {"callbacks": []}
+
+
+def _call_key(name, args):
+    return name, json.dumps(args, sort_keys=True, default=str)
+
+
+class ToolCallStreamParser:
+    """
+    Reassembles streamed tool-call chunks.
+
+    Chunks of one call share an `index`; the name and id arrive with the first
+    chunk and the JSON arguments are split over several. `feed` reports each
+    call once, as soon as its arguments parse as a complete JSON object.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._reported = set()
+
+    def feed(self, tool_call_chunks) -> list:
+        """
+        Add streamed chunks.
+        Args:
+            tool_call_chunks (list): `AIMessageChunk.tool_call_chunks` of one streamed chunk
+        Returns:
+            list: (name, args) of every call whose arguments became complete with these chunks
+        """
+        touched = []
+        for chunk in tool_call_chunks:
+            index = chunk.get("index")
+            call = self._calls.setdefault(index, {"name": "", "args": ""})
+            call["name"] += chunk.get("name") or ""
+            call["args"] += chunk.get("args") or ""
+            if index not in touched:
+                touched.append(index)
+
+        complete = []
+        for index in touched:
+            call = self._calls[index]
+            arguments = call["args"].strip()
+            if index in self._reported or not call["name"] or not arguments.endswith("}"):
+                continue
+            try:
+                args = json.loads(arguments)
+            except ValueError:
+                continue
+            if isinstance(args, dict):
+                self._reported.add(index)
+                complete.append((call["name"], args))
+        return complete
+
+
+class _Speculation(BaseCallbackHandler):
+    """
+    Callback handler attached to the planning LLM call of one agent step.
+    Starts each allowed tool as soon as its call has streamed in full and keeps
+    the futures until the executor claims them for the final actions.
+    """
+
+    # Run on the streaming thread/loop itself, not in an executor, so tools start right away
+    run_inline = True
+
+    def __init__(self, tools, start):
+        self.tools = tools
+        self._start = start
+        self._parsers = {}
+        self._futures = {}
+
+    def on_llm_new_token(self, token, *, chunk=None, run_id=None, **kwargs):
+        tool_call_chunks = getattr(getattr(chunk, "message", None), "tool_call_chunks", None)
+        if not tool_call_chunks:
+            return
+        parser = self._parsers.setdefault(run_id, ToolCallStreamParser())
+        for name, args in parser.feed(tool_call_chunks):
+            key = _call_key(name, args)
+            if name in self.tools and key not in self._futures:
+                self._futures[key] = self._start(self.tools[name], args)
+
+    def take(self, agent_action):
+        """Future of the speculative run matching `agent_action`, if there is one."""
+        future = self._futures.pop(_call_key(agent_action.tool, agent_action.tool_input), None)
+        if future is not None:
+            metrics.inc("speculative_tool_calls_total", tool=agent_action.tool, result="used")
+        return future
+
+    def discard(self):
+        """Cancel (or, if already running, ignore) every run the final message did not ask for."""
+        futures, self._futures = self._futures, {}
+        for (name, _), future in futures.items():
+            future.cancel()
+            metrics.inc("speculative_tool_calls_total", tool=name, result="discarded")
+
+
+def _reuse(tool, future):
+    """Copy of `tool` that returns the speculative result instead of calling the API again."""
+    async def coroutine(*args, **kwargs):
+        return await asyncio.wrap_future(future)
+
+    # copy() leaves out fields marked exclude=True, which include the tool's callbacks
+    return tool.copy(update={
+        "func": lambda *args, **kwargs: future.result(),
+        "coroutine": coroutine,
+        "callbacks": tool.callbacks,
+        "callback_manager": tool.callback_manager
+    })
+
+
+class ParallelAgentExecutor(AgentExecutor):
+    """
+    AgentExecutor that runs the tool calls of a single agent step concurrently.
+
+    The stock executor already gathers tool calls on the async path but runs
+    them one after another in `invoke`/`stream`. Here every action is submitted
+    to a thread pool as soon as the agent emits it, and observations are still
+    returned in the order the model requested the calls.
+
+    Tools listed in `speculative_tools` start even earlier: while the model is
+    still streaming its message, as soon as a call's arguments are complete, so
+    generating the rest of the message overlaps with the tool latency. When the
+    final message asks for the same call the result is reused (tool callbacks
+    still fire); otherwise it is cancelled or, if already running, discarded.
+    Only side-effect-free lookups belong in that list.
+
+    The stock executor passes only callbacks down to the agent, so the
+    `configurable` values of the call config are handed to the agent as its
+    "configurable" input instead.
+    """
+
+    max_tool_concurrency: int = 4
+    """Maximum number of tool calls run at once within one agent step."""
+    speculative_tools: tuple = ()
+    """Names of tools that may start before the model has finished its message."""
+
+    _pending: dict = PrivateAttr(default_factory=dict)
+    _speculations: dict = PrivateAttr(default_factory=dict)
+    _configurables: dict = PrivateAttr(default_factory=dict)
+
+    def _register_run(self, config):
+        """Copy of `config` with a run id; its configurable values are kept for the agent calls of that run."""
+        config = ensure_config(config)
+        if config["configurable"]:
+            config["run_id"] = config.get("run_id") or uuid.uuid4()
+            self._configurables[config["run_id"]] = config["configurable"]
+        return config
+
+    def invoke(self, input, config=None, **kwargs):
+        config = self._register_run(config)
+        try:
+            return super().invoke(input, config, **kwargs)
+        finally:
+            self._configurables.pop(config.get("run_id"), None)
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        config = self._register_run(config)
+        try:
+            return await super().ainvoke(input, config, **kwargs)
+        finally:
+            self._configurables.pop(config.get("run_id"), None)
+
+    def stream(self, input, config=None, **kwargs):
+        config = self._register_run(config)
+        try:
+            yield from super().stream(input, config, **kwargs)
+        finally:
+            self._configurables.pop(config.get("run_id"), None)
+
+    async def astream(self, input, config=None, **kwargs):
+        config = self._register_run(config)
+        try:
+            async for step in super().astream(input, config, **kwargs):
+                yield step
+        finally:
+            self._configurables.pop(config.get("run_id"), None)
+
+    def _agent_inputs(self, inputs, run_manager):
+        """`inputs` plus the run's configurable values, if the call set any."""
+        configurable = self._configurables.get(run_manager.run_id) if run_manager is not None else None
+        return {**inputs, "configurable": configurable} if configurable else inputs
+
+    def _speculate(self, name_to_tool_map, run_manager, start):
+        """Attach a speculation handler to this step's LLM call; None if there is nothing to speculate on."""
+        tools = {name: name_to_tool_map[name] for name in self.speculative_tools if name in name_to_tool_map}
+        if not tools or run_manager is None:
+            return None
+        speculation = _Speculation(tools, start)
+        # Child managers (the agent's LLM call) copy inheritable_handlers when they are created
+        run_manager.inheritable_handlers = run_manager.inheritable_handlers + [speculation]
+        self._speculations[run_manager.run_id] = speculation
+        return speculation
+
+    def _end_speculation(self, speculation, run_manager):
+        if speculation is None:
+            return
+        self._speculations.pop(run_manager.run_id, None)
+        run_manager.inheritable_handlers = [
+            handler for handler in run_manager.inheritable_handlers if handler is not speculation
+        ]
+        speculation.discard()
+
+    def _tool_map(self, name_to_tool_map, agent_action, run_manager):
+        """`name_to_tool_map`, with the action's tool replaced by its speculative result if one was started."""
+        speculation = self._speculations.get(run_manager.run_id) if run_manager is not None else None
+        future = speculation.take(agent_action) if speculation is not None else None
+        if future is None:
+            return name_to_tool_map
+        return {**name_to_tool_map, agent_action.tool: _reuse(name_to_tool_map[agent_action.tool], future)}
+
+    def _iter_next_step(self, name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager=None):
+        start = time.perf_counter()
+        speculation = self._speculate(
+            name_to_tool_map, run_manager,
+            lambda tool, args: _get_speculation_pool().submit(contextvars.copy_context().run, tool.invoke, args, _UNTRACED)
+        )
+        steps = super()._iter_next_step(
+            name_to_tool_map, color_mapping, self._agent_inputs(inputs, run_manager), intermediate_steps, run_manager
+        )
+        submitted = []
+        with ThreadPoolExecutor(max_workers=self.max_tool_concurrency) as pool:
+            try:
+                for step in steps:
+                    if isinstance(step, AgentAction):
+                        # Start the tool now; _perform_agent_action picks up the result later
+                        ctx = contextvars.copy_context()
+                        self._pending[id(step)] = pool.submit(
+                            ctx.run,
+                            super()._perform_agent_action,
+                            self._tool_map(name_to_tool_map, step, run_manager), color_mapping, step, run_manager
+                        )
+                        submitted.append(id(step))
+                    yield step
+            finally:
+                for key in submitted:
+                    future = self._pending.pop(key, None)
+                    if future is not None:
+                        future.cancel()
+                self._end_speculation(speculation, run_manager)
+        self._record_iteration(start)
+
+    async def _aiter_next_step(self, name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager=None):
+        start = time.perf_counter()
+        speculation = self._speculate(name_to_tool_map, run_manager, lambda tool, args: asyncio.ensure_future(tool.ainvoke(args, _UNTRACED)))
+        try:
+            async for step in super()._aiter_next_step(
+                name_to_tool_map, color_mapping, self._agent_inputs(inputs, run_manager), intermediate_steps, run_manager
+            ):
+                yield step
+        finally:
+            self._end_speculation(speculation, run_manager)
+        self._record_iteration(start)
+
+    @staticmethod
+    def _record_iteration(start):
+        metrics.observe("agent_iteration_seconds", time.perf_counter() - start)
+        metrics.inc("agent_iterations_total")
+
+    def _perform_agent_action(self, name_to_tool_map, color_mapping, agent_action, run_manager=None):
+        future = self._pending.pop(id(agent_action), None)
+        if future is None:
+            return super()._perform_agent_action(
+                self._tool_map(name_to_tool_map, agent_action, run_manager), color_mapping, agent_action, run_manager
+            )
+        return future.result()
+
+    async def _aperform_agent_action(self, name_to_tool_map, color_mapping, agent_action, run_manager=None):
+        return await super()._aperform_agent_action(
+            self._tool_map(name_to_tool_map, agent_action, run_manager), color_mapping, agent_action, run_manager
+        )
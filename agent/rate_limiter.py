@@ -0,0 +1,388 @@
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import random
+import threading
+import time
+
+from config import Config
+from .metrics import metrics
+
+# Lower values are served first
+INTERACTIVE = 0
+BATCH = 1
+
+_priority = contextvars.ContextVar("llm_priority", default=INTERACTIVE)
+# Set while a call holds its admission, so ChatGroq's internal _generate -> _stream hop isn't charged twice
+_admitted = contextvars.ContextVar("llm_admitted", default=False)
+
+# Seconds between checks by waiters that are not at the head of the queue
+POLL_INTERVAL = 0.02
+
+
+class RateLimitTimeout(Exception):
+    """Raised when a request would wait longer than the scheduler allows; callers treat it like a failed call."""
+
+
+@contextlib.contextmanager
+def llm_priority(priority):
+    """Run the LLM calls made inside the block at `priority` (INTERACTIVE or BATCH)."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def set_llm_priority(priority):
+    """Set the priority for the rest of the current task or thread context."""
+    _priority.set(priority)
+
+
+def estimate_prompt_tokens(messages, tools=None):
+    """Rough prompt size: about 4 characters per token, plus the tool schemas sent with the call."""
+    chars = sum(len(str(getattr(message, "content", message))) for message in messages)
+    chars += len(str(tools)) if tools else 0
+    return chars // 4 + 4 * len(messages)
+
+
+class TokenBucket:
+    """
+    Token bucket sized so that no 60 s window exceeds `per_minute`.
+    `burst_seconds` worth of quota can be spent at once; the rest refills steadily.
+    The level may go negative when a single request costs more than the burst,
+    which delays whoever comes next instead of rejecting the large request.
+    """
+
+    def __init__(self, per_minute, burst_seconds=10):
+        self.capacity = max(1.0, per_minute * min(burst_seconds, 60) / 60)
+        self.rate = max(per_minute - self.capacity, per_minute / 60) / 60
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until `amount` (capped at the burst size) is available."""
+        self._refill(now)
+        needed = min(amount, self.capacity)
+        return 0.0 if self.level >= needed else (needed - self.level) / self.rate
+
+    def take(self, amount):
+        self.level -= amount
+
+    def give_back(self, amount):
+        self.level = min(self.capacity, self.level + amount)
+
+    def pause(self, seconds):
+        """Drain the bucket so the next unit is only available after `seconds` (after a 429)."""
+        self.level = min(self.level, 1 - seconds * self.rate)
+
+
+class ModelScheduler:
+    """
+    Client-side admission for one Groq model.
+
+    Each call waits until both its requests-per-minute and tokens-per-minute
+    buckets have room. Waiting calls are served by priority (interactive before
+    batch), then in arrival order. The token charge is an estimate: the prompt
+    size plus the model's recent average completion length. It is corrected
+    with the real usage once the response arrives.
+    """
+
+    def __init__(self, model, rpm, tpm, burst_seconds=None, max_wait=None):
+        self.model = model
+        self.requests = TokenBucket(rpm, Config.RATE_LIMIT_BURST_SECONDS if burst_seconds is None else burst_seconds)
+        self.tokens = TokenBucket(tpm, Config.RATE_LIMIT_BURST_SECONDS if burst_seconds is None else burst_seconds)
+        self.max_wait = Config.RATE_LIMIT_MAX_WAIT if max_wait is None else max_wait
+        self.avg_completion = 256.0
+        self._queue = []
+        self._order = itertools.count()
+        self._cond = threading.Condition()
+
+    def estimate(self, prompt_tokens, max_tokens=None):
+        """Expected total tokens for a call."""
+        completion = self.avg_completion if not max_tokens else min(self.avg_completion, max_tokens)
+        return int(prompt_tokens + completion)
+
+    def _enqueue(self, cost, priority):
+        ticket = [priority, next(self._order), cost, False]  # last field: withdrawn
+        with self._cond:
+            heapq.heappush(self._queue, ticket)
+        return ticket
+
+    def _poll(self, ticket):
+        """Admit `ticket` if it is at the head and the buckets allow. Returns 0 when admitted, else seconds to wait."""
+        with self._cond:
+            while self._queue and self._queue[0][3]:
+                heapq.heappop(self._queue)
+            if self._queue[0] is not ticket:
+                return POLL_INTERVAL
+            now = time.monotonic()
+            wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(ticket[2], now))
+            if wait > 0:
+                return wait
+            heapq.heappop(self._queue)
+            self.requests.take(1)
+            self.tokens.take(ticket[2])
+            self._cond.notify_all()
+            return 0.0
+
+    def _withdraw(self, ticket):
+        with self._cond:
+            ticket[3] = True
+            self._cond.notify_all()
+
+    def _timed_out(self, ticket):
+        self._withdraw(ticket)
+        metrics.inc("rate_limit_timeouts_total", model=self.model)
+        return RateLimitTimeout(
+            f"{self.model}: no rate-limit capacity within {self.max_wait}s ({len(self._queue)} calls queued)"
+        )
+
+    def acquire(self, cost, priority=None):
+        """Block until a call costing `cost` tokens may be sent."""
+        ticket = self._enqueue(cost, _priority.get() if priority is None else priority)
+        started = time.monotonic()
+        try:
+            while True:
+                wait = self._poll(ticket)
+                if wait == 0:
+                    break
+                remaining = started + self.max_wait - time.monotonic()
+                if remaining <= 0:
+                    raise self._timed_out(ticket)
+                with self._cond:
+                    self._cond.wait(min(wait, remaining))
+        except BaseException:
+            # A ticket left at the head would stall every later caller (e.g. after a KeyboardInterrupt)
+            self._withdraw(ticket)
+            raise
+        metrics.observe("rate_limit_wait_seconds", time.monotonic() - started, model=self.model)
+
+    async def aacquire(self, cost, priority=None):
+        """Async version of `acquire`; waits without blocking the event loop."""
+        ticket = self._enqueue(cost, _priority.get() if priority is None else priority)
+        started = time.monotonic()
+        try:
+            while True:
+                wait = self._poll(ticket)
+                if wait == 0:
+                    break
+                remaining = started + self.max_wait - time.monotonic()
+                if remaining <= 0:
+                    raise self._timed_out(ticket)
+                await asyncio.sleep(min(wait, remaining, POLL_INTERVAL * 5))
+        except asyncio.CancelledError:
+            self._withdraw(ticket)
+            raise
+        metrics.observe("rate_limit_wait_seconds", time.monotonic() - started, model=self.model)
+
+    def settle(self, estimated, usage=None):
+        """
+        Correct the token charge once the call is done.
+        Args:
+            estimated (int): Tokens charged at admission
+            usage (dict): token_usage from the response; None refunds the charge (the call never ran)
+        """
+        with self._cond:
+            if usage is None:
+                self.tokens.give_back(estimated)
+                self.requests.give_back(1)
+            else:
+                actual = usage.get("total_tokens") or (usage.get("prompt_tokens", 0) + usage.get("completion_tokens", 0))
+                if actual:
+                    self.tokens.give_back(estimated - actual)
+                if usage.get("completion_tokens"):
+                    self.avg_completion = 0.8 * self.avg_completion + 0.2 * usage["completion_tokens"]
+            self._cond.notify_all()
+
+    def backoff(self, attempt, error=None):
+        """
+        Seconds to wait before retrying after a failed call.
+        On a 429 the whole model pauses, so queued calls don't all retry into the same wall.
+        """
+        delay = min(Config.RATE_LIMIT_BACKOFF_MAX, Config.RATE_LIMIT_BACKOFF_BASE * 2 ** attempt)
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        # Equal jitter: spread retries out but never retry immediately
+        delay = delay / 2 + random.uniform(0, delay / 2)
+        if _is_rate_limited(error):
+            metrics.inc("rate_limited_total", model=self.model)
+            with self._cond:
+                self.requests.pause(delay)
+        return delay
+
+
+def _status_code(error):
+    return getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+
+
+def _is_rate_limited(error):
+    return error is not None and (_status_code(error) == 429 or "rate limit" in str(error).lower())
+
+
+def _is_retryable(error):
+    """429s, 5xx and connection problems are worth retrying; bad requests are not."""
+    if isinstance(error, RateLimitTimeout):
+        return False
+    status = _status_code(error)
+    if status is not None:
+        return status == 429 or status >= 500
+    return _is_rate_limited(error) or "connection" in type(error).__name__.lower() or "timeout" in type(error).__name__.lower()
+
+
+def _retry_after(error):
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+def split_rate_limits(limits, parts):
+    """
+    Each process's share of `limits` when `parts` processes call Groq with the same key.
+    Args:
+        limits (dict): model -> (requests per minute, tokens per minute), as in Config.RATE_LIMITS
+        parts (int): Number of processes sharing the quota
+    Returns:
+        dict: model -> (requests per minute, tokens per minute) for one process
+    """
+    parts = max(1, parts)
+    return {model: (rpm / parts, tpm / parts) for model, (rpm, tpm) in limits.items()}
+
+
+def get_scheduler(model):
+    """Shared scheduler for `model`, using the limits in Config.RATE_LIMITS."""
+    with _schedulers_lock:
+        scheduler = _schedulers.get(model)
+        if scheduler is None:
+            rpm, tpm = Config.RATE_LIMITS.get(model, Config.RATE_LIMITS.get("default", (30, 6000)))
+            scheduler = _schedulers[model] = ModelScheduler(model, rpm, tpm)
+        return scheduler
+
+
+class RateLimitedChatModelMixin:
+    """
+    Routes a chat model's calls through the model's ModelScheduler.
+    429s and transient errors are retried here with jittered backoff, so the
+    underlying client should be created with max_retries=0.
+    """
+
+    def _admission(self, messages, kwargs):
+        scheduler = get_scheduler(getattr(self, "model_name", None) or getattr(self, "model", "default"))
+        cost = scheduler.estimate(estimate_prompt_tokens(messages, kwargs.get("tools")), self.max_tokens)
+        return scheduler, cost
+
+    @staticmethod
+    def _usage(result):
+        return (result.llm_output or {}).get("token_usage") or {}
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        if _admitted.get():
+            return super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        scheduler, cost = self._admission(messages, kwargs)
+        for attempt in itertools.count():
+            scheduler.acquire(cost)
+            token = _admitted.set(True)
+            try:
+                result = super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            except Exception as e:
+                scheduler.settle(cost, None if _is_rate_limited(e) else {})
+                if attempt >= self.scheduler_retries or not _is_retryable(e):
+                    raise
+                time.sleep(scheduler.backoff(attempt, e))
+                continue
+            finally:
+                _admitted.reset(token)
+            scheduler.settle(cost, self._usage(result))
+            return result
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        if _admitted.get():
+            return await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        scheduler, cost = self._admission(messages, kwargs)
+        for attempt in itertools.count():
+            await scheduler.aacquire(cost)
+            token = _admitted.set(True)
+            try:
+                result = await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            except Exception as e:
+                scheduler.settle(cost, None if _is_rate_limited(e) else {})
+                if attempt >= self.scheduler_retries or not _is_retryable(e):
+                    raise
+                await asyncio.sleep(scheduler.backoff(attempt, e))
+                continue
+            finally:
+                _admitted.reset(token)
+            scheduler.settle(cost, self._usage(result))
+            return result
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        if _admitted.get():
+            yield from super()._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+            return
+        scheduler, cost = self._admission(messages, kwargs)
+        for attempt in itertools.count():
+            scheduler.acquire(cost)
+            started = False
+            try:
+                for chunk in super()._stream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                    started = True
+                    yield chunk
+            except Exception as e:
+                scheduler.settle(cost, None if _is_rate_limited(e) else {})
+                # Chunks already reached the caller: a retry would duplicate them
+                if started or attempt >= self.scheduler_retries or not _is_retryable(e):
+                    raise
+                time.sleep(scheduler.backoff(attempt, e))
+                continue
+            # Streamed responses carry no usage; the estimate stands
+            scheduler.settle(cost, {})
+            return
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        if _admitted.get():
+            async for chunk in super()._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                yield chunk
+            return
+        scheduler, cost = self._admission(messages, kwargs)
+        for attempt in itertools.count():
+            await scheduler.aacquire(cost)
+            started = False
+            try:
+                async for chunk in super()._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                    started = True
+                    yield chunk
+            except Exception as e:
+                scheduler.settle(cost, None if _is_rate_limited(e) else {})
+                if started or attempt >= self.scheduler_retries or not _is_retryable(e):
+                    raise
+                await asyncio.sleep(scheduler.backoff(attempt, e))
+                continue
+            scheduler.settle(cost, {})
+            return
+
+
+_rate_limited_classes = {}
+
+
+def rate_limited(model_class):
+    """Return a subclass of `model_class` (e.g. ChatGroq) whose calls go through the scheduler."""
+    if model_class not in _rate_limited_classes:
+        _rate_limited_classes[model_class] = type(
+            f"RateLimited{model_class.__name__}",
+            (RateLimitedChatModelMixin, model_class),
+            {"__annotations__": {"scheduler_retries": int}, "scheduler_retries": 4}
+        )
+    return _rate_limited_classes[model_class]
@@ -0,0 +1,271 @@
+import asyncio
+import hashlib
+import logging
+import re
+import threading
+import uuid
+
+from config import Config
+from tools.cache import TTLCache
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Nearest cached queries checked for one with the same places and topics
+SEMANTIC_CANDIDATES = 5
+
+# Words that don't change what a travel question is asking for
+FILLER_WORDS = {
+    "a", "an", "the", "is", "are", "was", "be", "in", "at", "of", "for", "like",
+    "what", "whats", "how", "hows", "can", "could", "would", "you", "me", "i",
+    "please", "tell", "show", "give", "about", "currently", "current", "right", "now", "today"
+}
+
+# Keywords that tie a query to the tool whose data it depends on
+TOPIC_KEYWORDS = {
+    "weather": ("weather", "temperature", "forecast", "rain", "sunny", "snow", "humid", "climate"),
+    "cost": ("cost", "price", "fare", "budget", "cheap", "expensive", "how much", "fly", "flight"),
+    "recommendations": ("recommend", "attraction", "restaurant", "hotel", "things to do", "sightseeing", "where to eat", "where to stay")
+}
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, strip punctuation and filler words and canonicalize place names so equivalent phrasings match."""
+    from tools.gazetteer import resolve_place
+    from .workflow import extract_places
+
+    for name in extract_places(query):
+        place = resolve_place(name)
+        if place is not None:
+            query = re.sub(rf"\b{re.escape(name)}\b", place.id, query)
+    text = query.lower().replace("'", "").replace("’", "")
+    tokens = re.findall(r"[a-z0-9]+", text)
+    return " ".join(token for token in tokens if token not in FILLER_WORDS)
+
+
+def query_topics(query: str) -> list:
+    """Return the tool topics a query depends on."""
+    text = query.lower()
+    return [topic for topic, keywords in TOPIC_KEYWORDS.items() if any(k in text for k in keywords)]
+
+
+def query_signature(query: str) -> dict:
+    """
+    What a semantic neighbour must share with `query` to be reused: its places, in order, and its topics.
+    Embeddings barely tell "London to Paris" from "Paris to London", or the same question about two cities.
+    """
+    from tools.gazetteer import resolve_place
+    from .workflow import extract_places
+
+    places = []
+    for name in extract_places(query):
+        place = resolve_place(name)
+        places.append(place.id if place is not None else name.lower())
+    return {"places": ",".join(places), "topics": ",".join(query_topics(query))}
+
+
+class ResponseCache:
+    """
+    Cache of full agent answers in front of the tool-calling agent.
+    Lookups try an exact hash of the normalized query first and then, when
+    chromadb is available, the most similar cached query above a cosine
+    similarity threshold. Entries expire according to the most volatile tool
+    their query depends on, so weather answers go stale long before
+    recommendations do.
+    """
+
+    def __init__(self, max_size=None, similarity_threshold=None, topic_ttls=None, semantic=True):
+        """
+        Initialize the response cache.
+        Args:
+            max_size (int): Maximum number of cached answers (defaults to Config.RESPONSE_CACHE_SIZE)
+            similarity_threshold (float): Minimum cosine similarity for a semantic hit (defaults to Config.RESPONSE_CACHE_SIMILARITY)
+            topic_ttls (dict): Seconds an answer stays fresh per topic, plus a "default" entry
+            semantic (bool): Enable embedding-similarity lookups
+        """
+        self.max_size = max_size or Config.RESPONSE_CACHE_SIZE
+        self.similarity_threshold = similarity_threshold or Config.RESPONSE_CACHE_SIMILARITY
+        self.topic_ttls = topic_ttls or {
+            "weather": Config.RESPONSE_CACHE_TTL_WEATHER,
+            "cost": Config.RESPONSE_CACHE_TTL_COST,
+            "recommendations": Config.RESPONSE_CACHE_TTL_RECOMMENDATIONS,
+            "default": Config.RESPONSE_CACHE_TTL_DEFAULT
+        }
+        self._entries = TTLCache(ttl=self.topic_ttls["default"], max_size=self.max_size)
+        self._lock = threading.Lock()
+        self._indexed = set()
+        # chromadb is slow to import, so the collection is created by `warm` or on first use
+        self.semantic = semantic
+        self._collection_created = False
+        self._collection = None
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.latency_saved = 0.0
+
+    def warm(self):
+        """Create the embedding collection and load its embedding model now rather than on the first request."""
+        with self._lock:
+            collection = self._get_collection()
+            if collection is None:
+                return
+            try:
+                # Embedding a document loads (or downloads) the model
+                collection.upsert(ids=["warm-up"], documents=["warm up"])
+                collection.delete(ids=["warm-up"])
+            except Exception as e:
+                logger.warning(f"Semantic cache warm-up failed: {e}")
+
+    def _get_collection(self):
+        """Return the embedding collection, or None if semantic lookups are unavailable."""
+        if not self._collection_created:
+            self._collection_created = True
+            if self.semantic:
+                self._collection = self._create_collection()
+        return self._collection
+
+    def _create_collection(self):
+        """Create an in-memory chromadb collection, or None if chromadb is unavailable."""
+        try:
+            import chromadb
+
+            client = chromadb.EphemeralClient()
+            return client.create_collection(
+                name=f"response-cache-{uuid.uuid4().hex[:8]}",
+                metadata={"hnsw:space": "cosine"}
+            )
+        except Exception as e:
+            logger.warning(f"Semantic response cache disabled: {e}")
+            return None
+
+    @staticmethod
+    def _key(normalized: str) -> str:
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+    def ttl_for(self, query: str) -> float:
+        """Seconds an answer to `query` stays fresh: the shortest TTL of its topics."""
+        topics = query_topics(query)
+        if not topics:
+            return self.topic_ttls["default"]
+        return min(self.topic_ttls.get(topic, self.topic_ttls["default"]) for topic in topics)
+
+    def get(self, query: str):
+        """Return a cached answer for `query`, or None."""
+        normalized = normalize_query(query)
+        entry = self._entries.get(self._key(normalized))
+        if entry is not None:
+            return self._hit(entry, "hit")
+        return self._semantic_result(self._semantic_lookup(normalized, query))
+
+    async def aget(self, query: str):
+        """`get` for coroutines: the embedding lookup runs on a worker thread, off the event loop."""
+        normalized = normalize_query(query)
+        entry = self._entries.get(self._key(normalized))
+        if entry is not None:
+            return self._hit(entry, "hit")
+        if not self._indexed:
+            return self._semantic_result(None)
+        return self._semantic_result(await asyncio.to_thread(self._semantic_lookup, normalized, query))
+
+    def _hit(self, entry, result):
+        if result == "hit":
+            self.exact_hits += 1
+        else:
+            self.semantic_hits += 1
+        self.latency_saved += entry[1]
+        metrics.inc("cache_requests_total", cache="response", result=result)
+        return entry[0]
+
+    def _semantic_result(self, entry):
+        if entry is not None:
+            return self._hit(entry, "semantic_hit")
+        self.misses += 1
+        metrics.inc("cache_requests_total", cache="response", result="miss")
+        return None
+
+    def _semantic_lookup(self, normalized: str, query: str):
+        if not normalized or not self._indexed:
+            return None
+        with self._lock:
+            try:
+                result = self._collection.query(
+                    query_texts=[normalized],
+                    n_results=min(SEMANTIC_CANDIDATES, len(self._indexed)),
+                    include=["distances", "metadatas"]
+                )
+            except Exception as e:
+                logger.warning(f"Semantic cache lookup failed: {e}")
+                return None
+            if not result["ids"] or not result["ids"][0]:
+                return None
+            signature = query_signature(query)
+            for key, distance, metadata in zip(result["ids"][0], result["distances"][0], result["metadatas"][0]):
+                if 1.0 - distance < self.similarity_threshold:
+                    return None
+                # Close wording isn't enough: a different route or city is a different question
+                if (metadata or {}) != signature:
+                    continue
+                entry = self._entries.get(key)
+                if entry is None:
+                    # Expired or evicted from the exact layer: drop the stale embedding too
+                    self._collection.delete(ids=[key])
+                    self._indexed.discard(key)
+                return entry
+            return None
+
+    def set(self, query: str, response: str, latency: float = 0.0):
+        """
+        Cache an answer.
+        Args:
+            query (str): The user's query
+            response (str): The agent's answer
+            latency (float): Seconds it took to produce the answer, reported as saved on later hits
+        """
+        normalized = normalize_query(query)
+        key = self._key(normalized)
+        self._entries.set(key, (response, latency), ttl=self.ttl_for(query))
+        self._index(normalized, key, query)
+
+    async def aset(self, query: str, response: str, latency: float = 0.0):
+        """`set` for coroutines: the answer is stored inline and embedded on a worker thread."""
+        normalized = normalize_query(query)
+        key = self._key(normalized)
+        self._entries.set(key, (response, latency), ttl=self.ttl_for(query))
+        if normalized and self.semantic and (self._collection is not None or not self._collection_created):
+            await asyncio.to_thread(self._index, normalized, key, query)
+
+    def _index(self, normalized: str, key: str, query: str):
+        """Add the query's embedding to the semantic layer."""
+        if not normalized:
+            return
+        with self._lock:
+            if self._get_collection() is None:
+                return
+            try:
+                self._collection.upsert(ids=[key], documents=[normalized], metadatas=[query_signature(query)])
+                self._indexed.add(key)
+                if len(self._indexed) > 2 * self.max_size:
+                    self._prune()
+            except Exception as e:
+                logger.warning(f"Semantic cache insert failed: {e}")
+
+    def _prune(self):
+        """Remove embeddings whose answers were evicted or have expired."""
+        stale = [key for key in self._indexed if self._entries.get(key) is None]
+        if stale:
+            self._collection.delete(ids=stale)
+            self._indexed.difference_update(stale)
+
+    def stats(self):
+        """Return hit rates and the agent latency saved by cache hits."""
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        hits = self.exact_hits + self.semantic_hits
+        return {
+            "lookups": lookups,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "latency_saved": self.latency_saved,
+            "size": len(self._entries)
+        }
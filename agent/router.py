@@ -0,0 +1,250 @@
+import asyncio
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from config import Config
+from .main_agent import TravelAgent
+from .metrics import metrics
+from .workflow import COMPLEX_PATTERN, TravelPlanningWorkflow, parse_trip_request
+
+# How often a waiting hedge checks whether the primary has started answering
+HEDGE_POLL_INTERVAL = 0.05
+
+
+def classify_query(query: str) -> str:
+    """
+    Return "simple" for requests answered by at most one tool call, else "complex".
+    Uses the same parser as the structured workflow, so no LLM call is needed.
+    """
+    steps = TravelPlanningWorkflow.plan(parse_trip_request(query))
+    if len(steps) > 1 or COMPLEX_PATTERN.search(query) or len(query) > 300:
+        return "complex"
+    return "simple"
+
+
+def _run_in_thread(fn, *args):
+    """Run `fn` on a thread of its own (in the caller's context) and return a Future of its result."""
+    future = Future()
+    ctx = contextvars.copy_context()
+
+    def run():
+        future.set_running_or_notify_cancel()
+        try:
+            future.set_result(ctx.run(fn, *args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name="router-primary", daemon=True).start()
+    return future
+
+
+class _FirstTokenHandler(BaseCallbackHandler):
+    """Sets an event when a run starts streaming text, i.e. it has begun its answer."""
+
+    def __init__(self, event):
+        self.event = event
+
+    def on_llm_new_token(self, token, **kwargs):
+        if token:
+            self.event.set()
+
+
+class ModelRouter:
+    """
+    Drop-in replacement for TravelAgent that picks the model per request.
+
+    Simple single-tool lookups go to the fast agent (FALLBACK_MODEL) and
+    multi-tool or planning requests to the strong one (DEFAULT_MODEL).
+    Requests are hedged: if the chosen agent has neither finished nor started
+    streaming its answer by the hedge deadline, the same request is sent to the
+    other agent and the first success wins. A failure cascades to the other
+    agent right away instead of waiting out the timeout. The deadline is the
+    recent p95 latency of the chosen agent, so only the slow tail is duplicated.
+    """
+
+    def __init__(self, fast_agent: TravelAgent = None, strong_agent: TravelAgent = None, hedge_after=None, hedging=None):
+        """
+        Initialize the router.
+        Args:
+            fast_agent (TravelAgent): Agent for simple queries (defaults to FALLBACK_MODEL)
+            strong_agent (TravelAgent): Agent for complex queries (defaults to DEFAULT_MODEL)
+            hedge_after (float): Initial hedge deadline in seconds (defaults to Config.HEDGE_AFTER)
+            hedging (bool): Send hedged duplicates at all (defaults to Config.HEDGING_ENABLED)
+        """
+        self.fast_agent = fast_agent or TravelAgent(model=Config.FALLBACK_MODEL, verbose=False)
+        self.strong_agent = strong_agent or TravelAgent(model=Config.DEFAULT_MODEL)
+        self.hedge_after = Config.HEDGE_AFTER if hedge_after is None else hedge_after
+        self.hedging = Config.HEDGING_ENABLED if hedging is None else hedging
+        self.tools = self.strong_agent.tools
+        self._latencies = {id(self.fast_agent): deque(maxlen=200), id(self.strong_agent): deque(maxlen=200)}
+        self._lock = threading.Lock()
+        # Hedges only: one is sent when a worker is free and skipped otherwise, so they never queue
+        self._pool = ThreadPoolExecutor(max_workers=Config.HEDGE_POOL_SIZE, thread_name_prefix="router")
+        self._hedge_slots = threading.BoundedSemaphore(Config.HEDGE_POOL_SIZE)
+
+    @property
+    def agent_executor(self):
+        """Build both executors (used to warm up) and return the strong agent's."""
+        self.fast_agent.agent_executor
+        return self.strong_agent.agent_executor
+
+    def route(self, query: str):
+        """Return (primary, secondary) agents for `query`."""
+        if classify_query(query) == "simple":
+            return self.fast_agent, self.strong_agent
+        return self.strong_agent, self.fast_agent
+
+    def hedge_deadline(self, agent) -> float:
+        """Seconds to wait for `agent` before hedging: its recent p95 latency, within configured bounds."""
+        with self._lock:
+            samples = sorted(self._latencies[id(agent)])
+        if len(samples) < 20:
+            return self.hedge_after
+        p95 = samples[int(len(samples) * 0.95) - 1]
+        return min(max(p95, Config.HEDGE_MIN_DELAY), self.hedge_after)
+
+    def _record(self, agent, seconds):
+        with self._lock:
+            self._latencies[id(agent)].append(seconds)
+
+    def _timed_invoke(self, agent, input_text, chat_history, callbacks):
+        start = time.perf_counter()
+        result = agent.invoke(input_text, chat_history=chat_history, callbacks=callbacks)
+        self._record(agent, time.perf_counter() - start)
+        return result
+
+    async def _timed_ainvoke(self, agent, input_text, chat_history, callbacks):
+        start = time.perf_counter()
+        result = await agent.ainvoke(input_text, chat_history=chat_history, callbacks=callbacks)
+        self._record(agent, time.perf_counter() - start)
+        return result
+
+    @staticmethod
+    def _hedge_callbacks(callbacks):
+        """Callbacks for the duplicate run: handlers that stream one run's output to a user are left out."""
+        return [handler for handler in callbacks or [] if not getattr(handler, "single_run", False)]
+
+    def invoke(self, input_text, chat_history=None, callbacks=None):
+        """Route and, if the primary is slow or fails, hedge/cascade. Same contract as TravelAgent.invoke."""
+        primary, secondary = self.route(input_text)
+        metrics.inc("router_requests_total", model=primary.model)
+        if not self.hedging:
+            return self._timed_invoke(primary, input_text, chat_history, callbacks)
+
+        answering = threading.Event()
+        # The primary starts right away on a thread of its own, never behind queued hedges
+        primary_future = _run_in_thread(
+            self._timed_invoke, primary, input_text, chat_history,
+            list(callbacks or []) + [_FirstTokenHandler(answering)]
+        )
+        deadline = time.monotonic() + self.hedge_deadline(primary)
+        while not primary_future.done() and not answering.is_set() and time.monotonic() < deadline:
+            wait([primary_future], timeout=min(HEDGE_POLL_INTERVAL, max(0.0, deadline - time.monotonic())))
+
+        if answering.is_set() or (primary_future.done() and primary_future.exception() is None):
+            return primary_future.result()
+
+        if primary_future.done():
+            # Failed fast: cascade with the full callbacks, nothing else is streaming now
+            metrics.inc("router_cascades_total", model=secondary.model)
+            return self._timed_invoke(secondary, input_text, chat_history, callbacks)
+
+        if not self._hedge_slots.acquire(blocking=False):
+            # Every hedge worker is busy: the system is overloaded, and more duplicates would only add to it
+            metrics.inc("router_hedges_skipped_total", model=secondary.model)
+            return primary_future.result()
+        metrics.inc("router_hedges_total", model=secondary.model)
+        ctx = contextvars.copy_context()
+        secondary_future = self._pool.submit(
+            ctx.run, self._timed_invoke, secondary, input_text, chat_history, self._hedge_callbacks(callbacks)
+        )
+        secondary_future.add_done_callback(lambda _: self._hedge_slots.release())
+        pending = {primary_future, secondary_future}
+        while pending:
+            done, pending = wait(pending, timeout=HEDGE_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is secondary_future:
+                        metrics.inc("router_hedge_wins_total", model=secondary.model)
+                    # The loser finishes in the background (a thread can't be cancelled); a losing hedge
+                    # holds its worker until then, which caps how many can pile up
+                    return future.result()
+            if answering.is_set() and primary_future in pending:
+                # The primary began streaming to the user after all; stay with it
+                return primary_future.result()
+        # Both failed: report the primary's error
+        return primary_future.result()
+
+    async def ainvoke(self, input_text, chat_history=None, callbacks=None):
+        """Async version of `invoke`; the losing run is cancelled."""
+        primary, secondary = self.route(input_text)
+        metrics.inc("router_requests_total", model=primary.model)
+        if not self.hedging:
+            return await self._timed_ainvoke(primary, input_text, chat_history, callbacks)
+
+        answering = threading.Event()
+        primary_task = asyncio.ensure_future(self._timed_ainvoke(
+            primary, input_text, chat_history, list(callbacks or []) + [_FirstTokenHandler(answering)]
+        ))
+        deadline = time.monotonic() + self.hedge_deadline(primary)
+        while not primary_task.done() and not answering.is_set() and time.monotonic() < deadline:
+            await asyncio.wait([primary_task], timeout=min(HEDGE_POLL_INTERVAL, max(0.0, deadline - time.monotonic())))
+
+        if answering.is_set() or (primary_task.done() and primary_task.exception() is None):
+            return await primary_task
+
+        if primary_task.done():
+            metrics.inc("router_cascades_total", model=secondary.model)
+            return await self._timed_ainvoke(secondary, input_text, chat_history, callbacks)
+
+        metrics.inc("router_hedges_total", model=secondary.model)
+        secondary_task = asyncio.ensure_future(self._timed_ainvoke(
+            secondary, input_text, chat_history, self._hedge_callbacks(callbacks)
+        ))
+        pending = {primary_task, secondary_task}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=HEDGE_POLL_INTERVAL, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is secondary_task:
+                            metrics.inc("router_hedge_wins_total", model=secondary.model)
+                        return task.result()
+                if answering.is_set() and primary_task in pending:
+                    return await primary_task
+            return primary_task.result()
+        finally:
+            for task in (primary_task, secondary_task):
+                task.cancel()
+
+    def stream(self, input_text, chat_history=None, callbacks=None):
+        """Stream from the routed agent (no hedging: chunks from two runs can't be merged)."""
+        primary, _ = self.route(input_text)
+        metrics.inc("router_requests_total", model=primary.model)
+        yield from primary.stream(input_text, chat_history=chat_history, callbacks=callbacks)
+
+    def get_tools(self):
+        return self.tools
+
+    def get_config(self):
+        return {
+            "fast": self.fast_agent.get_config(),
+            "strong": self.strong_agent.get_config(),
+            "hedging": self.hedging,
+            "hedge_after": self.hedge_after
+        }
+
+
+def create_primary_agent(**kwargs):
+    """The agent FallbackAgent should wrap: a ModelRouter when Config.MODEL_ROUTING is on, else a TravelAgent."""
+    if Config.MODEL_ROUTING:
+        return ModelRouter(
+            fast_agent=TravelAgent(model=Config.FALLBACK_MODEL, **{**kwargs, "verbose": False}),
+            strong_agent=TravelAgent(model=Config.DEFAULT_MODEL, **kwargs)
+        )
+    return TravelAgent(**kwargs)
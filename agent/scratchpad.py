@@ -0,0 +1,40 @@
+import json
+
+from langchain.agents.format_scratchpad.tools import format_to_tool_messages
+
+from config import Config
+from tools.results import ToolResult
+from .memory import clip
+
+
+def observation_text(observation) -> str:
+    """What the model sees of a tool result: the compact form of structured results."""
+    if isinstance(observation, str):
+        return observation
+    if isinstance(observation, ToolResult):
+        return observation.compact()
+    return json.dumps(observation, ensure_ascii=False, default=str)
+
+
+def compact_scratchpad(intermediate_steps, observation_tokens=None):
+    """
+    Format the agent scratchpad as tool messages, shortening observations the model has already acted on.
+    Observations of the latest iteration (the tool calls the model just made) are kept whole;
+    earlier ones are clipped, since they are re-sent with every further LLM call.
+    Args:
+        intermediate_steps (list): (action, observation) pairs from the executor
+        observation_tokens (int): Size limit of earlier observations, 0 for none
+            (defaults to Config.SCRATCHPAD_OBSERVATION_TOKENS)
+    Returns:
+        list: Messages for the agent_scratchpad placeholder
+    """
+    budget = Config.SCRATCHPAD_OBSERVATION_TOKENS if observation_tokens is None else observation_tokens
+    # Parallel tool calls of one iteration share the AI message that requested them
+    latest = intermediate_steps[-1][0].message_log[-1] if intermediate_steps else None
+    steps = []
+    for action, observation in intermediate_steps:
+        text = observation_text(observation)
+        if budget and action.message_log[-1] is not latest:
+            text = clip(text, budget)
+        steps.append((action, text))
+    return format_to_tool_messages(steps)
@@ -0,0 +1,327 @@
+import asyncio
+import contextlib
+import json
+
+from config import Config
+from .metrics import metrics
+
+MAX_BODY_BYTES = 64 * 1024
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+    504: "Gateway Timeout"
+}
+
+
+class ServerOverloaded(Exception):
+    """Raised when a request cannot be admitted; answered with 503."""
+
+
+class HTTPError(Exception):
+    """A request that should be answered with an error status."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class AdmissionController:
+    """
+    Bound the number of requests running at once.
+    Up to `concurrency` requests run, up to `max_queue` more wait for a slot,
+    and anything beyond that is shed immediately instead of piling up.
+    """
+
+    def __init__(self, concurrency, max_queue, queue_timeout):
+        self.concurrency = max(1, concurrency)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._semaphore = None
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        """Hold a concurrency slot for the duration of the block, or raise ServerOverloaded."""
+        if self._semaphore is None:
+            # Created lazily so it binds to the serving event loop
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        if self.active + self.waiting >= self.concurrency + self.max_queue:
+            self.rejected += 1
+            raise ServerOverloaded("Request queue is full")
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout or None)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise ServerOverloaded(f"No capacity within {self.queue_timeout}s")
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+    def stats(self):
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "concurrency": self.concurrency,
+            "max_queue": self.max_queue
+        }
+
+
+class TravelAgentServer:
+    """
+    Minimal asyncio HTTP/1.1 server exposing one shared FallbackAgent (or an AgentWorkerPool).
+
+    All requests go through the same agent executor, LLM clients and caches, so
+    one process serves many concurrent chat sessions. Endpoints:
+        POST /chat         {"query": ..., "session_id": ...} -> {"response": ...}
+        POST /chat/stream  {"query": ..., "session_id": ...} -> Server-Sent Events (token, tool_*, fallback, end, or error)
+        GET  /health       admission stats
+        GET  /metrics      Prometheus text
+    """
+
+    def __init__(self, agent=None, concurrency=None, max_queue=None, queue_timeout=None, request_timeout=None):
+        """
+        Initialize the server.
+        Args:
+            agent (FallbackAgent): Shared agent, or an AgentWorkerPool (a FallbackAgent is built on first use if omitted)
+            concurrency (int): Requests run at once (defaults to Config.SERVER_CONCURRENCY)
+            max_queue (int): Requests allowed to wait for a slot (defaults to Config.SERVER_MAX_QUEUE)
+            queue_timeout (float): Seconds a request may wait for a slot (defaults to Config.SERVER_QUEUE_TIMEOUT)
+            request_timeout (float): Seconds allowed per /chat request (defaults to Config.SERVER_REQUEST_TIMEOUT)
+        """
+        self._agent = agent
+        self.admission = AdmissionController(
+            concurrency or Config.SERVER_CONCURRENCY,
+            Config.SERVER_MAX_QUEUE if max_queue is None else max_queue,
+            Config.SERVER_QUEUE_TIMEOUT if queue_timeout is None else queue_timeout
+        )
+        self.request_timeout = Config.SERVER_REQUEST_TIMEOUT if request_timeout is None else request_timeout
+        self._server = None
+
+    @property
+    def agent(self):
+        if self._agent is None:
+            from .fallback_agent import FallbackAgent
+            from .router import create_primary_agent
+            self._agent = FallbackAgent(create_primary_agent(verbose=False))
+        return self._agent
+
+    async def start(self, host=None, port=None):
+        """Build the agent executor (or start the worker processes) and start listening. Returns the asyncio server."""
+        self.agent.warm()
+        self._server = await asyncio.start_server(
+            self._handle_connection,
+            host or Config.SERVER_HOST,
+            Config.SERVER_PORT if port is None else port,
+            backlog=self.admission.concurrency + self.admission.max_queue
+        )
+        return self._server
+
+    async def serve(self, host=None, port=None):
+        """Serve until cancelled."""
+        server = await self.start(host, port)
+        for sock in server.sockets:
+            print(f"🌐 Serving travel agent on http://{sock.getsockname()[0]}:{sock.getsockname()[1]}")
+        async with server:
+            await server.serve_forever()
+
+    def run(self, host=None, port=None):
+        """Blocking wrapper around `serve`."""
+        try:
+            asyncio.run(self.serve(host, port))
+        except KeyboardInterrupt:
+            pass
+
+    async def _handle_connection(self, reader, writer):
+        """Serve requests on one connection until the client closes it or asks to."""
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except HTTPError as e:
+                    await self._send_json(writer, e.status, {"error": str(e)}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                if not await self._dispatch(request, writer):
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+            with contextlib.suppress(Exception):
+                await writer.wait_closed()
+
+    @staticmethod
+    async def _read_request(reader):
+        """Parse one request, or return None when the client has closed the connection."""
+        line = await reader.readline()
+        if not line.strip():
+            return None
+        try:
+            method, path, version = line.decode("latin-1").split()
+        except ValueError:
+            raise HTTPError(400, "Malformed request line")
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            raise HTTPError(400, "Invalid Content-Length")
+        if length < 0:
+            raise HTTPError(400, "Invalid Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise HTTPError(413, f"Body larger than {MAX_BODY_BYTES} bytes")
+        body = await reader.readexactly(length) if length else b""
+
+        connection = headers.get("connection", "").lower()
+        keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+        return {
+            "method": method.upper(),
+            "path": path.split("?", 1)[0],
+            "headers": headers,
+            "body": body,
+            "keep_alive": keep_alive
+        }
+
+    async def _dispatch(self, request, writer):
+        """Route a request. Returns whether the connection can be reused."""
+        method, path, keep_alive = request["method"], request["path"], request["keep_alive"]
+        routes = {
+            "/chat": ("POST", self._chat),
+            "/chat/stream": ("POST", self._chat_stream),
+            "/health": ("GET", self._health),
+            "/metrics": ("GET", self._metrics)
+        }
+        if path not in routes:
+            status = 404
+            await self._send_json(writer, status, {"error": f"Unknown path: {path}"}, keep_alive)
+        elif method != routes[path][0]:
+            status = 405
+            await self._send_json(writer, status, {"error": f"{path} expects {routes[path][0]}"}, keep_alive)
+        else:
+            try:
+                status, keep_alive = await routes[path][1](request, writer)
+            except HTTPError as e:
+                status = e.status
+                await self._send_json(writer, status, {"error": str(e)}, keep_alive)
+            except ServerOverloaded as e:
+                status = 503
+                await self._send_json(writer, status, {"error": str(e)}, keep_alive,
+                                      headers={"Retry-After": "1"})
+            except (ConnectionError, asyncio.CancelledError):
+                raise
+            except Exception as e:
+                status, keep_alive = 500, False
+                await self._send_json(writer, status, {"error": str(e)}, keep_alive)
+        metrics.inc("server_requests_total", path=path if path in routes else "other", status=str(status))
+        return keep_alive
+
+    @staticmethod
+    def _query(request):
+        """Read the "query" and optional "session_id" fields from a JSON body."""
+        try:
+            payload = json.loads(request["body"] or b"{}")
+        except ValueError:
+            raise HTTPError(400, "Body must be JSON")
+        query = payload.get("query") if isinstance(payload, dict) else None
+        if not isinstance(query, str) or not query.strip():
+            raise HTTPError(400, 'Body must contain a non-empty "query" string')
+        session_id = payload.get("session_id")
+        if session_id is not None and not isinstance(session_id, str):
+            raise HTTPError(400, '"session_id" must be a string')
+        return query.strip(), session_id
+
+    async def _chat(self, request, writer):
+        query, session_id = self._query(request)
+        async with self.admission.slot():
+            try:
+                response = await asyncio.wait_for(
+                    self.agent.arun_with_fallback(query, session_id=session_id),
+                    timeout=self.request_timeout or None
+                )
+            except asyncio.TimeoutError:
+                raise HTTPError(504, f"Query timed out after {self.request_timeout}s")
+        await self._send_json(writer, 200, {"response": response}, request["keep_alive"])
+        return 200, request["keep_alive"]
+
+    async def _chat_stream(self, request, writer):
+        query, session_id = self._query(request)
+        async with self.admission.slot():
+            writer.write(self._head(200, {
+                "Content-Type": "text/event-stream",
+                "Cache-Control": "no-cache",
+                "Connection": "close"
+            }))
+            events = self.agent.astream_with_fallback(query, session_id=session_id)
+            try:
+                async for event in events:
+                    writer.write(f"event: {event['type']}\ndata: {json.dumps(event)}\n\n".encode())
+                    # Slow clients push back on the agent instead of buffering without limit
+                    await writer.drain()
+            except (ConnectionError, asyncio.CancelledError):
+                raise
+            except Exception as e:
+                # The 200 head is already out, so report the failure inside the stream and close it
+                error = {"type": "error", "error": str(e)}
+                writer.write(f"event: error\ndata: {json.dumps(error)}\n\n".encode())
+                with contextlib.suppress(ConnectionError):
+                    await writer.drain()
+                return 500, False
+            finally:
+                # Cancels the agent run if the client went away mid-stream
+                await events.aclose()
+        return 200, False
+
+    async def _health(self, request, writer):
+        await self._send_json(writer, 200, {"status": "ok", **self.admission.stats()}, request["keep_alive"])
+        return 200, request["keep_alive"]
+
+    async def _metrics(self, request, writer):
+        body = metrics.to_prometheus().encode()
+        writer.write(self._head(200, {
+            "Content-Type": "text/plain; version=0.0.4",
+            "Content-Length": str(len(body)),
+            "Connection": "keep-alive" if request["keep_alive"] else "close"
+        }) + body)
+        await writer.drain()
+        return 200, request["keep_alive"]
+
+    @staticmethod
+    def _head(status, headers):
+        lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    async def _send_json(self, writer, status, payload, keep_alive, headers=None):
+        body = json.dumps(payload).encode()
+        writer.write(self._head(status, {
+            "Content-Type": "application/json",
+            "Content-Length": str(len(body)),
+            "Connection": "keep-alive" if keep_alive else "close",
+            **(headers or {})
+        }) + body)
+        await writer.drain()
@@ -0,0 +1,44 @@
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+class StreamEventHandler(BaseCallbackHandler):
+    """
+    Callback handler that forwards LLM tokens and tool activity to a queue.
+    Events are dicts with a "type" of "token", "tool_start", "tool_end" or "tool_error".
+    """
+
+    # Events must come from one agent run; ModelRouter keeps it off hedged duplicates
+    single_run = True
+
+    def __init__(self, events, loop=None):
+        """
+        Args:
+            events (queue.Queue | asyncio.Queue): Queue receiving the events
+            loop (asyncio.AbstractEventLoop): Loop owning `events` when it is an asyncio.Queue;
+                callbacks may fire on worker threads, so events are handed over thread-safely
+        """
+        self.events = events
+        self.loop = loop
+
+    def _emit(self, event):
+        if self.loop is None:
+            self.events.put(event)
+        else:
+            self.loop.call_soon_threadsafe(self.events.put_nowait, event)
+
+    def on_llm_new_token(self, token, **kwargs):
+        if token:
+            self._emit({"type": "token", "content": token})
+
+    def on_tool_start(self, serialized, input_str, **kwargs):
+        self._emit({
+            "type": "tool_start",
+            "name": (serialized or {}).get("name", kwargs.get("name", "tool")),
+            "input": input_str
+        })
+
+    def on_tool_end(self, output, **kwargs):
+        self._emit({"type": "tool_end", "name": kwargs.get("name", "tool"), "output": str(output)})
+
+    def on_tool_error(self, error, **kwargs):
+        self._emit({"type": "tool_error", "name": kwargs.get("name", "tool"), "error": str(error)})
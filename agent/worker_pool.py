@@ -0,0 +1,400 @@
+"""
+Run agents in worker processes.
+
+With network waits overlapped, what is left of a request is CPU work that holds
+the GIL: prompt templating, tool argument validation, output parsing and
+tracing serialization. AgentWorkerPool spreads requests over several
+processes, each with its own warm FallbackAgent, so that work runs on all
+cores. It exposes the same `arun_with_fallback` / `astream_with_fallback`
+interface as FallbackAgent, so BatchQueryRunner and TravelAgentServer accept
+it in place of the in-process agent.
+
+- Requests of one session always go to the same worker (its conversation
+  memory lives there); stateless requests go to the least busy worker.
+- Requests and responses travel over one Pipe per worker as small tuples;
+  each worker runs many requests at once on its own event loop.
+- Every worker schedules its Groq calls against 1/N of Config.RATE_LIMITS,
+  so the pool as a whole stays within one account's quota.
+- After `max_requests` a worker is recycled: a replacement is started and
+  warmed first, new requests move to it, and the old worker finishes what it
+  is running and hands its sessions over before exiting.
+"""
+import asyncio
+import itertools
+import multiprocessing
+import os
+import signal
+import threading
+import zlib
+from concurrent.futures import Future
+
+from config import Config
+from .metrics import metrics
+from .rate_limiter import split_rate_limits
+
+
+class WorkerError(Exception):
+    """A request failed inside a worker process, or the worker exited while running it."""
+
+
+def default_agent():
+    """Agent each worker builds unless the pool is given another factory: the app's routed FallbackAgent."""
+    from .fallback_agent import FallbackAgent
+    from .router import create_primary_agent
+
+    if Config.CASSETTE_MODE == "replay":
+        # Replays are read-only, so every worker can share the cassette; recording needs a single process
+        from .cassette import install_cassettes
+        install_cassettes()
+    return FallbackAgent(create_primary_agent(verbose=False))
+
+
+def _worker_main(conn, agent_factory, rate_limits):
+    """Entry point of a worker process."""
+    # Ctrl+C reaches the whole process group; the parent decides when workers stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # This worker's share of the quota; set before any scheduler is created
+    Config.RATE_LIMITS = rate_limits
+    agent = agent_factory()
+    agent.warm()
+    conn.send(("ready", None, os.getpid()))
+    asyncio.run(_serve(conn, agent))
+    conn.close()
+
+
+def _receive(conn, loop, inbox):
+    """Blocking reads from the parent, handed to the worker's event loop."""
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            # The parent is gone: finish up and exit
+            message = ("drain", None, None)
+        loop.call_soon_threadsafe(inbox.put_nowait, message)
+        if message[0] == "drain":
+            return
+
+
+async def _serve(conn, agent):
+    loop = asyncio.get_running_loop()
+    inbox = asyncio.Queue()
+    tasks = {}
+    threading.Thread(target=_receive, args=(conn, loop, inbox), daemon=True).start()
+
+    def send(*message):
+        try:
+            conn.send(message)
+        except (BrokenPipeError, OSError):
+            pass
+
+    async def handle(kind, request_id, query, session_id):
+        try:
+            if kind == "run":
+                send("result", request_id, await agent.arun_with_fallback(query, session_id=session_id))
+            else:
+                async for event in agent.astream_with_fallback(query, session_id=session_id):
+                    send("event", request_id, event)
+                send("done", request_id, None)
+        except asyncio.CancelledError:
+            send("done", request_id, None)
+        except Exception as e:
+            send("error", request_id, f"{type(e).__name__}: {e}")
+        finally:
+            tasks.pop(request_id, None)
+
+    while True:
+        kind, request_id, payload = await inbox.get()
+        if kind in ("run", "stream"):
+            tasks[request_id] = asyncio.ensure_future(handle(kind, request_id, *payload))
+        elif kind == "cancel":
+            task = tasks.get(request_id)
+            if task is not None:
+                task.cancel()
+        elif kind == "restore":
+            if agent.memory is not None:
+                agent.memory.restore(payload)
+        elif kind == "drain":
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            send("drained", None, agent.memory.export() if agent.memory is not None else {})
+            return
+
+
+class _Worker:
+    """Parent-side handle of one worker process."""
+
+    def __init__(self, context, agent_factory, rate_limits):
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child, agent_factory, rate_limits), daemon=True)
+        self.process.start()
+        child.close()
+        self.ready = threading.Event()
+        self.drained = Future()
+        self.in_flight = 0
+        self.handled = 0
+        self.exited = False
+        self._handlers = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        threading.Thread(target=self._receive, name=f"worker-{self.process.pid}", daemon=True).start()
+
+    @property
+    def alive(self):
+        # `exited` is set as soon as the pipe closes, which can be a moment before the process is reaped
+        return not self.exited and self.process.is_alive() and not self.conn.closed
+
+    def submit(self, kind, query, session_id, handler):
+        """Send a request; `handler(kind, payload)` is called from the reader thread with each reply."""
+        with self._lock:
+            request_id = next(self._ids)
+            if not self.exited:
+                try:
+                    self.conn.send((kind, request_id, (query, session_id)))
+                    self._handlers[request_id] = handler
+                    self.in_flight += 1
+                    self.handled += 1
+                    return request_id
+                except OSError:
+                    pass
+        handler("error", f"Worker process {self.process.pid} exited")
+        return request_id
+
+    def send(self, kind, request_id=None, payload=None):
+        """Send a control message; dropped if the worker has already exited."""
+        with self._lock:
+            if not self.exited:
+                try:
+                    self.conn.send((kind, request_id, payload))
+                except OSError:
+                    pass
+
+    def _receive(self):
+        while True:
+            try:
+                kind, request_id, payload = self.conn.recv()
+            except (EOFError, OSError):
+                break
+            if kind == "ready":
+                self.ready.set()
+            elif kind == "drained":
+                self.drained.set_result(payload)
+                break
+            else:
+                with self._lock:
+                    handler = self._handlers.get(request_id)
+                    if kind in ("result", "error", "done"):
+                        self._handlers.pop(request_id, None)
+                        self.in_flight -= 1
+                if handler is not None:
+                    handler(kind, payload)
+
+        # Worker exited: fail whatever it was still running
+        with self._lock:
+            orphans, self._handlers = list(self._handlers.values()), {}
+            self.in_flight = 0
+            self.exited = True
+        for handler in orphans:
+            handler("error", f"Worker process {self.process.pid} exited")
+        self.ready.set()
+        if not self.drained.done():
+            self.drained.set_result({})
+
+    def stop(self, timeout):
+        """Let the worker finish its requests, then wait for it to exit. Returns its exported sessions."""
+        try:
+            self.send("drain")
+            sessions = self.drained.result(timeout=timeout)
+        except Exception:
+            sessions = {}
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
+        return sessions
+
+
+class AgentWorkerPool:
+    """Process pool of warm FallbackAgents with sticky sessions and graceful recycling."""
+
+    def __init__(self, workers=None, agent_factory=None, max_requests=None, start_method=None, start_timeout=120):
+        """
+        Initialize the pool (workers start on `warm` or on the first request).
+        Args:
+            workers (int): Worker processes (defaults to Config.WORKER_PROCESSES, or the CPU count if that is 0)
+            agent_factory (callable): Picklable zero-argument callable building each worker's agent
+                (defaults to `default_agent`)
+            max_requests (int): Requests a worker serves before it is recycled, 0 for never
+                (defaults to Config.WORKER_MAX_REQUESTS)
+            start_method (str): multiprocessing start method (defaults to Config.WORKER_START_METHOD)
+            start_timeout (float): Seconds a request waits for a (re)started worker to build its agent
+        """
+        self.size = max(1, workers or Config.WORKER_PROCESSES or os.cpu_count() or 1)
+        self.agent_factory = agent_factory or default_agent
+        self.max_requests = Config.WORKER_MAX_REQUESTS if max_requests is None else max_requests
+        self._context = multiprocessing.get_context(start_method or Config.WORKER_START_METHOD)
+        self.start_timeout = start_timeout
+        self._workers = []
+        self._recycling = set()
+        self._lock = threading.Lock()
+        self._closed = False
+        self.recycled = 0
+
+    def _start_worker(self):
+        # A worker being recycled still finishes its requests on its share while the replacement starts
+        return _Worker(self._context, self.agent_factory, split_rate_limits(Config.RATE_LIMITS, self.size))
+
+    def warm(self, timeout=None):
+        """Start every worker and wait until each has built its agent."""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Worker pool is closed")
+            if not self._workers:
+                self._workers = [self._start_worker() for _ in range(self.size)]
+            workers = list(self._workers)
+        for worker in workers:
+            worker.ready.wait(self.start_timeout if timeout is None else timeout)
+
+    def _slot(self, session_id):
+        """Index of the worker for a request (call with the lock held)."""
+        if session_id is not None:
+            return zlib.crc32(session_id.encode("utf-8")) % self.size
+        return min(range(self.size), key=lambda index: self._workers[index].in_flight)
+
+    def _route(self, session_id):
+        """Worker for a request: fixed per session, otherwise the one with the fewest requests in flight."""
+        if not self._workers:
+            self.warm()
+        with self._lock:
+            slot = self._slot(session_id)
+            worker = self._workers[slot]
+            if not worker.alive:
+                # Crashed: replace it in place (its sessions are lost)
+                metrics.inc("worker_restarts_total")
+                worker = self._workers[slot] = self._start_worker()
+            if self.max_requests and worker.handled + 1 >= self.max_requests and slot not in self._recycling:
+                self._recycling.add(slot)
+                threading.Thread(target=self._recycle, args=(slot, worker), daemon=True).start()
+        if not worker.ready.wait(self.start_timeout):
+            raise WorkerError(f"Worker process {worker.process.pid} did not start within {self.start_timeout}s")
+        return worker
+
+    def _ready_worker(self, session_id):
+        """The worker `_route` would pick if it is alive and ready right now, else None (never blocks)."""
+        with self._lock:
+            if len(self._workers) != self.size:
+                return None
+            slot = self._slot(session_id)
+            worker = self._workers[slot]
+            recycle = self.max_requests and worker.handled + 1 >= self.max_requests and slot not in self._recycling
+        if recycle or not worker.alive or not worker.ready.is_set():
+            return None
+        return worker
+
+    async def _aroute(self, loop, session_id):
+        worker = self._ready_worker(session_id)
+        if worker is not None:
+            return worker
+        # Starting, restarting or recycling a worker blocks: do it off the event loop
+        return await loop.run_in_executor(None, self._route, session_id)
+
+    def _recycle(self, slot, old):
+        """Swap in a warm replacement for `old`, then move its sessions over once it has drained."""
+        replacement = self._start_worker()
+        started = replacement.ready.wait(self.start_timeout) and replacement.alive
+        with self._lock:
+            if not started or self._closed or self._workers[slot] is not old:
+                self._recycling.discard(slot)
+                replacement.stop(timeout=5)
+                return
+            self._workers[slot] = replacement
+        # Requests of this slot's sessions that arrive before the hand-over run without their history
+        sessions = old.stop(timeout=Config.BATCH_QUERY_TIMEOUT)
+        if sessions:
+            replacement.send("restore", payload=sessions)
+        with self._lock:
+            self._recycling.discard(slot)
+            self.recycled += 1
+        metrics.inc("worker_recycles_total")
+
+    async def arun_with_fallback(self, query: str, session_id: str = None) -> str:
+        """Answer `query` in a worker process; same contract as FallbackAgent.arun_with_fallback."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def settle(kind, payload):
+            if not future.done():
+                if kind == "result":
+                    future.set_result(payload)
+                else:
+                    future.set_exception(WorkerError(payload))
+
+        worker = await self._aroute(loop, session_id)
+        request_id = worker.submit("run", query, session_id,
+                                   lambda kind, payload: loop.call_soon_threadsafe(settle, kind, payload))
+        try:
+            return await future
+        except asyncio.CancelledError:
+            worker.send("cancel", request_id)
+            raise
+
+    def run_with_fallback(self, query: str, session_id: str = None) -> str:
+        """Blocking version of `arun_with_fallback`."""
+        future = Future()
+
+        def settle(kind, payload):
+            if kind == "result":
+                future.set_result(payload)
+            else:
+                future.set_exception(WorkerError(payload))
+
+        self._route(session_id).submit("run", query, session_id, settle)
+        return future.result()
+
+    async def astream_with_fallback(self, query: str, session_id: str = None):
+        """Stream the events of FallbackAgent.astream_with_fallback from a worker process."""
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
+        worker = await self._aroute(loop, session_id)
+        request_id = worker.submit("stream", query, session_id,
+                                   lambda kind, payload: loop.call_soon_threadsafe(events.put_nowait, (kind, payload)))
+        finished = False
+        try:
+            while True:
+                kind, payload = await events.get()
+                if kind == "event":
+                    yield payload
+                elif kind == "error":
+                    finished = True
+                    raise WorkerError(payload)
+                else:
+                    finished = True
+                    return
+        finally:
+            if not finished:
+                # Consumer went away mid-stream: stop the run in the worker too
+                worker.send("cancel", request_id)
+
+    def stats(self):
+        with self._lock:
+            workers = list(self._workers)
+        return {
+            "workers": [
+                {"pid": worker.process.pid, "in_flight": worker.in_flight, "handled": worker.handled}
+                for worker in workers
+            ],
+            "recycled": self.recycled
+        }
+
+    def close(self, timeout=30):
+        """Let every worker finish its requests, then shut it down."""
+        with self._lock:
+            self._closed = True
+            workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.stop(timeout)
+
+    def __enter__(self):
+        self.warm()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
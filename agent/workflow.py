@@ -1,23 +1,307 @@
+import json
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 from config import Config
+from tools.cache import TTLCache
+from .metrics import MetricsCallbackHandler, metrics
+
+# Keywords that map a request onto the tools it needs
+WEATHER_KEYWORDS = ("weather", "forecast", "temperature", "rain", "sunny", "climate", "pack")
+COST_KEYWORDS = ("cost", "price", "budget", "fare", "fly", "flight", "how much", "cheap", "expensive")
+CATEGORY_KEYWORDS = {
+    "attractions": ("attraction", "sightseeing", "things to do", "sights", "museum", "see"),
+    "restaurants": ("restaurant", "food", "eat", "dining", "cuisine"),
+    "hotels": ("hotel", "stay", "accommodation", "lodging")
+}
+TRAVEL_CLASSES = ("Economy", "Business", "First")
+# "first day" and "business trip" are not fares: those two need "class" or a "fly"/"flying" in front
+TRAVEL_CLASS_PATTERNS = {
+    "Economy": re.compile(r"\beconomy\b"),
+    "Business": re.compile(r"\bbusiness[\s-]+class\b|\bfly(?:ing)?\s+business\b"),
+    "First": re.compile(r"\bfirst[\s-]+class\b|\bfly(?:ing)?\s+first\b")
+}
+
+# Requests that need multi-step reasoning even when they name a single city
+COMPLEX_PATTERN = re.compile(r"\b(plan|itinerary|compare|versus|vs|budget for|week|days)\b", re.IGNORECASE)
+
+# Dates or a multi-day range: the answer needs a forecast rather than current conditions
+DATES_PATTERN = re.compile(
+    r"\b(forecast|tomorrow|weekend|(?:this|next)\s+(?:week|month)|\d+\s*(?:days?|nights?)"
+    r"|(?:mon|tues|wednes|thurs|fri|satur|sun)day|\d{4}-\d{2}-\d{2}"
+    r"|(?:jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\.?\s+\d{1,2})\b",
+    re.IGNORECASE
+)
+
+# Tool arguments that name a place
+PLACE_ARGS = ("city", "location", "origin", "destination")
+
+# Capitalized words that start sentences or name things other than places
+NON_PLACE_WORDS = {
+    "I", "I'm", "I'd", "We", "My", "Our", "The", "A", "An", "Please", "Plan", "Planning", "Find", "Show",
+    "Get", "Give", "Tell", "Compare", "Recommend", "Suggest", "What", "What's", "Whats", "How", "Where",
+    "When", "Which", "Is", "Are", "Can", "Could", "Would", "Should", "Do", "Does", "Help", "Need",
+    "Trip", "Travel", "Weather", "Hotels", "Restaurants", "Attractions", "Economy", "Business", "First",
+    "Class", "And", "Also", "Then", "Thanks", "Hi", "Hello", "Flight", "Flights", "Fly", "Flying", "Cost",
+    "Costs", "Price", "Prices", "Fare", "Budget", "Cheap", "Cheapest", "Best", "Top", "Weekend", "Visit",
+    "Visiting", "Going", "Restaurant", "Hotel", "Forecast", "Things", "Any", "Some"
+}
+PLACE_PATTERN = re.compile(r"[A-Z][\w'.-]*(?:\s+[A-Z][\w'.-]*)*")
+SENTENCE_START = re.compile(r"(?:^|[.!?:;]\s+)$")
+
+
+def extract_places(text: str) -> list:
+    """
+    Return capitalized place names in the order they appear, without duplicates.
+    A word is capitalized at the start of a sentence whatever it is, so there
+    leading words are dropped until the gazetteer knows the remaining name; if
+    it knows none of them, only the stop list applies.
+    """
+    from tools.gazetteer import resolve_place
+
+    places = []
+    for match in PLACE_PATTERN.finditer(text):
+        words = match.group().split()
+        if SENTENCE_START.search(text[:match.start()]):
+            # "Flight cost from ...", "Visiting Rome ...": the place is a known suffix of the match
+            known = next((words[i:] for i in range(len(words))
+                          if resolve_place(" ".join(words[i:]).strip(".")) is not None), None)
+            words = known or words
+        words = [word for word in words if word not in NON_PLACE_WORDS]
+        place = " ".join(words).strip(".")
+        if place and place not in places:
+            places.append(place)
+    return places
+
+
+def parse_trip_request(text: str) -> dict:
+    """
+    Parse a free-text trip request into the pieces the workflow plans around.
+    Args:
+        text (str): User's travel query
+    Returns:
+        dict: origin, destinations, categories, travel_class, which of weather/cost are wanted
+            and whether the weather is wanted for dates ahead (wants_forecast)
+    """
+    lowered = text.lower()
+    places = extract_places(text)
+
+    origin = None
+    from_match = re.search(r"\bfrom\s+([A-Z][\w'.-]*(?:\s+[A-Z][\w'.-]*)*)", text)
+    if from_match:
+        origin = from_match.group(1).strip(".")
+        places = [place for place in places if place != origin]
+
+    wants_weather = any(keyword in lowered for keyword in WEATHER_KEYWORDS)
+    wants_cost = any(keyword in lowered for keyword in COST_KEYWORDS)
+    categories = [
+        category for category, keywords in CATEGORY_KEYWORDS.items()
+        if any(re.search(rf"\b{re.escape(keyword)}", lowered) for keyword in keywords)
+    ]
+
+    # A general "plan a trip" request (or one naming no specific need) gets everything
+    if not (wants_weather or wants_cost or categories) or re.search(r"\b(plan|itinerary)\b", lowered):
+        wants_weather = True
+        wants_cost = wants_cost or origin is not None
+        categories = categories or ["attractions", "restaurants", "hotels"]
+
+    travel_class = next((c for c in TRAVEL_CLASSES if TRAVEL_CLASS_PATTERNS[c].search(lowered)), "Economy")
+
+    return {
+        "origin": origin,
+        "destinations": places,
+        "categories": categories,
+        "travel_class": travel_class,
+        "wants_weather": wants_weather,
+        "wants_cost": wants_cost,
+        "wants_forecast": wants_weather and bool(DATES_PATTERN.search(text))
+    }
+
+
+class WorkflowStep:
+    """A single tool call in a travel plan."""
+
+    def __init__(self, step_id, tool, args):
+        """
+        Args:
+            step_id (str): Unique id of the step within a plan
+            tool (str): Name of the tool to call
+            args (dict): Tool arguments
+        """
+        self.step_id = step_id
+        self.tool = tool
+        self.args = args
+
+    def __repr__(self):
+        return f"WorkflowStep({self.step_id!r}, {self.tool!r}, {self.args!r})"
+
 
 class TravelPlanningWorkflow:
     """
-    A simple workflow to coordinate travel planning tasks.
-    This can be expanded to include more complex, multi-step logic.
+    Structured travel planning workflow.
+    A trip request is parsed into a plan of tool calls (weather per city, cost
+    per leg, recommendations per category and city). The calls don't depend on
+    each other, so they all run in parallel; step results are memoized, and a single LLM call summarizes the
+    results instead of a multi-iteration agent loop.
     """
-    def __init__(self):
-        # Initialize any workflow state or configuration here
-        pass
+    def __init__(self, llm=None, tools=None, max_workers=None, memo_ttl=None):
+        """
+        Initialize the workflow.
+        Args:
+            llm: Chat model used for the final summary (defaults to Config.WORKFLOW_MODEL)
+            tools (list): Tools steps may call (defaults to the agent's tools)
+            max_workers (int): Maximum steps run at once (defaults to Config.WORKFLOW_CONCURRENCY)
+            memo_ttl (float): Seconds a step result is reused (defaults to Config.WORKFLOW_MEMO_TTL)
+        """
+        if tools is None:
+            from tools import get_weather, calculate_travel_cost, get_recommendations
+            tools = [get_weather, calculate_travel_cost, get_recommendations]
+        self.tools = {tool.name: tool for tool in tools}
+        self.max_workers = max_workers or Config.WORKFLOW_CONCURRENCY
+        self.memo = TTLCache(
+            ttl=memo_ttl if memo_ttl is not None else Config.WORKFLOW_MEMO_TTL,
+            max_size=Config.WORKFLOW_MEMO_SIZE
+        )
+        self._llm = llm
+
+    @property
+    def llm(self):
+        """Chat model used for the summary, created on first use."""
+        if self._llm is None:
+            from .llm import create_chat_model
+            self._llm = create_chat_model(
+                model=Config.WORKFLOW_MODEL,
+                temperature=0.3,
+                max_tokens=768,
+                timeout=30,
+                max_retries=2
+            )
+        return self._llm
+
+    @staticmethod
+    def plan(trip: dict) -> list:
+        """
+        Build the tool calls for a parsed trip request.
+        Args:
+            trip (dict): Output of `parse_trip_request`
+        Returns:
+            list: WorkflowStep objects
+        """
+        steps = []
+        destinations = trip["destinations"]
+
+        if trip["wants_weather"]:
+            for city in destinations:
+                steps.append(WorkflowStep(f"weather:{city}", "weather_lookup", {"city": city}))
+
+        if trip["wants_cost"]:
+            stops = ([trip["origin"]] if trip["origin"] else []) + destinations
+            for origin, destination in zip(stops, stops[1:]):
+                steps.append(WorkflowStep(
+                    f"cost:{origin}->{destination}", "travel_cost_calculator",
+                    {"origin": origin, "destination": destination, "travel_class": trip["travel_class"]}
+                ))
+
+        for city in destinations:
+            for category in trip["categories"]:
+                steps.append(WorkflowStep(
+                    f"{category}:{city}", "destination_recommendations",
+                    {"location": city, "category": category}
+                ))
+
+        return steps
+
+    def execute(self, steps: list, callbacks=None) -> dict:
+        """
+        Run the steps of a plan concurrently (at most `max_workers` at once).
+        Args:
+            steps (list): WorkflowStep objects
+            callbacks (list): Optional callback handlers passed to each tool call
+        Returns:
+            dict: step_id -> {"tool", "args", "output" or "error", "cached", "seconds"}, in plan order
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = [pool.submit(self._run_step, step, callbacks) for step in steps]
+            return {step.step_id: future.result() for step, future in zip(steps, futures)}
+
+    def _run_step(self, step: WorkflowStep, callbacks=None) -> dict:
+        """Run one step, reusing a memoized result for identical tool calls."""
+        memo_key = f"{step.tool}:{json.dumps(self._canonical_args(step.args), sort_keys=True).lower()}"
+        output = self.memo.get(memo_key)
+        metrics.inc("cache_requests_total", cache="workflow", result="miss" if output is None else "hit")
+        if output is not None:
+            return self._result(step, output=output, cached=True)
+
+        if step.tool not in self.tools:
+            return self._result(step, error=f"Unknown tool: {step.tool}")
+
+        start = time.perf_counter()
+        try:
+            output = self.tools[step.tool].invoke(step.args, config={"callbacks": callbacks})
+        except Exception as e:
+            return self._result(step, error=str(e), seconds=time.perf_counter() - start)
+        self.memo.set(memo_key, output)
+        return self._result(step, output=output, seconds=time.perf_counter() - start)
+
+    @staticmethod
+    def _canonical_args(args):
+        """Replace place names with gazetteer ids so "NYC" and "New York" share a memo entry."""
+        from tools.gazetteer import canonical_key
+        return {
+            name: canonical_key(value) if name in PLACE_ARGS and isinstance(value, str) else value
+            for name, value in args.items()
+        }
 
-    def run(self, context):
+    @staticmethod
+    def _result(step, output=None, error=None, cached=False, seconds=0.0):
+        result = {"tool": step.tool, "args": step.args, "cached": cached, "seconds": seconds}
+        if error is not None:
+            result["error"] = error
+        else:
+            result["output"] = output
+        return result
+
+    def summarize(self, user_input: str, results: dict, callbacks=None) -> str:
+        """Write the final answer from the step results with a single LLM call."""
+        findings = "\n".join(
+            f"- [{step_id}] {result.get('output', 'unavailable: ' + result.get('error', ''))}"
+            for step_id, result in results.items()
+        )
+        prompt = f"""You are a helpful travel planning assistant. Using only the tool results below, answer the user's request with a concise, well-organized travel plan. Mention any results that were unavailable.
+
+User request: {user_input}
+
+Tool results:
+{findings}"""
+        try:
+            return self.llm.invoke(prompt, config={"callbacks": callbacks}).content
+        except Exception as e:
+            return f"[Summary unavailable: {str(e)}]\n{findings}"
+
+    def run(self, context, callbacks=None):
         """
         Run the workflow with the provided context.
         :param context: dict with at least 'user_input'
+        :param callbacks: optional callback handlers for the tool and LLM calls
         :return: dict with results, including a 'final_summary'
         """
         user_input = context.get("user_input", "")
-        # Here you would orchestrate calls to agents/tools as needed.
-        # For now, just echo the input as a placeholder.
+        if Config.METRICS_ENABLED:
+            callbacks = [MetricsCallbackHandler()] + list(callbacks or [])
+        trip = parse_trip_request(user_input)
+        steps = self.plan(trip)
+
+        if not steps:
+            return {
+                "final_summary": "I couldn't identify a destination in your request. Please name the city you're planning to visit.",
+                "trip": trip,
+                "steps": {}
+            }
+
+        results = self.execute(steps, callbacks)
         return {
-            "final_summary": f"Workflow received: {user_input}"
+            "final_summary": self.summarize(user_input, results, callbacks),
+            "trip": trip,
+            "steps": results
         }
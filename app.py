@@ -1,18 +1,32 @@
 import sys
 
+import asyncio
+
+import argparse
+
+import importlib
+
 import logging
 
-from config import Config
+import threading
+
+import time
 
-from agent import TravelAgent, FallbackAgent, TravelPlanningWorkflow
+from config import Config
 
 logging.basicConfig(level=logging.INFO)
 
 logger = logging.getLogger(__name__)
 
+# The interactive session is one conversation
+
+CLI_SESSION_ID = "cli"
+
 class TravelPlanningApp:
 
-    def __init__(self):
+    
+
+    def __init__(self, connection_check: str = None):
 
         try:
 
@@ -28,27 +42,63 @@ class TravelPlanningApp:
 
             
 
-            # Initialize components
+            # Components are built on first use so the prompt appears immediately
 
             logger.info("🚀 Initializing Groq-powered Travel Planning Agent...")
 
-            agent_executor = TravelAgent()
+            self._agent = None
 
-            self.agent = FallbackAgent(agent_executor)
+            self._workflow = None
 
-            self.workflow = TravelPlanningWorkflow()
+            self._init_lock = threading.Lock()
 
             
 
-            # Test connection
+            # Optional periodic metrics export (METRICS_EXPORT=jsonl|prometheus)
 
-            if self.agent.test_connection():
+            self.metrics_exporter = None
+
+            if Config.METRICS_EXPORT:
+
+                from agent.metrics import start_exporter
+
+                self.metrics_exporter = start_exporter(
+
+                    Config.METRICS_EXPORT, Config.METRICS_EXPORT_PATH, Config.METRICS_EXPORT_INTERVAL
+
+                )
+
+            
+
+            # Optional record/replay of LLM and tool calls (CASSETTE_MODE=record|replay|auto)
+
+            if Config.CASSETTE_MODE:
+
+                from agent.cassette import install_cassettes
+
+                install_cassettes()
+
+            
 
-                print("✅ Groq connection successful!")
+            # Test connection ("sync", "background" or "off"); a background result is
 
-            else:
+            # printed before the next prompt rather than over the user's typing
 
-                print("⚠️  Groq connection test failed, but continuing...")
+            self._connection_status = None
+
+            self._connection_thread = None
+
+            connection_check = connection_check or Config.CONNECTION_CHECK
+
+            if connection_check == "sync":
+
+                self.check_connection()
+
+            elif connection_check == "background":
+
+                self._connection_thread = threading.Thread(target=self._check_connection_in_background, daemon=True)
+
+                self._connection_thread.start()
 
                 
 
@@ -66,6 +116,92 @@ class TravelPlanningApp:
 
     
 
+    @property
+
+    def agent(self):
+
+        """FallbackAgent wrapping the tool-calling agent (routed across models), built on first use."""
+
+        if self._agent is None:
+
+            with self._init_lock:
+
+                if self._agent is None:
+
+                    from agent import FallbackAgent, create_primary_agent
+
+                    self._agent = FallbackAgent(create_primary_agent())
+
+        return self._agent
+
+    
+
+    @property
+
+    def workflow(self):
+
+        """Structured travel planning workflow, built on first use."""
+
+        if self._workflow is None:
+
+            with self._init_lock:
+
+                if self._workflow is None:
+
+                    from agent import TravelPlanningWorkflow
+
+                    self._workflow = TravelPlanningWorkflow()
+
+        return self._workflow
+
+    
+
+    def connection_status(self) -> str:
+
+        """Build the agent, test the Groq connection and return the message to show."""
+
+        try:
+
+            # Warm up the executor and response cache so the first query doesn't pay for them
+
+            self.agent.warm()
+
+            if self.agent.test_connection():
+
+                return "✅ Groq connection successful!"
+
+            return "⚠️  Groq connection test failed, but continuing..."
+
+        except Exception as e:
+
+            return f"❌ Initialization error: {e}"
+
+    
+
+    def check_connection(self):
+
+        """Test the Groq connection and print the result."""
+
+        print(self.connection_status())
+
+    
+
+    def _check_connection_in_background(self):
+
+        self._connection_status = self.connection_status()
+
+    
+
+    def print_connection_status(self):
+
+        """Print the background connection check result once it is available."""
+
+        status, self._connection_status = self._connection_status, None
+
+        if status is not None:
+
+            print(status)
+
     def run_interactive_session(self):
 
         """Run an interactive travel planning session."""
@@ -82,6 +218,8 @@ class TravelPlanningApp:
 
         while True:
 
+            self.print_connection_status()
+
             user_input = input("User: ").strip()
 
             
@@ -102,6 +240,34 @@ class TravelPlanningApp:
 
             
 
+            if user_input.lower() == 'stats':
+
+                self.show_cache_stats()
+
+                continue
+
+            
+
+            if user_input.lower() == 'metrics':
+
+                self.show_metrics()
+
+                continue
+
+            
+
+            if user_input.lower() == 'reset':
+
+                if self.agent.memory is not None:
+
+                    self.agent.memory.clear(CLI_SESSION_ID)
+
+                print("Travel Agent: Okay, let's start over.\n")
+
+                continue
+
+            
+
             if not user_input:
 
                 continue
@@ -110,9 +276,7 @@ class TravelPlanningApp:
 
             try:
 
-                response = self.agent.run_with_fallback(user_input)
-
-                print(f"Travel Agent: {response}\n")
+                self.print_streamed_response(self.agent.stream_with_fallback(user_input, session_id=CLI_SESSION_ID))
 
                 
 
@@ -122,6 +286,48 @@ class TravelPlanningApp:
 
     
 
+    def print_streamed_response(self, events):
+
+        """Print streamed tokens and tool activity as they arrive; return the final answer."""
+
+        print("Travel Agent: ", end="", flush=True)
+
+        output = ""
+
+        for event in events:
+
+            if event["type"] == "token":
+
+                print(event["content"], end="", flush=True)
+
+            elif event["type"] == "tool_start":
+
+                print(f"\n🔧 {event['name']}: {event['input']}", flush=True)
+
+            elif event["type"] == "tool_end":
+
+                print(f"✅ {event['name']} finished", flush=True)
+
+            elif event["type"] == "tool_error":
+
+                print(f"⚠️  {event['name']} failed: {event['error']}", flush=True)
+
+            elif event["type"] == "fallback":
+
+                print(f"\n⚠️  Primary agent failed: {event['error']}")
+
+                print("🔄 Switching to fallback mode...", flush=True)
+
+            elif event["type"] == "end":
+
+                output = event["output"]
+
+        print("\n")
+
+        return output
+
+    
+
     def show_help(self):
 
         """Show available commands and examples."""
@@ -134,6 +340,12 @@ Available commands:
 
 - 'help': Show this help message
 
+- 'stats': Show response cache hit rates
+
+- 'metrics': Show latency, token and cache metrics
+
+- 'reset': Forget the conversation so far
+
 
 
 Example queries:
@@ -158,6 +370,52 @@ The agent can combine multiple requests in one query!
 
     
 
+    def show_cache_stats(self):
+
+        """Show response cache hit rates and the latency saved."""
+
+        if self.agent.response_cache is None:
+
+            print("Response cache is disabled.\n")
+
+            return
+
+        stats = self.agent.response_cache.stats()
+
+        print(f"📊 Cache: {stats['exact_hits']} exact + {stats['semantic_hits']} similar hits, "
+
+              f"{stats['misses']} misses ({stats['hit_rate']:.0%} hit rate), "
+
+              f"{stats['latency_saved']:.1f}s saved\n")
+
+    
+
+    def show_metrics(self):
+
+        """Show per-stage latency percentiles and counters recorded so far."""
+
+        from agent.metrics import metrics
+
+        snapshot = metrics.snapshot()
+
+        for h in snapshot["histograms"]:
+
+            labels = ", ".join(f"{k}={v}" for k, v in h["labels"].items())
+
+            print(f"⏱️  {h['name']}{f' ({labels})' if labels else ''}: n={h['count']} "
+
+                  f"p50≤{h['p50']}s p95≤{h['p95']}s avg={h['sum'] / h['count']:.3f}s")
+
+        for c in snapshot["counters"]:
+
+            labels = ", ".join(f"{k}={v}" for k, v in c["labels"].items())
+
+            print(f"🔢 {c['name']}{f' ({labels})' if labels else ''}: {c['value']}")
+
+        print()
+
+    
+
     def run_single_query(self, query: str):
 
         """Run a single query."""
@@ -186,6 +444,16 @@ The agent can combine multiple requests in one query!
 
         
 
+        if not result.get("steps"):
+
+            # Not a trip shape the workflow knows how to plan: let the agent handle it
+
+            print("↪️  Falling back to the tool-calling agent...")
+
+            result["final_summary"] = self.agent.run_with_fallback(user_input)
+
+        
+
         print("📋 Workflow Results:")
 
         print(result.get("final_summary", "Workflow completed"))
@@ -196,28 +464,145 @@ The agent can combine multiple requests in one query!
 
     
 
-    def run_batch_queries(self, queries: list):
+    def worker_pool(self, workers: int = None):
+
+        """Process pool running one warm agent per worker, or None to run agents in this process (workers=0)."""
+
+        workers = Config.WORKER_PROCESSES if workers is None else workers
+
+        if not workers:
+
+            return None
+
+        from agent import AgentWorkerPool
+
+        return AgentWorkerPool(workers)
+
+    
+
+    def run_batch_queries(self, queries: list, concurrency: int = None, timeout: float = None, workers: int = None):
 
-        """Run multiple queries in batch."""
+        """Run multiple queries concurrently, printing each result as it completes."""
 
         print("🔄 Running batch queries...")
 
-        results = []
+        return asyncio.run(self.arun_batch_queries(queries, concurrency, timeout, workers))
+
+    
+
+    async def arun_batch_queries(self, queries: list, concurrency: int = None, timeout: float = None, workers: int = None):
+
+        """Run multiple queries concurrently and return responses in input order."""
+
+        from agent import BatchQueryRunner
+
+        pool = self.worker_pool(workers)
+
+        runner = BatchQueryRunner(pool or self.agent, concurrency=concurrency, timeout=timeout)
+
+        results = [None] * len(queries)
 
         
 
-        for i, query in enumerate(queries, 1):
+        try:
+
+            async for index, response in runner.stream(queries):
+
+                print(f"\n--- Query {index + 1}/{len(queries)} ---")
 
-            print(f"\n--- Query {i}/{len(queries)} ---")
+                print(f"🔍 Query: {queries[index]}")
 
-            result = self.run_single_query(query)
+                print(f"🤖 Response: {response}\n")
 
-            results.append(result)
+                results[index] = response
+
+        finally:
+
+            if pool is not None:
+
+                pool.close()
 
         
 
         return results
 
+    
+
+    def run_server(self, host: str = None, port: int = None, workers: int = None):
+
+        """Serve the agent over HTTP (JSON and Server-Sent Events) until interrupted, optionally from worker processes."""
+
+        from agent import TravelAgentServer
+
+        pool = self.worker_pool(workers)
+
+        try:
+
+            TravelAgentServer(pool or self.agent).run(host, port)
+
+        finally:
+
+            if pool is not None:
+
+                pool.close()
+
+def measure_startup():
+    """Print how long each startup phase takes, then exit."""
+    timings = []
+    start = last = time.perf_counter()
+
+    def mark(phase):
+        nonlocal last
+        now = time.perf_counter()
+        timings.append((phase, now - last))
+        last = now
+
+    app = TravelPlanningApp(connection_check="off")
+    mark("App init (config)")
+    # The agent package imports its modules lazily, so import the one that pulls in LangChain
+    importlib.import_module("agent.fallback_agent")
+    mark("Import LangChain + agents")
+    agent = app.agent
+    mark("Construct agents")
+    agent.primary_agent.agent_executor
+    mark("Build agent executor")
+    # A live check is a paid Groq call: skip it when replaying cassettes or without a key
+    if Config.CASSETTE_MODE or not Config.GROQ_API_KEY:
+        timings.append(("Groq connection check", None))
+    else:
+        agent.test_connection()
+        mark("Groq connection check")
+
+    print("\n⏱️  Startup timings:")
+    for phase, seconds in timings:
+        if seconds is None:
+            print(f"   {phase:<28} {'skipped':>11}")
+            continue
+        print(f"   {phase:<28} {seconds * 1000:8.1f} ms")
+    print(f"   {'Total':<28} {(last - start) * 1000:8.1f} ms")
+
 if __name__ == "__main__":
-    app = TravelPlanningApp()
-    app.run_interactive_session()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Groq-powered travel planning assistant")
+    parser.add_argument("--connection-check", choices=["sync", "background", "off"],
+                        help="How to test the Groq connection at startup (default: Config.CONNECTION_CHECK)")
+    parser.add_argument("--skip-connection-check", action="store_true",
+                        help="Don't test the Groq connection at startup")
+    parser.add_argument("--measure-startup", action="store_true",
+                        help="Print the time spent in each startup phase and exit")
+    parser.add_argument("--serve", action="store_true",
+                        help="Run the HTTP/SSE server instead of the interactive session")
+    parser.add_argument("--host", help="Server bind address (default: Config.SERVER_HOST)")
+    parser.add_argument("--port", type=int, help="Server port (default: Config.SERVER_PORT)")
+    parser.add_argument("--workers", type=int,
+                        help="Serve from this many worker processes (default: Config.WORKER_PROCESSES, 0 = in-process)")
+    args = parser.parse_args()
+
+    if args.measure_startup:
+        measure_startup()
+        sys.exit(0)
+
+    app = TravelPlanningApp(connection_check="off" if args.skip_connection_check else args.connection_check)
+    if args.serve:
+        app.run_server(args.host, args.port, args.workers)
+    else:
+        app.run_interactive_session()
\ No newline at end of file
@@ -0,0 +1,168 @@
+import asyncio
+import hashlib
+import json
+import time
+from typing import Any, List, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from agent.workflow import TravelPlanningWorkflow, parse_trip_request
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Offline stand-in for ChatGroq.
+    The first call of a turn asks for the tool calls the structured workflow
+    would plan for the user's query; once tool results are in the prompt it
+    answers from them. Latency is simulated per call and per streamed token,
+    and a fraction of calls can be made to fail to exercise fallback paths.
+    """
+
+    model: str = "scripted"
+    temperature: float = 0.7
+    max_tokens: int = 1024
+    streaming: bool = False
+    latency: float = 0.05
+    """Seconds before the first token of every call."""
+    token_latency: float = 0.0
+    """Seconds between streamed tokens."""
+    failure_rate: float = 0.0
+    """Fraction of calls that raise, as a Groq outage would."""
+    fail_marker: str = ""
+    """Tool-calling requests whose query contains this text raise, as a malformed tool call would."""
+    seed: int = 0
+    """Seed for the failure draws."""
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-chat"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def _draw(self, messages) -> float:
+        """
+        Uniform draw in [0, 1) derived from the seed, model and conversation.
+        Calls from concurrent threads share no state, so a run fails the same calls whatever the scheduling.
+        """
+        transcript = json.dumps([self.seed, self.model] + [[m.type, str(m.content)] for m in messages])
+        digest = hashlib.sha256(transcript.encode()).digest()
+        return int.from_bytes(digest[:8], "big") / 2 ** 64
+
+    def _script(self, messages, tools=None) -> AIMessage:
+        """Decide the response for a conversation."""
+        if self.failure_rate and self._draw(messages) < self.failure_rate:
+            raise RuntimeError("Scripted Groq failure (simulated outage)")
+
+        last_human = max((i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=-1)
+        query = messages[last_human].content if last_human >= 0 else str(messages[-1].content)
+        observations = [m.content for m in messages[last_human + 1:] if isinstance(m, ToolMessage)]
+        if tools and self.fail_marker and self.fail_marker in str(query):
+            # Only the agent's calls fail; the plain fallback call (no tools) still answers
+            raise RuntimeError("Scripted tool_use_failed: the model produced an invalid tool call")
+
+        if tools and not observations:
+            names = {tool["function"]["name"] for tool in tools}
+            steps = TravelPlanningWorkflow.plan(parse_trip_request(query))
+            tool_calls = [
+                {"name": step.tool, "args": step.args, "id": f"call_{index}"}
+                for index, step in enumerate(steps) if step.tool in names
+            ]
+            if tool_calls:
+                return AIMessage(content="", tool_calls=tool_calls)
+
+        if observations:
+            return AIMessage(content="Here is what I found for your trip:\n" + "\n".join(observations))
+        return AIMessage(content=f"Happy to help you plan your trip. You asked: {query}")
+
+    def _result(self, messages, message: AIMessage) -> ChatResult:
+        prompt_tokens = sum(len(str(m.content)) for m in messages) // 4
+        completion_tokens = len(str(message.content)) // 4 + 10 * len(message.tool_calls)
+        return ChatResult(
+            generations=[ChatGeneration(message=message)],
+            llm_output={
+                "token_usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens
+                },
+                "model_name": self.model
+            }
+        )
+
+    def _chunks(self, message: AIMessage):
+        """Split a scripted message into (delay, chunk) pairs as a streaming API would."""
+        for index, call in enumerate(message.tool_calls):
+            # Arguments arrive in two pieces, like a real streamed tool call
+            arguments = json.dumps(call["args"])
+            middle = len(arguments) // 2
+            for offset, piece in enumerate((arguments[:middle], arguments[middle:])):
+                yield self.token_latency, AIMessageChunk(content="", tool_call_chunks=[{
+                    "name": call["name"] if offset == 0 else None,
+                    "args": piece,
+                    "id": call["id"] if offset == 0 else None,
+                    "index": index
+                }])
+        words = str(message.content).split(" ")
+        for index, word in enumerate(words):
+            token = word if index == len(words) - 1 else word + " "
+            if token:
+                yield self.token_latency, AIMessageChunk(content=token)
+
+    def _generate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency)
+        message = self._script(messages, kwargs.get("tools"))
+        return self._result(messages, message)
+
+    async def _agenerate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        message = self._script(messages, kwargs.get("tools"))
+        return self._result(messages, message)
+
+    def _stream(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any):
+        time.sleep(self.latency)
+        for delay, chunk in self._chunks(self._script(messages, kwargs.get("tools"))):
+            if delay:
+                time.sleep(delay)
+            generation = ChatGenerationChunk(message=chunk)
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.content, chunk=generation)
+            yield generation
+
+    async def _astream(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any):
+        await asyncio.sleep(self.latency)
+        for delay, chunk in self._chunks(self._script(messages, kwargs.get("tools"))):
+            if delay:
+                await asyncio.sleep(delay)
+            generation = ChatGenerationChunk(message=chunk)
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.content, chunk=generation)
+            yield generation
+
+
+def scripted_model_factory(latency=0.05, token_latency=0.0, failure_rate=0.0, seed=0, fail_marker=""):
+    """
+    Build a factory for `agent.llm.set_chat_model_factory` that returns ScriptedChatModel instances.
+    Args:
+        latency (float): Seconds before the first token of every call
+        token_latency (float): Seconds between streamed tokens
+        failure_rate (float): Fraction of calls that raise
+        seed (int): Seed for the failure draws
+        fail_marker (str): Tool-calling requests whose query contains this text fail
+    """
+    def factory(model, temperature=0.7, max_tokens=1024, streaming=False, **kwargs):
+        return ScriptedChatModel(
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            streaming=streaming,
+            latency=latency,
+            token_latency=token_latency,
+            failure_rate=failure_rate,
+            seed=seed,
+            fail_marker=fail_marker
+        )
+    return factory
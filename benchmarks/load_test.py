@@ -0,0 +1,363 @@
+"""
+Open-loop load test for capacity planning.
+
+Requests arrive as a Poisson process at a fixed rate, whether or not earlier
+ones have finished, the way real users do; latency is measured from each
+request's scheduled arrival, so a backed-up system can't hide its queueing
+delay (no coordinated omission). Each step of `--rates` runs for `--duration`
+seconds and is checked against the declared SLOs; the report names the
+highest rate that met them. Example:
+
+    python -m benchmarks.load_test --rates 2 4 8 16 --duration 20 --slo-p95 2000 --slo-error-rate 0.01
+
+Traffic is a weighted mix of the PROFILES (`--mix single=0.6,multi=0.3,failure=0.1`).
+"failure" queries make the primary agent fail so FallbackAgent has to answer.
+Backends are local: the scripted model stands in for Groq and tools use their
+built-in sample data. Targets are an in-process FallbackAgent, the HTTP server
+(in-process, optionally backed by `--workers` processes), or a running server
+given by `--url`.
+"""
+import argparse
+import asyncio
+import contextlib
+import functools
+import io
+import json
+import random
+from urllib.parse import urlsplit
+
+from config import Config
+from benchmarks.run import configure_offline, offline_agent, percentile, _offline
+
+# Text in a query that makes the scripted model fail the agent's tool-calling request
+FAIL_MARKER = "[simulated tool failure]"
+
+PROFILES = {
+    # Mostly answered by the fast path or a single tool call
+    "single": [
+        (4, "What's the weather like in Paris?"),
+        (2, "How much does it cost to fly from New York to London?"),
+        (2, "What are the top attractions in Tokyo?"),
+        (1, "I need restaurant recommendations for Barcelona")
+    ],
+    # Several tool calls and a longer answer
+    "multi": [
+        (2, "Plan a trip from Berlin to Rome with weather, costs, and recommendations"),
+        (1, "Compare hotels in Lisbon and Porto"),
+        (1, "Plan a weekend in Vienna with the weather and hotels")
+    ],
+    # The agent fails and FallbackAgent answers from the plain LLM
+    "failure": [
+        (1, f"Plan a trip from Madrid to Prague with weather and hotels {FAIL_MARKER}"),
+        (1, f"Compare restaurants in Tokyo and Osaka {FAIL_MARKER}")
+    ]
+}
+
+DEFAULT_MIX = "single=0.6,multi=0.3,failure=0.1"
+
+TARGETS = ("fallback", "server")
+
+_FALLBACK_PREFIX = "[Fallback Mode"
+_FAILURE_PREFIX = "I apologize, but I'm currently experiencing technical difficulties"
+
+
+class RequestFailed(Exception):
+    """A load-test request got an error response instead of an answer."""
+
+
+def parse_mix(text):
+    """Parse "single=0.6,multi=0.3" into {profile: weight}."""
+    mix = {}
+    for entry in text.split(","):
+        name, _, weight = entry.partition("=")
+        name = name.strip()
+        if name not in PROFILES:
+            raise ValueError(f"Unknown traffic profile {name!r} (choose from {', '.join(PROFILES)})")
+        mix[name] = float(weight or 1)
+    if not any(mix.values()):
+        raise ValueError("Traffic mix needs at least one profile with a positive weight")
+    return mix
+
+
+def build_schedule(rate, duration, mix, seed=0):
+    """
+    Draw the arrivals of one load step.
+    Args:
+        rate (float): Mean arrivals per second
+        duration (float): Seconds of traffic
+        mix (dict): {profile: weight}
+        seed (int): Seed for arrival times and query choice
+    Returns:
+        list: (offset seconds, profile, query) in arrival order
+    """
+    rng = random.Random(seed)
+    profiles = list(mix)
+    weights = [mix[name] for name in profiles]
+    schedule = []
+    offset = rng.expovariate(rate)
+    while offset < duration:
+        profile = rng.choices(profiles, weights=weights)[0]
+        entries = PROFILES[profile]
+        query = rng.choices([query for _, query in entries], weights=[weight for weight, _ in entries])[0]
+        schedule.append((offset, profile, query))
+        offset += rng.expovariate(rate)
+    return schedule
+
+
+async def _post_chat(host, port, query):
+    """POST /chat on a TravelAgentServer and return the response text."""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        body = json.dumps({"query": query}).encode()
+        writer.write(
+            f"POST /chat HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        length = None
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value)
+        payload = json.loads((await reader.readexactly(length)) if length is not None else await reader.read())
+    finally:
+        writer.close()
+    if status != 200:
+        raise RequestFailed(f"HTTP {status}: {payload.get('error', '')}")
+    return payload["response"]
+
+
+@contextlib.asynccontextmanager
+async def open_target(target, url=None, workers=0):
+    """Yield an async callable(query) -> answer for `target`; servers and worker pools are shut down afterwards."""
+    from agent import TravelAgent, FallbackAgent, TravelAgentServer, AgentWorkerPool
+
+    if url:
+        parts = urlsplit(url)
+        yield functools.partial(_post_chat, parts.hostname, parts.port or 80)
+        return
+
+    pool = None
+    if workers:
+        pool = AgentWorkerPool(workers, agent_factory=functools.partial(offline_agent, **_offline))
+        agent = pool
+    else:
+        agent = FallbackAgent(TravelAgent(verbose=False))
+    try:
+        if target == "fallback":
+            await asyncio.get_running_loop().run_in_executor(None, agent.warm)
+            yield agent.arun_with_fallback
+        elif target == "server":
+            server = TravelAgentServer(agent)
+            listener = await server.start("127.0.0.1", 0)
+            port = listener.sockets[0].getsockname()[1]
+            try:
+                yield functools.partial(_post_chat, "127.0.0.1", port)
+            finally:
+                listener.close()
+                await listener.wait_closed()
+        else:
+            raise ValueError(f"Unknown load-test target: {target}")
+    finally:
+        if pool is not None:
+            pool.close()
+
+
+async def run_step(send, schedule, rate, duration, timeout=60.0, max_in_flight=1000):
+    """
+    Fire `schedule` at `send` on time (open loop) and wait for every request to finish.
+    Returns:
+        dict: Offered and achieved rate, latency percentiles and the outcome breakdown
+    """
+    loop = asyncio.get_running_loop()
+    records = []
+    in_flight = 0
+    peak_in_flight = 0
+
+    async def fire(arrival, profile, query):
+        nonlocal in_flight
+        try:
+            answer = await asyncio.wait_for(send(query), timeout)
+            if answer.startswith(_FAILURE_PREFIX):
+                outcome, reason = "error", "agent and fallback failed"
+            elif answer.startswith(_FALLBACK_PREFIX):
+                outcome, reason = "fallback", None
+            else:
+                outcome, reason = "ok", None
+        except asyncio.TimeoutError:
+            outcome, reason = "error", f"timeout after {timeout:g}s"
+        except Exception as e:
+            outcome, reason = "error", str(e) if isinstance(e, RequestFailed) else type(e).__name__
+        finally:
+            in_flight -= 1
+        # From the scheduled arrival, so time spent waiting to be sent counts too
+        records.append((profile, outcome, reason, loop.time() - arrival))
+
+    tasks = []
+    dropped = 0
+    start = loop.time()
+    for offset, profile, query in schedule:
+        delay = start + offset - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if in_flight >= max_in_flight:
+            # The generator itself would become the bottleneck; count the request as lost
+            dropped += 1
+            records.append((profile, "error", "dropped by load generator", 0.0))
+            continue
+        in_flight += 1
+        peak_in_flight = max(peak_in_flight, in_flight)
+        tasks.append(asyncio.ensure_future(fire(start + offset, profile, query)))
+    await asyncio.gather(*tasks)
+    elapsed = loop.time() - start
+
+    count = len(records)
+    latencies = [latency for _, outcome, _, latency in records if outcome != "error"]
+    errors = [reason for _, outcome, reason, _ in records if outcome == "error"]
+    reasons = {}
+    for reason in errors:
+        reasons[reason] = reasons.get(reason, 0) + 1
+    by_profile = {}
+    for profile, outcome, _, latency in records:
+        entry = by_profile.setdefault(profile, {"requests": 0, "errors": 0, "fallbacks": 0, "latencies": []})
+        entry["requests"] += 1
+        entry["errors"] += outcome == "error"
+        entry["fallbacks"] += outcome == "fallback"
+        if outcome != "error":
+            entry["latencies"].append(latency)
+
+    return {
+        "rate": rate,
+        "requests": count,
+        "offered_qps": count / duration,
+        "achieved_qps": (count - len(errors)) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": max(latencies, default=0.0) * 1000,
+        "error_rate": len(errors) / count if count else 0.0,
+        "fallback_rate": sum(outcome == "fallback" for _, outcome, _, _ in records) / count if count else 0.0,
+        "peak_in_flight": peak_in_flight,
+        "dropped": dropped,
+        "error_reasons": reasons,
+        "profiles": {
+            name: {
+                "requests": entry["requests"],
+                "error_rate": entry["errors"] / entry["requests"],
+                "fallback_rate": entry["fallbacks"] / entry["requests"],
+                "p95_ms": percentile(entry["latencies"], 95) * 1000
+            }
+            for name, entry in sorted(by_profile.items())
+        }
+    }
+
+
+def check_slos(step, slos):
+    """Names of the SLOs a step breaks; `slos` maps p95_ms/p99_ms/error_rate to limits (None = not declared)."""
+    return [name for name, limit in slos.items() if limit is not None and step[name] > limit]
+
+
+async def run_load_test(target, rates, duration, mix, slos, url=None, workers=0, seed=0, timeout=60.0,
+                        max_in_flight=1000, stop_on_breach=False):
+    """
+    Run one load step per rate against `target`.
+    Returns:
+        dict: The steps with their SLO breaches and the saturation point
+    """
+    steps = []
+    async with open_target(target, url, workers) as send:
+        # Warm up: build executors and import lazily loaded modules outside the measurement
+        await send(PROFILES["single"][0][1])
+        for index, rate in enumerate(rates):
+            schedule = build_schedule(rate, duration, mix, seed + index)
+            step = await run_step(send, schedule, rate, duration, timeout, max_in_flight)
+            step["slo_breaches"] = check_slos(step, slos)
+            steps.append(step)
+            if step["slo_breaches"] and stop_on_breach:
+                break
+
+    passing = [step["rate"] for step in steps if not step["slo_breaches"]]
+    breaching = [step["rate"] for step in steps if step["slo_breaches"]]
+    return {
+        "target": url or target,
+        "mix": mix,
+        "slos": slos,
+        "steps": steps,
+        # Highest rate that met every SLO below the first rate that broke one
+        "max_sustainable_qps": max((rate for rate in passing if not breaching or rate < min(breaching)), default=None),
+        "saturated_at_qps": min(breaching, default=None)
+    }
+
+
+def print_report(report):
+    """Print a table of load steps and the saturation point."""
+    slos = ", ".join(f"{name} <= {limit:g}" for name, limit in report["slos"].items() if limit is not None)
+    print(f"Target: {report['target']}   mix: {', '.join(f'{k}={v:g}' for k, v in report['mix'].items())}")
+    print(f"SLOs: {slos or 'none declared'}")
+    header = (f"{'rate':>6} {'n':>6} {'offered':>8} {'done/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+              f"{'err %':>6} {'fb %':>6} {'peak':>5}  slo")
+    print(header)
+    print("-" * len(header))
+    for step in report["steps"]:
+        verdict = "ok" if not step["slo_breaches"] else "BREACH " + ",".join(step["slo_breaches"])
+        print(f"{step['rate']:>6g} {step['requests']:>6} {step['offered_qps']:>8.1f} {step['achieved_qps']:>8.1f} "
+              f"{step['p50_ms']:>9.1f} {step['p95_ms']:>9.1f} {step['p99_ms']:>9.1f} "
+              f"{step['error_rate'] * 100:>6.1f} {step['fallback_rate'] * 100:>6.1f} {step['peak_in_flight']:>5}  {verdict}")
+        for reason, count in sorted(step["error_reasons"].items(), key=lambda item: -item[1])[:3]:
+            print(f"{'':>8}{count} x {reason}")
+
+    print()
+    if report["max_sustainable_qps"] is not None:
+        print(f"Highest rate meeting the SLOs: {report['max_sustainable_qps']:g} req/s")
+    else:
+        print("No rate met the SLOs")
+    if report["saturated_at_qps"] is not None:
+        print(f"First breach at: {report['saturated_at_qps']:g} req/s")
+    print("Latencies exclude errors and are measured from each request's scheduled arrival; fb = answered by the fallback LLM.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Open-loop load test with synthetic traffic and SLO reporting")
+    parser.add_argument("--target", choices=TARGETS, default="fallback")
+    parser.add_argument("--url", help="Load a running server (e.g. http://127.0.0.1:8000) instead of an in-process target")
+    parser.add_argument("--workers", type=int, default=0, help="Serve from this many worker processes (0 = in-process agent)")
+    parser.add_argument("--rates", type=float, nargs="+", default=[1, 2, 4, 8], help="Arrival rates (req/s), one step each")
+    parser.add_argument("--duration", type=float, default=15, help="Seconds per step")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Traffic mix as profile=weight pairs")
+    parser.add_argument("--slo-p95", type=float, default=5000, help="p95 latency SLO in ms")
+    parser.add_argument("--slo-p99", type=float, help="p99 latency SLO in ms")
+    parser.add_argument("--slo-error-rate", type=float, default=0.01, help="Maximum fraction of failed requests")
+    parser.add_argument("--stop-on-breach", action="store_true", help="Stop after the first step that breaks an SLO")
+    parser.add_argument("--timeout", type=float, default=Config.SERVER_REQUEST_TIMEOUT or 60, help="Seconds per request")
+    parser.add_argument("--max-in-flight", type=int, default=1000, help="Requests outstanding before arrivals are dropped")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Seconds before the scripted model's first token")
+    parser.add_argument("--token-latency", type=float, default=0.005, help="Seconds per streamed token")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", dest="json_path", help="Also write the report to this JSON file")
+    args = parser.parse_args(argv)
+
+    if not args.url:
+        configure_offline(args.llm_latency, args.token_latency, seed=args.seed, fail_marker=FAIL_MARKER)
+    slos = {"p95_ms": args.slo_p95, "p99_ms": args.slo_p99, "error_rate": args.slo_error_rate}
+
+    # The agents print progress; keep the report readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        report = asyncio.run(run_load_test(
+            args.target, sorted(args.rates), args.duration, parse_mix(args.mix), slos,
+            url=args.url, workers=args.workers, seed=args.seed, timeout=args.timeout,
+            max_in_flight=args.max_in_flight, stop_on_breach=args.stop_on_breach
+        ))
+    print_report(report)
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    main()
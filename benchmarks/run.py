@@ -0,0 +1,251 @@
+"""
+Offline benchmark for the travel agents.
+
+ChatGroq is replaced with a scripted local model, so runs need no network or
+API keys and are repeatable. Example:
+
+    python -m benchmarks.run --queries 200 --concurrency 8 --llm-latency 0.05
+
+To replay traffic recorded against the real backends (CASSETTE_MODE=record)
+with its original timing, or twice as fast:
+
+    python -m benchmarks.run --cassette cassettes --cassette-mode replay --latency-scale 0.5
+"""
+import argparse
+import contextlib
+import functools
+import io
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from config import Config
+
+# (weight, query): single-tool lookups dominate real traffic, trip plans are heavier
+QUERY_MIX = [
+    (4, "What's the weather like in Paris?"),
+    (2, "How much does it cost to fly from New York to London?"),
+    (2, "What are the top attractions in Tokyo?"),
+    (1, "I need restaurant recommendations for Barcelona"),
+    (1, "Compare hotels in Lisbon and Porto"),
+    (2, "Plan a trip from Berlin to Rome with weather, costs, and recommendations")
+]
+
+TARGETS = ("agent", "fallback", "router", "workflow", "pool")
+
+# Settings of the scripted model, re-applied inside worker processes for the "pool" target
+_offline = {}
+
+
+class TimingHandler(BaseCallbackHandler):
+    """Accumulate wall time spent inside LLM and tool calls."""
+
+    def __init__(self):
+        self.llm_seconds = 0.0
+        self.tool_seconds = 0.0
+        self._starts = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id):
+        self._starts[run_id] = time.perf_counter()
+
+    def _end(self, run_id, attribute):
+        start = self._starts.pop(run_id, None)
+        if start is not None:
+            with self._lock:
+                setattr(self, attribute, getattr(self, attribute) + time.perf_counter() - start)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(run_id)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._end(run_id, "llm_seconds")
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, "llm_seconds")
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self._start(run_id)
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end(run_id, "tool_seconds")
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, "tool_seconds")
+
+
+def build_queries(count, seed=0):
+    """Draw a deterministic query sequence from QUERY_MIX."""
+    rng = random.Random(seed)
+    weights = [weight for weight, _ in QUERY_MIX]
+    queries = [query for _, query in QUERY_MIX]
+    return rng.choices(queries, weights=weights, k=count)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of `values`."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def configure_offline(llm_latency, token_latency=0.0, failure_rate=0.0, seed=0, fail_marker=""):
+    """Point every agent at the scripted model and turn off network-bound features."""
+    from agent.llm import set_chat_model_factory
+    from benchmarks.fake_llm import scripted_model_factory
+
+    Config.LANGCHAIN_TRACING_V2 = "false"
+    Config.WEATHER_API_KEY = None
+    Config.RESPONSE_CACHE_ENABLED = False
+    set_chat_model_factory(scripted_model_factory(
+        latency=llm_latency, token_latency=token_latency, failure_rate=failure_rate, seed=seed, fail_marker=fail_marker
+    ))
+    _offline.update(
+        llm_latency=llm_latency, token_latency=token_latency, failure_rate=failure_rate, seed=seed, fail_marker=fail_marker
+    )
+
+
+def offline_agent(**settings):
+    """FallbackAgent on the scripted model; the agent factory of each benchmark worker process."""
+    from agent import TravelAgent, FallbackAgent
+
+    configure_offline(**settings)
+    return FallbackAgent(TravelAgent(verbose=False))
+
+
+def make_runner(target, workers=2):
+    """Return a callable(query, callbacks) running one query against `target`."""
+    from agent import TravelAgent, FallbackAgent, ModelRouter, TravelPlanningWorkflow, AgentWorkerPool
+
+    if target == "agent":
+        agent = TravelAgent(verbose=False)
+        return lambda query, callbacks: agent.invoke(query, callbacks=callbacks)["output"]
+    if target == "fallback":
+        agent = FallbackAgent(TravelAgent(verbose=False))
+        return lambda query, callbacks: agent.run_with_fallback(query, callbacks=callbacks)
+    if target == "router":
+        agent = FallbackAgent(ModelRouter(
+            fast_agent=TravelAgent(model=Config.FALLBACK_MODEL, verbose=False),
+            strong_agent=TravelAgent(model=Config.DEFAULT_MODEL, verbose=False)
+        ))
+        return lambda query, callbacks: agent.run_with_fallback(query, callbacks=callbacks)
+    if target == "workflow":
+        # memo_ttl=0 so repeated queries measure the work, not the memo
+        workflow = TravelPlanningWorkflow(memo_ttl=0)
+        return lambda query, callbacks: workflow.run({"user_input": query}, callbacks=callbacks)["final_summary"]
+    if target == "pool":
+        # Callbacks can't cross processes, so all of this target's time shows up as framework time
+        pool = AgentWorkerPool(workers, agent_factory=functools.partial(offline_agent, **_offline))
+        pool.warm()
+        return lambda query, callbacks: pool.run_with_fallback(query)
+    raise ValueError(f"Unknown benchmark target: {target}")
+
+
+def run_target(target, queries, concurrency=1, seed=0, workers=2):
+    """
+    Run `queries` against one target and collect latency statistics.
+    Returns:
+        dict: Percentiles, throughput and the LLM / tool / framework time split per query
+    """
+    run_query = make_runner(target, workers)
+
+    latencies = []
+    totals = {"llm": 0.0, "tool": 0.0, "overhead": 0.0}
+    errors = 0
+    lock = threading.Lock()
+
+    def timed(query):
+        nonlocal errors
+        handler = TimingHandler()
+        start = time.perf_counter()
+        try:
+            run_query(query, [handler])
+        except Exception:
+            with lock:
+                errors += 1
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            totals["llm"] += handler.llm_seconds
+            totals["tool"] += handler.tool_seconds
+            # Parallel tool calls overlap, so this is a lower bound on framework time
+            totals["overhead"] += max(0.0, elapsed - handler.llm_seconds - handler.tool_seconds)
+
+    # The agents print progress; keep the report readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        run_query(queries[0], None)  # warm up: build executors and import lazily loaded modules
+        random.seed(seed)
+        wall_start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(timed, queries))
+        wall = time.perf_counter() - wall_start
+
+    count = len(queries)
+    return {
+        "target": target,
+        "queries": count,
+        "concurrency": concurrency,
+        "errors": errors,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "throughput_qps": count / wall if wall else 0.0,
+        "llm_ms": totals["llm"] / count * 1000,
+        "tool_ms": totals["tool"] / count * 1000,
+        "overhead_ms": totals["overhead"] / count * 1000
+    }
+
+
+def print_report(results):
+    """Print a table of benchmark results."""
+    header = f"{'target':<10} {'n':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'qps':>8} {'llm ms':>9} {'tool ms':>9} {'fw ms':>9} {'errors':>6}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['target']:<10} {r['queries']:>5} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['p99_ms']:>9.1f} "
+              f"{r['throughput_qps']:>8.1f} {r['llm_ms']:>9.1f} {r['tool_ms']:>9.1f} {r['overhead_ms']:>9.1f} {r['errors']:>6}")
+    print("\nllm/tool/fw ms are per-query means; fw (framework) = latency - LLM time - tool time.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark with a scripted Groq backend")
+    parser.add_argument("--queries", type=int, default=100, help="Queries per target")
+    parser.add_argument("--concurrency", type=int, default=1, help="Queries run at once")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Seconds per scripted LLM call")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Seconds per streamed token")
+    parser.add_argument("--targets", nargs="+", choices=TARGETS, default=[t for t in TARGETS if t != "pool"])
+    parser.add_argument("--workers", type=int, default=2, help="Worker processes for the pool target")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", dest="json_path", help="Also write results to this JSON file")
+    parser.add_argument("--cassette", help="Record/replay LLM and tool calls through this cassette directory")
+    parser.add_argument("--cassette-mode", choices=("record", "replay", "auto"), default="auto")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Multiplier on replayed latencies")
+    args = parser.parse_args(argv)
+
+    configure_offline(args.llm_latency, args.token_latency, seed=args.seed)
+    if args.cassette:
+        from agent.cassette import install_cassettes
+
+        install_cassettes(args.cassette, args.cassette_mode, args.latency_scale)
+    queries = build_queries(args.queries, args.seed)
+
+    results = [run_target(target, queries, args.concurrency, args.seed, args.workers) for target in args.targets]
+    print_report(results)
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    main()
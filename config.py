@@ -1,9 +1,35 @@
+import logging
 import os
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+
+def parse_rate_limits(value: str) -> dict:
+    """
+    Parse "model=requests:tokens,..." into per-model limits, skipping malformed entries.
+    Args:
+        value (str): Comma-separated overrides, e.g. "llama3-8b-8192=30:30000"
+    Returns:
+        dict: model -> (requests per minute, tokens per minute)
+    """
+    limits = {}
+    for entry in filter(None, (part.strip() for part in value.split(","))):
+        model, _, spec = entry.partition("=")
+        try:
+            rpm, tpm = (int(n) for n in spec.split(":"))
+            if not model.strip() or rpm <= 0 or tpm <= 0:
+                raise ValueError
+        except ValueError:
+            logger.warning(f"Ignoring malformed GROQ_RATE_LIMITS entry {entry!r}, expected model=requests:tokens")
+            continue
+        limits[model.strip()] = (rpm, tpm)
+    return limits
+
+
 class Config:
     GROQ_API_KEY = os.getenv("GROQ_API_KEY")
     LANGCHAIN_API_KEY = os.getenv("LANGCHAIN_API_KEY")
@@ -15,18 +41,155 @@ class Config:
     DEFAULT_MODEL = "llama3-70b-8192"  # or "mixtral-8x7b-32768", "gemma-7b-it"
     FALLBACK_MODEL = "llama3-8b-8192"  # Faster model for fallback
     
+    # Startup Groq connection test: "sync", "background" or "off"
+    CONNECTION_CHECK = os.getenv("CONNECTION_CHECK", "background")
+    
+    # Weather lookup cache (set WEATHER_CACHE_PATH to share a SQLite cache between processes)
+    WEATHER_CACHE_TTL = int(os.getenv("WEATHER_CACHE_TTL", "600"))
+    WEATHER_CACHE_SIZE = int(os.getenv("WEATHER_CACHE_SIZE", "1024"))
+    WEATHER_CACHE_PATH = os.getenv("WEATHER_CACHE_PATH")
+    
+    # Multi-day forecasts: batch lookups run concurrently, and destinations named in a
+    # query about coming dates are prefetched while the LLM plans (WEATHER_PREFETCH)
+    FORECAST_CACHE_TTL = int(os.getenv("FORECAST_CACHE_TTL", "1800"))
+    WEATHER_BATCH_CONCURRENCY = int(os.getenv("WEATHER_BATCH_CONCURRENCY", "8"))
+    WEATHER_PREFETCH = os.getenv("WEATHER_PREFETCH", "true").lower() == "true"
+    
+    # Offline gazetteer used to canonicalize place names in every tool (bundled file when unset)
+    GAZETTEER_PATH = os.getenv("GAZETTEER_PATH")
+    
+    # Memory-mapped POI store behind destination_recommendations (build with `python -m tools.poi_store`);
+    # the built-in sample lists are used when there is no store at this path
+    POI_STORE_PATH = os.getenv("POI_STORE_PATH", "data/poi")
+    
+    # Shared HTTP client for external tool APIs
+    HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))
+    HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+    HTTP_BACKOFF_FACTOR = float(os.getenv("HTTP_BACKOFF_FACTOR", "0.5"))
+    HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10"))
+    
+    # Full-answer cache in front of the agent; TTLs are per tool topic
+    RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+    RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "2048"))
+    RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.92"))
+    RESPONSE_CACHE_TTL_WEATHER = int(os.getenv("RESPONSE_CACHE_TTL_WEATHER", "600"))
+    RESPONSE_CACHE_TTL_COST = int(os.getenv("RESPONSE_CACHE_TTL_COST", "3600"))
+    RESPONSE_CACHE_TTL_RECOMMENDATIONS = int(os.getenv("RESPONSE_CACHE_TTL_RECOMMENDATIONS", "86400"))
+    RESPONSE_CACHE_TTL_DEFAULT = int(os.getenv("RESPONSE_CACHE_TTL_DEFAULT", "3600"))
+    
+    # Maximum tool calls run concurrently within one agent step
+    TOOL_CONCURRENCY = int(os.getenv("TOOL_CONCURRENCY", "4"))
+    
+    # Side-effect-free tools started while the model is still streaming their call (empty = never);
+    # the result is reused if the final message asks for the same call and discarded otherwise
+    SPECULATIVE_TOOLS = [
+        name.strip() for name in os.getenv("SPECULATIVE_TOOLS", "weather_lookup,destination_recommendations").split(",")
+        if name.strip()
+    ]
+    
+    # Obvious single-tool queries ("weather in Paris") skip the agent loop and are answered from a
+    # template; FAST_PATH_REPHRASE adds one cheap LLM call to phrase the answer
+    FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "true").lower() == "true"
+    FAST_PATH_REPHRASE = os.getenv("FAST_PATH_REPHRASE", "false").lower() == "true"
+    
+    # Earlier tool observations in the agent scratchpad are clipped to this many tokens (0 = never);
+    # the latest iteration's observations are always kept whole
+    SCRATCHPAD_OBSERVATION_TOKENS = int(os.getenv("SCRATCHPAD_OBSERVATION_TOKENS", "150"))
+    
+    # Agent executors kept per (model, temperature, max_tokens, verbose); prompt and tool schemas are shared by all
+    EXECUTOR_CACHE_SIZE = int(os.getenv("EXECUTOR_CACHE_SIZE", "8"))
+    
+    # Structured workflow: one summary call on a cheaper model, memoized tool steps
+    WORKFLOW_MODEL = os.getenv("WORKFLOW_MODEL", FALLBACK_MODEL)
+    WORKFLOW_CONCURRENCY = int(os.getenv("WORKFLOW_CONCURRENCY", "8"))
+    WORKFLOW_MEMO_TTL = int(os.getenv("WORKFLOW_MEMO_TTL", "300"))
+    WORKFLOW_MEMO_SIZE = int(os.getenv("WORKFLOW_MEMO_SIZE", "512"))
+    
+    # Local metrics (independent of LangSmith); METRICS_EXPORT is "", "jsonl" or "prometheus"
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    METRICS_EXPORT = os.getenv("METRICS_EXPORT", "")
+    METRICS_EXPORT_PATH = os.getenv("METRICS_EXPORT_PATH", "metrics.jsonl")
+    METRICS_EXPORT_INTERVAL = float(os.getenv("METRICS_EXPORT_INTERVAL", "60"))
+    
+    # Record/replay of LLM and tool calls; CASSETTE_MODE is "", "record", "replay" or "auto".
+    # Replays wait the recorded latency times CASSETTE_LATENCY_SCALE (0 = instant)
+    CASSETTE_MODE = os.getenv("CASSETTE_MODE", "")
+    CASSETTE_PATH = os.getenv("CASSETTE_PATH", "cassettes")
+    CASSETTE_LATENCY_SCALE = float(os.getenv("CASSETTE_LATENCY_SCALE", "1.0"))
+    
+    # Model routing: simple queries go to FALLBACK_MODEL, complex ones to DEFAULT_MODEL.
+    # A request still running after its hedge deadline (recent p95, between HEDGE_MIN_DELAY
+    # and HEDGE_AFTER seconds) is duplicated on the other model; the first answer wins
+    MODEL_ROUTING = os.getenv("MODEL_ROUTING", "true").lower() == "true"
+    HEDGING_ENABLED = os.getenv("HEDGING_ENABLED", "true").lower() == "true"
+    HEDGE_AFTER = float(os.getenv("HEDGE_AFTER", "8"))
+    HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "1"))
+    # Maximum hedged duplicates running at once for sync callers; when all are busy, new hedges are skipped
+    HEDGE_POOL_SIZE = int(os.getenv("HEDGE_POOL_SIZE", "32"))
+    
+    # Client-side Groq rate limiting: (requests, tokens) per minute for each model.
+    # Override with GROQ_RATE_LIMITS="llama3-70b-8192=30:6000,llama3-8b-8192=30:30000"
+    RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+    RATE_LIMITS = {
+        "llama3-70b-8192": (30, 6000),
+        "llama3-8b-8192": (30, 30000),
+        "default": (30, 6000),
+        **parse_rate_limits(os.getenv("GROQ_RATE_LIMITS", ""))
+    }
+    RATE_LIMIT_BURST_SECONDS = float(os.getenv("RATE_LIMIT_BURST_SECONDS", "10"))
+    RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "30"))
+    RATE_LIMIT_BACKOFF_BASE = float(os.getenv("RATE_LIMIT_BACKOFF_BASE", "1"))
+    RATE_LIMIT_BACKOFF_MAX = float(os.getenv("RATE_LIMIT_BACKOFF_MAX", "30"))
+    
+    # Per-session conversation memory: history beyond MEMORY_TOKEN_BUDGET is summarized
+    # with FALLBACK_MODEL, keeping the last MEMORY_RECENT_TURNS turns verbatim
+    MEMORY_ENABLED = os.getenv("MEMORY_ENABLED", "true").lower() == "true"
+    MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "1200"))
+    MEMORY_RECENT_TURNS = int(os.getenv("MEMORY_RECENT_TURNS", "2"))
+    MEMORY_MAX_TURN_TOKENS = int(os.getenv("MEMORY_MAX_TURN_TOKENS", "300"))
+    MEMORY_SUMMARY_TOKENS = int(os.getenv("MEMORY_SUMMARY_TOKENS", "250"))
+    MEMORY_MAX_SESSIONS = int(os.getenv("MEMORY_MAX_SESSIONS", "1024"))
+    MEMORY_SESSION_TTL = int(os.getenv("MEMORY_SESSION_TTL", "3600"))
+    
+    # Batch execution
+    BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+    BATCH_QUERY_TIMEOUT = float(os.getenv("BATCH_QUERY_TIMEOUT", "90"))
+    
+    # HTTP server mode: requests beyond SERVER_CONCURRENCY wait in a queue of SERVER_MAX_QUEUE,
+    # anything more (or waiting longer than SERVER_QUEUE_TIMEOUT) is rejected with 503
+    SERVER_HOST = os.getenv("SERVER_HOST", "127.0.0.1")
+    SERVER_PORT = int(os.getenv("SERVER_PORT", "8000"))
+    SERVER_CONCURRENCY = int(os.getenv("SERVER_CONCURRENCY", "64"))
+    SERVER_MAX_QUEUE = int(os.getenv("SERVER_MAX_QUEUE", "256"))
+    SERVER_QUEUE_TIMEOUT = float(os.getenv("SERVER_QUEUE_TIMEOUT", "10"))
+    SERVER_REQUEST_TIMEOUT = float(os.getenv("SERVER_REQUEST_TIMEOUT", "90"))
+    
+    # Worker processes for batch and server mode (0 = run agents in this process); each worker
+    # keeps a warm agent and is replaced after WORKER_MAX_REQUESTS requests (0 = never)
+    WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", "0"))
+    WORKER_MAX_REQUESTS = int(os.getenv("WORKER_MAX_REQUESTS", "1000"))
+    WORKER_START_METHOD = os.getenv("WORKER_START_METHOD", "spawn")
+    
+    @classmethod
+    def tracing_enabled(cls):
+        """Whether runs are traced to LangSmith."""
+        return str(cls.LANGCHAIN_TRACING_V2).lower() == "true"
+    
     @classmethod
     def setup_environment(cls):
         """Set up environment variables for LangChain and LangSmith."""
-        os.environ["GROQ_API_KEY"] = cls.GROQ_API_KEY
-        os.environ["LANGCHAIN_API_KEY"] = cls.LANGCHAIN_API_KEY
+        # Cassette replays run without a Groq key
+        if cls.GROQ_API_KEY:
+            os.environ["GROQ_API_KEY"] = cls.GROQ_API_KEY
+        if cls.LANGCHAIN_API_KEY:
+            os.environ["LANGCHAIN_API_KEY"] = cls.LANGCHAIN_API_KEY
         os.environ["LANGCHAIN_TRACING_V2"] = cls.LANGCHAIN_TRACING_V2
         os.environ["LANGCHAIN_PROJECT"] = cls.LANGCHAIN_PROJECT
         
     @classmethod
     def validate_keys(cls):
         """Validate that all required API keys are present."""
-        if not cls.GROQ_API_KEY:
+        if not cls.GROQ_API_KEY and cls.CASSETTE_MODE != "replay":
             raise ValueError("GROQ_API_KEY is required. Get it from https://console.groq.com/keys")
-        if not cls.LANGCHAIN_API_KEY:
-            raise ValueError("LANGCHAIN_API_KEY is required. Get it from https://smith.langchain.com/")
\ No newline at end of file
+        if cls.tracing_enabled() and not cls.LANGCHAIN_API_KEY:
+            raise ValueError("LANGCHAIN_API_KEY is required when LANGCHAIN_TRACING_V2 is true. Get it from https://smith.langchain.com/ or set LANGCHAIN_TRACING_V2=false")
\ No newline at end of file
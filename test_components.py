@@ -1,5 +1,57 @@
-from config import Config
-from tools import get_weather, calculate_travel_cost, get_recommendations
+import asyncio
+import contextlib
+import functools
+import io
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import httpx
+import requests
+from requests.adapters import BaseAdapter
+
+from app import TravelPlanningApp
+from config import Config, parse_rate_limits
+from tools import get_weather, calculate_travel_cost, calculate_cost_matrix, get_recommendations
+from tools.cost_calculator import cost_matrix, BASE_COSTS
+from tools.poi_store import POIStore, build_poi_store, synthetic_records
+from tools.gazetteer import resolve_place, canonical_key
+from tools import http_client, weather_tool
+from tools.cache import TTLCache, SQLiteCache, RequestCoalescer
+from tools.forecast import get_weather_forecast
+from agent.response_cache import ResponseCache
+from agent.workflow import TravelPlanningWorkflow, parse_trip_request
+from agent.batch_runner import BatchQueryRunner
+from agent.fallback_agent import FallbackAgent
+from agent.metrics import MetricsRegistry, MetricsCallbackHandler, metrics
+from agent.server import AdmissionController, ServerOverloaded, TravelAgentServer
+from agent.memory import SessionMemory, SessionStore
+from agent.rate_limiter import ModelScheduler, RateLimitTimeout, get_scheduler
+from agent.router import ModelRouter, classify_query
+from agent.main_agent import TravelAgent, agent_prompt, tool_schemas, clear_executor_cache
+from agent.fast_path import classify_intent
+from agent.cassette import Cassette, CassetteMiss, install_cassettes, uninstall_cassettes
+from agent.llm import set_chat_model_factory
+from agent.worker_pool import AgentWorkerPool, WorkerError
+from agent.scratchpad import compact_scratchpad
+from agent.parallel_executor import ParallelAgentExecutor, ToolCallStreamParser, _Speculation
+from tools.results import from_dict
+from langchain.agents.output_parsers.tools import ToolAgentAction
+from langchain_core.agents import AgentAction, AgentFinish
+from langchain_core.runnables import RunnableLambda
+from langchain_core.tools import tool
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGenerationChunk
+from benchmarks.fake_llm import ScriptedChatModel, scripted_model_factory
+from benchmarks.run import offline_agent
+from benchmarks.load_test import FAIL_MARKER, build_schedule, parse_mix, run_load_test
+from langchain_core.language_models import FakeListChatModel
 
 def test_agent_components():
     """Test all agent components."""
@@ -9,18 +61,886 @@ def test_agent_components():
     
     # Test individual tools
     print("1. Testing Weather Tool:")
-    weather_result = get_weather("London")
+    weather_result = get_weather.invoke({"city": "London"})
     print(f"   Result: {weather_result}")
     
     print("\n2. Testing Cost Calculator:")
-    cost_result = calculate_travel_cost("New York", "Paris", "flight")
+    cost_result = calculate_travel_cost.invoke({"origin": "New York", "destination": "Paris", "travel_class": "flight"})
     print(f"   Result: {cost_result}")
     
     print("\n3. Testing Recommendations:")
-    rec_result = get_recommendations("Tokyo", "attractions")
+    rec_result = get_recommendations.invoke({"location": "Tokyo", "category": "attractions"})
     print(f"   Result: {rec_result}")
     
     print("\n✅ All components tested successfully!")
 
+def test_weather_cache():
+    """Test TTL expiry, LRU eviction and counters of the weather caches."""
+    cache = TTLCache(ttl=60, max_size=2)
+    cache.set("paris|fr", {"temp": 20})
+    cache.set("rome|it", {"temp": 25})
+    assert cache.get("paris|fr") == {"temp": 20}
+    cache.set("oslo|no", {"temp": 5})  # evicts rome, the least recently used
+    assert cache.get("rome|it") is None
+    cache.set("lima|pe", {"temp": 18}, ttl=0)
+    assert cache.get("lima|pe") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "weather.db")
+        SQLiteCache(path, ttl=60).set("paris|fr", {"temp": 20})
+        # A second instance (e.g. another worker process) sees the same entry
+        assert SQLiteCache(path, ttl=60).get("paris|fr") == {"temp": 20}
+
+OPENWEATHER_RESPONSE = {"weather": [{"description": "light rain"}], "main": {"temp": 12.5, "humidity": 80}}
+
+class StubAdapter(BaseAdapter):
+    """requests transport that answers every call with OPENWEATHER_RESPONSE."""
+
+    def __init__(self):
+        super().__init__()
+        self.urls = []
+
+    def send(self, request, **kwargs):
+        self.urls.append(request.url)
+        response = requests.Response()
+        response.status_code, response._content, response.request = 200, json.dumps(OPENWEATHER_RESPONSE).encode(), request
+        return response
+
+    def close(self):
+        pass
+
+def test_weather_transport():
+    """Test the real weather lookup through the pooled sync session and async client, backed by a SQLite cache."""
+    adapter, async_urls = StubAdapter(), []
+    session = requests.Session()
+    session.mount("http://", adapter)
+
+    def respond(request):
+        async_urls.append(request.url)
+        return httpx.Response(200, json=OPENWEATHER_RESPONSE)
+
+    async def lookups():
+        http_client._async_clients[asyncio.get_running_loop()] = httpx.AsyncClient(transport=httpx.MockTransport(respond))
+        try:
+            return [await weather_tool.get_weather.ainvoke({"city": "Rome"}) for _ in range(2)]
+        finally:
+            await http_client.aclose()
+
+    cache, api_key = weather_tool.weather_cache, Config.WEATHER_API_KEY
+    with tempfile.TemporaryDirectory() as tmp:
+        weather_tool.weather_cache = SQLiteCache(os.path.join(tmp, "weather.db"))
+        Config.WEATHER_API_KEY = "test-key"
+        http_client._session = session
+        try:
+            for _ in range(2):
+                assert str(weather_tool.get_weather.invoke({"city": "Paris"})) == "Paris: light rain, 12.5C, humidity 80%"
+            assert all(result.temp_c == 12.5 for result in asyncio.run(lookups()))
+        finally:
+            weather_tool.weather_cache, Config.WEATHER_API_KEY = cache, api_key
+            http_client.close()
+    # Second lookups are served from the cache; known places are queried by coordinates
+    assert len(adapter.urls) == 1 and len(async_urls) == 1
+    assert "lat=41.9028" in str(async_urls[0])
+
+def test_response_cache():
+    """Test that rephrased questions hit the cache and weather answers expire first."""
+    cache = ResponseCache(semantic=False)
+    cache.set("weather in Paris?", "Sunny, 21°C", latency=2.5)
+    assert cache.get("What's the weather like in Paris") == "Sunny, 21°C"
+    assert cache.get("weather in Rome") is None
+    assert cache.stats()["latency_saved"] == 2.5
+    assert cache.ttl_for("weather and hotels in Rome") < cache.ttl_for("hotels in Rome")
+
+class NearestCollection:
+    """In-memory stand-in for a chromadb collection that ranks every stored query as a near-perfect match."""
+
+    def __init__(self):
+        self.rows = {}
+        self.threads = set()
+
+    def upsert(self, ids, documents, metadatas=None):
+        self.threads.add(threading.get_ident())
+        self.rows.update(zip(ids, metadatas or [None] * len(ids)))
+
+    def query(self, query_texts, n_results, include):
+        self.threads.add(threading.get_ident())
+        keys = list(self.rows)[:n_results]
+        return {"ids": [keys], "distances": [[0.01] * len(keys)], "metadatas": [[self.rows[key] for key in keys]]}
+
+    def delete(self, ids):
+        for key in ids:
+            self.rows.pop(key, None)
+
+def test_semantic_response_cache():
+    """Test that semantic hits need the same places, in the same order, and the same topics."""
+    cache = ResponseCache(semantic=True)
+    cache._create_collection = NearestCollection
+    cache.set("How much is a flight from London to Paris?", "London->Paris: 120 USD")
+    cache.set("Hotels in Rome", "Top hotels in Rome")
+
+    assert cache.get("price of flying from London to Paris") == "London->Paris: 120 USD"
+    assert cache.get("How much is a flight from Paris to London?") is None
+    assert cache.get("Hotels in Milan") is None
+    assert cache.get("Weather in Rome") is None
+    assert cache.stats()["semantic_hits"] == 1 and cache.stats()["misses"] == 3
+
+    # Async callers embed and search on a worker thread; warm() builds the collection up front
+    cache = ResponseCache(semantic=True)
+    cache._create_collection = NearestCollection
+    cache.warm()
+    assert cache._collection is not None and cache._collection.rows == {}
+    cache._collection.threads.clear()
+
+    async def lookups():
+        await cache.aset("Weather in Tokyo", "Tokyo: sunny")
+        return await cache.aget("Tokyo weather"), threading.get_ident()
+
+    answer, loop_thread = asyncio.run(lookups())
+    assert answer == "Tokyo: sunny" and cache.stats()["semantic_hits"] == 1
+    assert loop_thread not in cache._collection.threads
+
+def test_structured_workflow():
+    """Test that a trip request becomes parallel memoized tool steps and one summary call."""
+    trip = parse_trip_request("Plan a trip from Berlin to Rome and Florence in Business class")
+    assert trip["origin"] == "Berlin" and trip["destinations"] == ["Rome", "Florence"]
+    assert trip["travel_class"] == "Business"
+    # Sentence-initial words are not places unless the gazetteer knows them
+    assert parse_trip_request("Flight cost from NYC to Tokyo")["origin"] == "NYC"
+    assert parse_trip_request("Flight cost from NYC to Tokyo")["destinations"] == ["Tokyo"]
+    assert parse_trip_request("Cost from London to Paris")["origin"] == "London"
+    assert parse_trip_request("Weather in Rome on my first day of a business trip")["travel_class"] == "Economy"
+    assert parse_trip_request("Flying first from Rome to Paris")["travel_class"] == "First"
+
+    workflow = TravelPlanningWorkflow(llm=FakeListChatModel(responses=["Your plan"]))
+    result = workflow.run({"user_input": "Weather and hotels in Lisbon and Porto"})
+    assert result["final_summary"] == "Your plan"
+    assert list(result["steps"]) == ["weather:Lisbon", "weather:Porto", "hotels:Lisbon", "hotels:Porto"]
+    again = workflow.run({"user_input": "Weather and hotels in Lisbon and Porto"})
+    assert all(step["cached"] for step in again["steps"].values())
+
+def test_metrics():
+    """Test that LLM and tool timings are recorded locally and exported as Prometheus text."""
+    registry = MetricsRegistry()
+    workflow = TravelPlanningWorkflow(llm=FakeListChatModel(responses=["Your plan"]), memo_ttl=0)
+    workflow.run({"user_input": "Weather in Oslo"}, callbacks=[MetricsCallbackHandler(registry)])
+    snapshot = registry.snapshot()
+    assert {h["name"] for h in snapshot["histograms"]} >= {"llm_call_seconds", "tool_call_seconds"}
+    assert 'tool_calls_total{tool="weather_lookup"} 1' in registry.to_prometheus()
+
+def test_admission_control():
+    """Test that requests beyond the running and queued limits are shed instead of queued."""
+    admission = AdmissionController(concurrency=1, max_queue=1, queue_timeout=5)
+    outcomes = []
+
+    async def request():
+        try:
+            async with admission.slot():
+                await asyncio.sleep(0.05)
+            outcomes.append("ok")
+        except ServerOverloaded:
+            outcomes.append("rejected")
+
+    async def burst():
+        await asyncio.gather(*(request() for _ in range(3)))
+
+    asyncio.run(burst())
+    assert sorted(outcomes) == ["ok", "ok", "rejected"]
+    assert admission.stats()["active"] == 0
+
+class BrokenStreamAgent:
+    """Agent whose stream fails after its first event."""
+
+    def warm(self):
+        pass
+
+    async def astream_with_fallback(self, query, session_id=None):
+        yield {"type": "token", "content": "Rome"}
+        raise RuntimeError("stream broke")
+
+def test_server_errors():
+    """Test that bad Content-Length headers get a 400 and a failing stream ends with an SSE error event."""
+    async def exchange(port, raw):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(raw)
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        return response.decode()
+
+    async def scenario():
+        server = TravelAgentServer(BrokenStreamAgent())
+        listener = await server.start("127.0.0.1", 0)
+        port = listener.sockets[0].getsockname()[1]
+        try:
+            responses = [
+                await exchange(port, f"POST /chat HTTP/1.1\r\nContent-Length: {length}\r\n\r\n".encode())
+                for length in ("abc", "-5")
+            ]
+            body = b'{"query": "Hotels in Rome"}'
+            stream = await exchange(
+                port, b"POST /chat/stream HTTP/1.1\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body)
+            )
+        finally:
+            listener.close()
+            await listener.wait_closed()
+        return responses, stream
+
+    responses, stream = asyncio.run(scenario())
+    assert all(response.startswith("HTTP/1.1 400") for response in responses)
+    assert stream.count("HTTP/1.1") == 1 and "event: token" in stream
+    assert stream.rstrip().endswith('data: {"type": "error", "error": "stream broke"}')
+
+def test_session_memory():
+    """Test that old turns are folded into a summary so history stays within its token budget."""
+    summarizer = FakeListChatModel(responses=["Trip to Rome in May, budget 2000 EUR."] * 10)
+    memory = SessionMemory(token_budget=120, recent_turns=2, summarizer=lambda: summarizer)
+    for day in range(6):
+        if memory.add_turn(f"What should I do in Rome on day {day}?", "Visit the Colosseum and Forum. " * 5):
+            memory.compact()
+    assert memory.tokens() <= 120
+    assert len(memory.turns) == 2 and memory.summary.startswith("Trip to Rome")
+    assert memory.messages()[0].content.endswith("budget 2000 EUR.")
+
+    # A clear or restore while the summary is being written must not lose or misplace turns
+    class SlowSummarizer:
+        def __init__(self):
+            self.started, self.release = threading.Event(), threading.Event()
+            self.prompts = []
+
+        def invoke(self, prompt):
+            self.prompts.append(prompt)
+            self.started.set()
+            self.release.wait(5)
+            return AIMessage(content="Old summary.")
+
+    for interrupt in ("clear", "restore"):
+        slow = SlowSummarizer()
+        store = SessionStore(token_budget=120, recent_turns=1, summarizer=lambda: slow)
+        memory = store.get("user-1")
+        for day in range(4):
+            memory.add_turn(f"Day {day} in Rome?", "Visit the Colosseum and Forum. " * 5)
+        compaction = threading.Thread(target=memory.compact)
+        compaction.start()
+        assert slow.started.wait(5)
+        if interrupt == "clear":
+            memory.clear()
+        else:
+            store.restore({"user-1": {"summary": "", "turns": [("Trip to Rome?", "Sure.")]}})
+            assert memory.turns[0][0] == "Day 0 in Rome?"  # not merged while the compaction runs
+        slow.release.set()
+        compaction.join(5)
+        store._compactor.shutdown(wait=True)
+        if interrupt == "clear":
+            assert memory.turns == [] and memory.summary == ""
+        else:
+            # Merged after the compaction: either still a turn or folded by a later summary
+            assert memory.turns[0][0] == "Trip to Rome?" or "Trip to Rome?" in slow.prompts[-1]
+            assert memory.turns[-1][0] == "Day 3 in Rome?"
+
+def raise_interrupt(*args):
+    raise KeyboardInterrupt
+
+def test_rate_limiter():
+    """Test that the scheduler admits a burst, then holds calls back instead of exceeding the quota."""
+    scheduler = ModelScheduler("test-model", rpm=60, tpm=1000, burst_seconds=2, max_wait=0.05)
+    scheduler.acquire(10)
+    scheduler.acquire(10)
+    try:
+        scheduler.acquire(10)
+        assert False, "third call in the same instant should exceed the 2-request burst"
+    except RateLimitTimeout:
+        pass
+    # Real usage above the estimate is charged to the token bucket
+    scheduler.settle(10, {"total_tokens": 40, "completion_tokens": 30})
+    assert scheduler.tokens.level < 0
+
+    # A waiter interrupted at the head of the queue doesn't block the callers behind it
+    scheduler = ModelScheduler("test-model", rpm=60, tpm=1000, burst_seconds=1, max_wait=1)
+    scheduler.acquire(10)
+    scheduler._cond.wait = raise_interrupt
+    try:
+        scheduler.acquire(10)
+        assert False, "expected KeyboardInterrupt"
+    except KeyboardInterrupt:
+        pass
+    del scheduler._cond.wait
+    scheduler.requests.give_back(1)
+    started = time.monotonic()
+    scheduler.acquire(10)
+    assert time.monotonic() - started < 0.5
+
+    # Malformed GROQ_RATE_LIMITS entries are skipped instead of failing at import
+    assert parse_rate_limits("a=10:100, model=30,b=a:b,=1:2,c=-1:5,d=20:2000") == {"a": (10, 100), "d": (20, 2000)}
+    assert parse_rate_limits("") == {}
+
+streamed_temperatures = []
+
+class TemperatureModel(ScriptedChatModel):
+    """ScriptedChatModel that records the temperature of every streamed call in `streamed_temperatures`."""
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        streamed_temperatures.append(self.temperature)
+        yield from super()._stream(messages, stop, run_manager, **kwargs)
+
+class StubAgent:
+    """Stands in for a TravelAgent with a fixed latency (or failure)."""
+
+    def __init__(self, model, latency, fail=False):
+        self.model, self.latency, self.fail, self.tools = model, latency, fail, []
+
+    def invoke(self, input_text, chat_history=None, callbacks=None):
+        time.sleep(self.latency)
+        if self.fail:
+            raise RuntimeError(f"{self.model} is down")
+        return {"output": self.model}
+
+def test_model_router():
+    """Test routing by complexity, hedging a slow primary, and cascading when it fails."""
+    assert classify_query("What's the weather in Paris?") == "simple"
+    assert classify_query("Plan a trip from Berlin to Rome") == "complex"
+
+    hedged = ModelRouter(StubAgent("fast", latency=1.0), StubAgent("strong", latency=0.05), hedge_after=0.1)
+    start = time.perf_counter()
+    assert hedged.invoke("Weather in Paris?")["output"] == "strong"
+    assert time.perf_counter() - start < 0.5
+
+    cascading = ModelRouter(StubAgent("fast", latency=0, fail=True), StubAgent("strong", latency=0), hedge_after=5)
+    assert cascading.invoke("Weather in Paris?")["output"] == "strong"
+
+    # With every hedge worker busy the slow primary is waited for instead of queueing a duplicate
+    saturated = ModelRouter(StubAgent("fast", latency=0.3), StubAgent("strong", latency=0), hedge_after=0.05)
+    for _ in range(Config.HEDGE_POOL_SIZE):
+        saturated._hedge_slots.acquire()
+    assert saturated.invoke("Weather in Paris?")["output"] == "fast"
+
+def test_executor_reuse():
+    """Test that agents share executors per configuration and apply per-call overrides without rebuilding."""
+    Config.setup_environment()
+    first = TravelAgent(model="llama3-8b-8192", temperature=0.2, verbose=False)
+    second = TravelAgent(model="llama3-8b-8192", temperature=0.2, verbose=False)
+    assert first.agent_executor is second.agent_executor
+    assert agent_prompt() is agent_prompt() and tool_schemas() is tool_schemas()
+
+    executor = first.agent_executor
+    first.update_config(temperature=0.9)
+    assert first.agent_executor is not executor
+    first.update_config(temperature=0.2)
+    assert first.agent_executor is executor
+
+    resolved, configurable = first._run({"temperature": 0.0, "max_tokens": 256})
+    assert resolved is executor and configurable == {"temperature": 0.0, "max_tokens": 256}
+
+    # Overrides reach the LLM even when every chunk of a stream is consumed on another thread
+    set_chat_model_factory(lambda model, **kwargs: TemperatureModel(model=model, latency=0, **kwargs))
+    clear_executor_cache()
+    streamed_temperatures.clear()
+    try:
+        agent = TravelAgent(verbose=False, fast_path=False)
+        chunks = agent.stream("Weather in Lisbon", temperature=0.1)
+        while True:
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                if pool.submit(next, chunks, None).result() is None:
+                    break
+        assert streamed_temperatures == [0.1, 0.1]
+        agent.invoke("Weather in Lisbon")
+        assert streamed_temperatures[2:] == [0.7, 0.7]
+    finally:
+        set_chat_model_factory(None)
+        clear_executor_cache()
+
+def test_cost_matrix():
+    """Test the vectorized cost matrix and the structured output of its tool."""
+    import numpy as np
+
+    costs = cost_matrix(["London", "Paris"], ["Paris", "Rome", "Tokyo"], ["Economy", "First"], rng=np.random.default_rng(0))
+    assert costs.shape == (2, 3, 2)
+    assert (costs[1, 0] == 0).all()
+    # Each route uses one multiplier for all classes
+    ratio = costs[0, :, 1] / costs[0, :, 0]
+    assert np.allclose(ratio, BASE_COSTS["First"] / BASE_COSTS["Economy"])
+
+    result = calculate_cost_matrix.invoke({"origins": ["Paris"], "destinations": ["Paris", "Rome", "Tokyo"]})
+    economy = result.costs[0]
+    assert result.cheapest_overall["Economy"]["cost"] == min(cost[0] for cost in economy[1:])
+    assert result.cheapest_by_origin["Paris"]["Economy"]["destination"] != "Paris"
+
+def test_poi_store():
+    """Test top-k, fuzzy/prefix city matching and geo lookups of the POI store."""
+    with tempfile.TemporaryDirectory() as path:
+        assert build_poi_store(synthetic_records(3000), path) == 3000
+        store = POIStore(path)
+        hotels = store.top("Paris, France", "hotel", k=5)
+        assert len(hotels) == 5 and all(place["city"] == "Paris" and place["category"] == "hotels" for place in hotels)
+        assert [place["rating"] for place in hotels] == sorted((place["rating"] for place in hotels), reverse=True)
+        assert store.cities[store.match_city("new yrok")] == "New York"
+        assert store.cities[store.match_city("Bang")] == "Bangkok"
+        assert store.match_city("Atlantis") is None and store.top("Atlantis", "hotels") == []
+
+        nearby = store.near(48.857, 2.352, radius_km=3, category="restaurants", k=3)
+        assert nearby and all(place["city"] == "Paris" and place["category"] == "restaurants" for place in nearby)
+
+    # Namesakes in different countries stay apart
+    records = list(synthetic_records(300)) + [
+        {"name": "Eiffel Tower Replica", "city": "Paris", "country": "US", "category": "attractions",
+         "lat": 33.66, "lon": -95.56, "rating": 4.0},
+        {"name": "Covent Garden", "city": "London, UK", "category": "attractions", "lat": 51.51, "lon": -0.12, "rating": 5.0}
+    ]
+    with tempfile.TemporaryDirectory() as path:
+        build_poi_store(records, path)
+        store = POIStore(path)
+        assert [place["name"] for place in store.top("Paris, Texas", "attractions")] == ["Eiffel Tower Replica"]
+        assert "Eiffel Tower Replica" not in [place["name"] for place in store.top("Paris", "attractions", k=50)]
+        assert store.countries[store.match_city("Paris, France")] == "FR"
+        assert store.match_city("London, KY") is None and store.match_city("London, Canada") is None
+        assert store.top("London", "attractions")[0]["name"] == "Covent Garden"
+
+def test_gazetteer():
+    """Test that spellings, aliases and country qualifiers resolve to one canonical place."""
+    assert {canonical_key(name) for name in ("NYC", "New York, US", "new york", "New York City")} == {"new-york-us"}
+    assert resolve_place("Paris").country == "FR"
+    assert resolve_place("Paris, US").id == resolve_place("Paris, Texas").id == "paris-us"
+    assert resolve_place("London UK").id == "london-gb" and resolve_place("London", "CA").id == "london-ca"
+    assert resolve_place("München").id == "munich-de"
+    assert resolve_place("Atlantis") is None and canonical_key("Atlantis") == "atlantis"
+    # Unknown qualifiers don't fall back to the most populous namesake
+    assert resolve_place("Paris, TX") is None and resolve_place("London, KY") is None
+    assert resolve_place("Paris", "XX") is None and canonical_key("Paris", "XX") == "paris|xx"
+
+    # Tools and caches share the canonical form
+    cache = ResponseCache(semantic=False)
+    cache.set("What's the weather in NYC?", "Sunny")
+    assert cache.get("weather in New York") == "Sunny"
+
+def test_batch_forecast():
+    """Test request coalescing and the batch forecast tool."""
+    coalescer, calls = RequestCoalescer(), []
+
+    async def fetch(city):
+        calls.append(city)
+        await asyncio.sleep(0.05)
+        return city.upper()
+
+    async def lookups():
+        return await asyncio.gather(*(coalescer.acall("paris", fetch, "paris") for _ in range(5)))
+
+    assert asyncio.run(lookups()) == ["PARIS"] * 5
+    assert calls == ["paris"] and coalescer.coalesced == 4 and coalescer.in_flight() == 0
+
+    # An interrupted leader still releases the key and its waiters
+    def interrupted():
+        waiter.start()
+        time.sleep(0.1)
+        raise KeyboardInterrupt
+
+    def wait_for_leader():
+        try:
+            coalescer.call("rome", str.upper, "rome")
+        except RuntimeError as e:
+            errors.append(e)
+
+    errors = []
+    waiter = threading.Thread(target=wait_for_leader, daemon=True)
+    try:
+        coalescer.call("rome", interrupted)
+        assert False, "expected KeyboardInterrupt"
+    except KeyboardInterrupt:
+        pass
+    waiter.join(timeout=1)
+    assert len(errors) == 1 and coalescer.in_flight() == 0
+    assert coalescer.call("rome", str.upper, "rome") == "ROME"
+
+    result = get_weather_forecast.invoke({"cities": ["NYC", "Paris, France"]})
+    new_york, paris = result.forecasts["NYC"], result.forecasts["Paris, France"]
+    assert new_york["city"] == "New York" and paris["city"] == "Paris"
+    assert len(new_york["days"]) == 5 and new_york["days"][0]["min_temp"] <= new_york["days"][0]["max_temp"]
+    start = new_york["days"][1]["date"]
+    ranged = get_weather_forecast.invoke({"cities": ["New York"], "start_date": start, "end_date": start})
+    assert ranged.forecasts["New York"]["days"] == [new_york["days"][1]]
+
+    # Only queries about dates ahead prefetch a forecast; current conditions don't spend the quota
+    assert parse_trip_request("Weather in Paris this weekend")["wants_forecast"]
+    assert parse_trip_request("Forecast for Rome on 2026-05-04")["wants_forecast"]
+    assert not parse_trip_request("What's the weather in Paris?")["wants_forecast"]
+    assert not parse_trip_request("Hotels in Rome for 3 nights")["wants_forecast"]
+
+def test_fast_path():
+    """Test that obvious single-tool queries are answered without the agent loop."""
+    assert classify_intent("What's the weather in Paris?") == ("weather_lookup", {"city": "Paris"})
+    assert classify_intent("Hotels in Rome")[0] == "destination_recommendations"
+    assert classify_intent("Weather forecast for Paris tomorrow")[0] == "weather_forecast"
+    assert classify_intent("Flight cost from NYC to Tokyo")[1]["destination"] == "Tokyo"
+    for query in ("Plan a trip to Rome", "Hotels and weather in Rome", "Is it safe to visit Paris?", "Weather in Atlantis",
+                  "Hotels in Paris under 100 dollars", "What was the weather in Paris yesterday?",
+                  "Weather in Paris next week", "Hotels in Rome but not near the station", "Restaurants in Rome without meat"):
+        assert classify_intent(query) is None
+
+    agent = TravelAgent(verbose=False)
+    assert agent.invoke("Hotels in Rome")["output"].startswith("Top hotels in Rome")
+    # No LLM call was needed, so the executor was never even looked up
+    assert agent._agent_executor is None
+
+def test_lazy_agent_package():
+    """Test that importing the agent package defers LangChain until an export is used."""
+    script = (
+        "import sys, agent\n"
+        "assert 'langchain' not in sys.modules and 'agent.main_agent' not in sys.modules\n"
+        "assert agent.TravelAgent.__module__ == 'agent.main_agent' and 'TravelAgent' in vars(agent)\n"
+        "try:\n"
+        "    agent.Missing\n"
+        "    raise SystemExit('expected AttributeError')\n"
+        "except AttributeError:\n"
+        "    pass\n"
+    )
+    subprocess.run([sys.executable, "-c", script], check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+
+class CheckedApp(TravelPlanningApp):
+    """App whose connection check is instant and counted."""
+
+    checks = 0
+
+    def connection_status(self):
+        CheckedApp.checks += 1
+        return "✅ Groq connection successful!"
+
+def test_connection_check_modes():
+    """Test that the startup connection check is skipped, printed, or deferred until the next prompt."""
+    for mode, checks, printed in (("off", 0, ""), ("sync", 1, "✅ Groq connection successful!\n"), ("background", 1, "")):
+        CheckedApp.checks = 0
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            app = CheckedApp(connection_check=mode)
+            if app._connection_thread is not None:
+                app._connection_thread.join(timeout=5)
+        assert CheckedApp.checks == checks
+        assert out.getvalue().endswith(f"Agent...\n{printed}")
+
+    # The background result is shown once, before the next prompt
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        app.print_connection_status()
+        app.print_connection_status()
+    assert out.getvalue() == "✅ Groq connection successful!\n"
+
+def test_cassettes():
+    """Test that recorded LLM and tool calls replay without touching the live backends."""
+    query = "Plan a trip to Rome with the weather and hotels"
+    with tempfile.TemporaryDirectory() as path:
+        set_chat_model_factory(scripted_model_factory(latency=0))
+        try:
+            install_cassettes(path, mode="record", latency_scale=0)
+            recorded = TravelAgent(verbose=False, fast_path=False).invoke(query)["output"]
+            uninstall_cassettes()
+            assert len(Cassette(path)) >= 3
+
+            # Any live call now fails, so a matching answer can only come from the cassette
+            set_chat_model_factory(scripted_model_factory(latency=0, failure_rate=1.0))
+            install_cassettes(path, mode="replay", latency_scale=0)
+            assert TravelAgent(verbose=False, fast_path=False).invoke(query)["output"] == recorded
+            try:
+                TravelAgent(verbose=False, fast_path=False).invoke("Weather in Tokyo")
+                assert False, "expected a cassette miss"
+            except CassetteMiss:
+                pass
+        finally:
+            uninstall_cassettes()
+            set_chat_model_factory(None)
+
+        # Replay needs no Groq key: the app starts and builds its agent without one
+        env = {name: value for name, value in os.environ.items() if name != "GROQ_API_KEY"}
+        env.update(CASSETTE_MODE="replay", CASSETTE_PATH=path, LANGCHAIN_TRACING_V2="false")
+        script = (
+            "from app import TravelPlanningApp\n"
+            "app = TravelPlanningApp(connection_check='off')\n"
+            "assert app.agent.primary_agent.agent_executor is not None\n"
+        )
+        subprocess.run([sys.executable, "-c", script], check=True, env=env, stdout=subprocess.DEVNULL,
+                       cwd=os.path.dirname(os.path.abspath(__file__)))
+
+class QuotaAgent:
+    """Worker agent that only asks its process's scheduler for a "quota-model" call."""
+
+    memory = None
+
+    def warm(self):
+        pass
+
+    async def arun_with_fallback(self, query, session_id=None):
+        scheduler = get_scheduler("quota-model")
+        scheduler.max_wait = 0.05
+        try:
+            await scheduler.aacquire(1)
+            return "admitted"
+        except RateLimitTimeout:
+            return "limited"
+
+def test_worker_pool():
+    """Test that worker processes answer queries, keep sessions sticky and hand them over when recycled."""
+    factory = functools.partial(offline_agent, llm_latency=0, token_latency=0, failure_rate=0, seed=0)
+    with AgentWorkerPool(workers=2, agent_factory=factory, max_requests=3) as pool:
+        assert pool._route("user-1") is pool._route("user-1")
+        assert "Rome" in pool.run_with_fallback("Hotels in Rome", session_id="user-1")
+
+        async def session():
+            for _ in range(4):
+                await pool.arun_with_fallback("What's the weather in Paris?", session_id="user-1")
+            return [event async for event in pool.astream_with_fallback("Hotels in Rome", session_id="user-1")]
+
+        events = asyncio.run(session())
+        assert events[-1]["type"] == "end"
+        # Six requests on a slot that recycles after three
+        deadline = time.time() + 30
+        while pool.recycled < 1 and time.time() < deadline:
+            time.sleep(0.1)
+        assert pool.recycled >= 1
+        assert len(pool.stats()["workers"]) == 2
+
+    # A worker killed mid-request fails that request; the next one gets a replacement without stalling the loop
+    factory = functools.partial(offline_agent, llm_latency=0.5, token_latency=0, failure_rate=0, seed=0)
+    with AgentWorkerPool(workers=1, agent_factory=factory, max_requests=0) as pool:
+        async def crash():
+            loop = asyncio.get_running_loop()
+            running = asyncio.ensure_future(pool.arun_with_fallback("Plan a trip from Berlin to Rome", session_id="user-2"))
+            await asyncio.sleep(0.2)
+            os.kill(pool._workers[0].process.pid, signal.SIGKILL)
+            try:
+                await running
+                assert False, "expected the request to fail with its worker"
+            except WorkerError:
+                pass
+
+            gaps, stop = [], asyncio.Event()
+
+            async def ticker():
+                while not stop.is_set():
+                    before = loop.time()
+                    await asyncio.sleep(0.01)
+                    gaps.append(loop.time() - before)
+
+            ticking = asyncio.ensure_future(ticker())
+            await asyncio.sleep(0.05)
+            answer = await pool.arun_with_fallback("Hotels in Rome", session_id="user-2")
+            stop.set()
+            await ticking
+            return answer, max(gaps)
+
+        answer, longest_gap = asyncio.run(crash())
+        assert "Rome" in answer and longest_gap < 0.5
+
+    # Two workers together admit no more calls than one process's quota (a 10-request burst)
+    limits = Config.RATE_LIMITS
+    Config.RATE_LIMITS = {"quota-model": (60, 100000)}
+    try:
+        with AgentWorkerPool(workers=2, agent_factory=QuotaAgent, max_requests=0) as pool:
+            pool.warm()
+            answers = BatchQueryRunner(pool, concurrency=4, timeout=30).run([f"call {i}" for i in range(30)])
+    finally:
+        Config.RATE_LIMITS = limits
+    assert 8 <= answers.count("admitted") <= 12
+
+    # What a retiring worker hands to its replacement
+    old, new = SessionStore(), SessionStore()
+    old.record("user-1", "Trip to Rome?", "Sure.")
+    new.record("user-1", "In May", "Noted.")
+    new.restore(old.export())
+    assert [turn[0] for turn in new.get("user-1").turns] == ["Trip to Rome?", "In May"]
+
+def test_compact_results():
+    """Test the compact tool result format and that earlier observations are clipped in the scratchpad."""
+    weather = get_weather.invoke({"city": "NYC"})
+    assert str(weather).startswith("New York: ") and "Perfect" not in str(weather)
+    assert from_dict(json.loads(json.dumps(weather.to_dict()))) == weather
+    hotels = get_recommendations.invoke({"location": "Rome", "category": "hotels"})
+    assert str(hotels).startswith("hotels in Rome: ") and hotels.describe().startswith("Top hotels in Rome:\n- ")
+    assert str(get_recommendations.invoke({"location": "NYC", "category": "hotels"})).startswith("hotels in New York: ")
+    assert str(get_recommendations.invoke({"location": "paris, fr", "category": "hotels"})).startswith("hotels in Paris: ")
+
+    forecast = get_weather_forecast.invoke({"cities": ["Paris", "Rome", "Tokyo"]})
+    planned, followed_up = AIMessage(content="planning"), AIMessage(content="follow-up")
+    steps = [
+        (ToolAgentAction(tool="weather_forecast", tool_input={}, log="", message_log=[planned], tool_call_id="1"), forecast),
+        (ToolAgentAction(tool="weather_lookup", tool_input={}, log="", message_log=[followed_up], tool_call_id="2"), weather)
+    ]
+    observations = [message.content for message in compact_scratchpad(steps, observation_tokens=30) if message.type == "tool"]
+    assert len(observations[0]) < len(str(forecast)) and observations[0].startswith("Paris: ")
+    assert observations[1] == str(weather)
+
+class CountingAgent:
+    """Wraps a FallbackAgent and records the most queries it ran at once."""
+
+    def __init__(self, agent):
+        self.agent, self.active, self.peak = agent, 0, 0
+
+    async def arun_with_fallback(self, query):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            return await self.agent.arun_with_fallback(query)
+        finally:
+            self.active -= 1
+
+def test_batch_runner():
+    """Test that batch results keep input order under the concurrency cap and slow queries time out."""
+    cities = ["Paris", "Rome", "Tokyo", "London", "Lisbon"]
+    queries = [f"Weather in {city}" for city in cities]
+    set_chat_model_factory(scripted_model_factory(latency=0.1))
+    clear_executor_cache()
+    try:
+        agent = CountingAgent(FallbackAgent(TravelAgent(verbose=False, fast_path=False)))
+        results = BatchQueryRunner(agent, concurrency=2, timeout=30).run(queries)
+        assert all(f"{city}: " in result for city, result in zip(cities, results))
+        assert agent.peak == 2
+
+        # Each query needs two 0.1s model calls, so none fits in 0.05s (the answers above are cached)
+        timed_out = BatchQueryRunner(agent, concurrency=5, timeout=0.05).run(["Hotels in Paris", "Hotels in Rome"])
+        assert timed_out == ["Query timed out after 0.05s. Please try again later."] * 2
+    finally:
+        set_chat_model_factory(None)
+        clear_executor_cache()
+
+class MidStreamFailureAgent:
+    """Primary agent that streams a token and a tool call, then fails."""
+
+    def invoke(self, input_text, chat_history=None, callbacks=None):
+        handler = callbacks[0]
+        handler.on_llm_new_token("Let me check. ")
+        handler.on_tool_start({"name": "weather_lookup"}, "{'city': 'Paris'}")
+        raise RuntimeError("connection reset")
+
+def collapse(events):
+    """Event types in order, with runs of tokens merged into one."""
+    types = []
+    for event in events:
+        if not (types and event["type"] == types[-1] == "token"):
+            types.append(event["type"])
+    return types
+
+def test_stream_events():
+    """Test the token/tool/end event sequence and switching to the fallback LLM mid-stream."""
+    set_chat_model_factory(scripted_model_factory(latency=0))
+    clear_executor_cache()
+    try:
+        events = list(FallbackAgent(TravelAgent(verbose=False, fast_path=False)).stream_with_fallback("Weather in Lisbon"))
+    finally:
+        set_chat_model_factory(None)
+        clear_executor_cache()
+    assert collapse(events) == ["tool_start", "tool_end", "token", "end"]
+    assert events[0]["name"] == "weather_lookup" and events[1]["output"].startswith("Lisbon: ")
+    assert "".join(event["content"] for event in events if event["type"] == "token") == events[-1]["output"]
+
+    agent = FallbackAgent(MidStreamFailureAgent())
+    agent.fallback_llm = ScriptedChatModel(latency=0)
+    events = list(agent.stream_with_fallback("Weather in Lisbon, please"))
+    assert collapse(events) == ["token", "tool_start", "fallback", "token", "end"]
+    assert events[2]["error"] == "connection reset"
+    # The partial primary answer is not part of the final output
+    assert events[-1]["output"].startswith("[Fallback Mode - Groq Direct] Happy to help")
+    assert "".join(event["content"] for event in events[3:-1]) == events[-1]["output"]
+
+def test_parallel_tool_execution():
+    """Test that the tool calls of one agent step overlap and their observations keep request order."""
+    @tool
+    def slow_lookup(city: str) -> str:
+        """Look up a city slowly."""
+        time.sleep(0.5 if city == "Rome" else 0.3)
+        return f"{city} done"
+
+    def plan(inputs):
+        if inputs["intermediate_steps"]:
+            return AgentFinish({"output": "done"}, "")
+        return [AgentAction("slow_lookup", {"city": city}, "") for city in ("Rome", "Paris")]
+
+    executor = ParallelAgentExecutor(agent=RunnableLambda(plan), tools=[slow_lookup], return_intermediate_steps=True)
+    start = time.perf_counter()
+    result = executor.invoke({"input": "Rome and Paris"})
+    # Sequential calls would take 0.8s; Paris finishes first but is still reported second
+    assert time.perf_counter() - start < 0.7
+    assert [observation for _, observation in result["intermediate_steps"]] == ["Rome done", "Paris done"]
+
+def test_speculative_tools():
+    """Test that streamed tool calls start before the message ends and their results are reused."""
+    parser = ToolCallStreamParser()
+    assert parser.feed([{"name": "weather_lookup", "args": '{"city": "Pa', "id": "call_0", "index": 0}]) == []
+    assert parser.feed([{"name": None, "args": 'ris"}', "id": None, "index": 0}]) == [("weather_lookup", {"city": "Paris"})]
+    assert parser.feed([{"name": None, "args": "", "id": None, "index": 0}]) == []
+
+    # A call the final message does not make is cancelled when the step ends
+    started = []
+    speculation = _Speculation({"weather_lookup": get_weather}, lambda tool, args: started.append(args) or Future())
+    chunk = ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=[
+        {"name": "weather_lookup", "args": '{"city": "Paris"}', "id": "call_0", "index": 0}
+    ]))
+    speculation.on_llm_new_token("", chunk=chunk, run_id="llm-run")
+    assert started == [{"city": "Paris"}]
+    assert speculation.take(ToolAgentAction(tool="weather_lookup", tool_input={"city": "Rome"}, log="", message_log=[], tool_call_id="0")) is None
+    future = speculation._futures[("weather_lookup", '{"city": "Paris"}')]
+    speculation.discard()
+    assert future.cancelled()
+
+    def used(tool):
+        return sum(
+            counter["value"] for counter in metrics.snapshot()["counters"]
+            if counter["name"] == "speculative_tool_calls_total" and counter["labels"] == {"result": "used", "tool": tool}
+        )
+
+    before = used("weather_lookup")
+    set_chat_model_factory(scripted_model_factory(latency=0, token_latency=0.01))
+    clear_executor_cache()
+    try:
+        agent = TravelAgent(verbose=False, fast_path=False)
+        output = agent.invoke("Plan a trip to Rome with the weather and hotels")["output"]
+        assert "Rome: " in output and "hotels in Rome: " in output
+        asyncio.run(agent.ainvoke("Plan a trip to Paris with the weather"))
+    finally:
+        set_chat_model_factory(None)
+        clear_executor_cache()
+    assert used("weather_lookup") == before + 2
+
+def test_load_test():
+    """Test the open-loop load driver: reproducible arrivals, fallback accounting and the SLO verdict."""
+    mix = parse_mix("single=1,failure=1")
+    schedule = build_schedule(20, 1.0, mix, seed=1)
+    assert schedule == build_schedule(20, 1.0, mix, seed=1)
+    assert all(later[0] > earlier[0] for earlier, later in zip(schedule, schedule[1:]))
+
+    set_chat_model_factory(scripted_model_factory(latency=0, fail_marker=FAIL_MARKER))
+    clear_executor_cache()
+    try:
+        slos = {"p95_ms": 60000, "p99_ms": None, "error_rate": 0.0}
+        report = asyncio.run(run_load_test("fallback", [10], 1.0, parse_mix("failure=1"), slos))
+    finally:
+        set_chat_model_factory(None)
+        clear_executor_cache()
+    step = report["steps"][0]
+    assert step["requests"] > 0 and step["fallback_rate"] == 1.0 and step["error_rate"] == 0.0
+    assert report["max_sustainable_qps"] == 10 and report["saturated_at_qps"] is None
+
 if __name__ == "__main__":
-    test_components()
\ No newline at end of file
+    test_agent_components()
+    test_weather_cache()
+    test_weather_transport()
+    test_response_cache()
+    test_semantic_response_cache()
+    test_structured_workflow()
+    test_metrics()
+    test_admission_control()
+    test_server_errors()
+    test_session_memory()
+    test_rate_limiter()
+    test_model_router()
+    test_executor_reuse()
+    test_cost_matrix()
+    test_poi_store()
+    test_gazetteer()
+    test_batch_forecast()
+    test_fast_path()
+    test_lazy_agent_package()
+    test_connection_check_modes()
+    test_cassettes()
+    test_worker_pool()
+    test_compact_results()
+    test_batch_runner()
+    test_stream_events()
+    test_parallel_tool_execution()
+    test_speculative_tools()
+    test_load_test()
@@ -1,5 +1,6 @@
 from .weather_tool import get_weather
-from .cost_calculator import calculate_travel_cost
+from .forecast import get_weather_forecast
+from .cost_calculator import calculate_travel_cost, calculate_cost_matrix
 from .recommendations import get_recommendations
 
-__all__ = ["get_weather", "calculate_travel_cost", "get_recommendations"]
\ No newline at end of file
+__all__ = ["get_weather", "get_weather_forecast", "calculate_travel_cost", "calculate_cost_matrix", "get_recommendations"]
\ No newline at end of file
@@ -0,0 +1,257 @@
+import asyncio
+import concurrent.futures
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Thread-safe in-memory cache with per-entry TTL and LRU eviction."""
+
+    def __init__(self, ttl=600, max_size=1024):
+        """
+        Initialize the cache.
+        Args:
+            ttl (float): Seconds an entry stays fresh
+            max_size (int): Maximum number of entries before the least recently used is evicted
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value for `key`, or None if missing or expired."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        """Store `value` under `key` for `ttl` seconds (defaults to the cache TTL)."""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    async def aget(self, key):
+        """`get` for coroutines; the in-memory lookup never blocks, so it runs inline."""
+        return self.get(key)
+
+    async def aset(self, key, value, ttl=None):
+        """`set` for coroutines."""
+        self.set(key, value, ttl)
+
+    def clear(self):
+        """Remove all entries and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def items(self):
+        """Unexpired (key, value) pairs, least recently used first."""
+        now = time.monotonic()
+        with self._lock:
+            return [(key, value) for key, (expires_at, value) in self._entries.items() if expires_at > now]
+
+    def stats(self):
+        """Return hit/miss counters and the current size."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self)
+        }
+
+
+class SQLiteCache(TTLCache):
+    """
+    TTL + LRU cache persisted in a SQLite file.
+    The file survives restarts and can be shared by several worker processes;
+    hit/miss counters are tracked per process.
+    """
+
+    def __init__(self, path, ttl=600, max_size=1024):
+        """
+        Initialize the cache.
+        Args:
+            path (str): SQLite database file
+            ttl (float): Seconds an entry stays fresh
+            max_size (int): Maximum number of entries before the least recently used is evicted
+        """
+        super().__init__(ttl=ttl, max_size=max_size)
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed_at)")
+
+    def _connect(self):
+        """Return this thread's connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            # WAL lets readers in other processes proceed while one process writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            row = conn.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] <= now:
+                if row is not None:
+                    conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+        self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl=None):
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), expires_at, now)
+            )
+            conn.execute(
+                "DELETE FROM cache WHERE key IN ("
+                "SELECT key FROM cache ORDER BY accessed_at "
+                "LIMIT MAX(0, (SELECT COUNT(*) FROM cache) - ?))",
+                (self.max_size,)
+            )
+
+    async def aget(self, key):
+        # SQLite can wait up to 10s on another process's write lock, so keep it off the event loop
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key, value, ttl=None):
+        await asyncio.to_thread(self.set, key, value, ttl)
+
+    def clear(self):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM cache")
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def items(self):
+        rows = self._connect().execute(
+            "SELECT key, value FROM cache WHERE expires_at > ? ORDER BY accessed_at", (time.time(),)
+        ).fetchall()
+        return [(key, json.loads(value)) for key, value in rows]
+
+
+class RequestCoalescer:
+    """
+    Collapse concurrent identical upstream requests into one.
+    The first caller for a key runs the request; callers arriving while it is
+    in flight (from any thread or event loop) wait for the same result.
+    """
+
+    def __init__(self):
+        self.coalesced = 0
+        self._calls = {}
+        self._tasks = set()
+        self._lock = threading.Lock()
+
+    def _join(self, key):
+        """Return (future, is_leader) for `key`."""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = self._calls[key] = concurrent.futures.Future()
+            return future, True
+
+    def _settle(self, key, future, result=None, error=None):
+        with self._lock:
+            self._calls.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def call(self, key, fn, *args):
+        """Return `fn(*args)`, sharing the call with concurrent callers for the same key."""
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()
+        try:
+            result = fn(*args)
+        except Exception as e:
+            self._settle(key, future, error=e)
+            raise
+        except BaseException as e:
+            # KeyboardInterrupt/SystemExit belong to the leader's thread; waiters get an ordinary error
+            self._settle(key, future, error=RuntimeError(f"Shared request for {key!r} was interrupted: {e!r}"))
+            raise
+        self._settle(key, future, result)
+        return result
+
+    async def acall(self, key, coro_fn, *args):
+        """Async version of `call`; the shared request keeps running if the caller that started it is cancelled."""
+        future, leader = self._join(key)
+        if leader:
+            task = asyncio.ensure_future(coro_fn(*args))
+            self._tasks.add(task)
+
+            def done(task):
+                self._tasks.discard(task)
+                if task.cancelled():
+                    self._settle(key, future, error=asyncio.CancelledError())
+                else:
+                    self._settle(key, future, task.result() if task.exception() is None else None, task.exception())
+
+            task.add_done_callback(done)
+        # Shielded so one waiter's cancellation doesn't cancel the shared future
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+
+def create_cache(ttl=600, max_size=1024, path=None):
+    """Create a SQLite-backed cache when `path` is given, otherwise an in-memory one."""
+    if path:
+        return SQLiteCache(path, ttl=ttl, max_size=max_size)
+    return TTLCache(ttl=ttl, max_size=max_size)
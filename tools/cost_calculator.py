@@ -1,7 +1,24 @@
 from langchain.agents import tool
 from pydantic import BaseModel, Field
+from typing import List
 import random
+import numpy as np
 from langchain_core.tools import ToolException
+from .gazetteer import canonical_key, canonical_name
+from .results import CostMatrixResult, CostResult
+
+# Mock base fares per class - replace with real API
+BASE_COSTS = {
+    "Economy": 300,
+    "Business": 800,
+    "First": 1500
+}
+DEFAULT_BASE_COST = 300
+
+# Largest matrix (origins x destinations x classes) computed in one call
+MAX_MATRIX_CELLS = 10000
+
+_rng = np.random.default_rng()
 
 class CostInput(BaseModel):
     origin: str = Field(description="Origin city and country")
@@ -9,18 +26,116 @@ class CostInput(BaseModel):
     travel_class: str = Field(description="Economy, Business, First", default="Economy")
 
 @tool("travel_cost_calculator", args_schema=CostInput)
-def calculate_travel_cost(origin: str, destination: str, travel_class: str = "Economy") -> str:
+def calculate_travel_cost(origin: str, destination: str, travel_class: str = "Economy") -> CostResult:
     """Calculate approximate travel costs between locations"""
     try:
+        origin, destination = canonical_name(origin), canonical_name(destination)
         # Mock implementation - replace with real API
-        base_costs = {
-            "Economy": 300,
-            "Business": 800,
-            "First": 1500
-        }
         multiplier = random.uniform(0.8, 1.5)
-        cost = base_costs.get(travel_class, 300) * multiplier
+        cost = BASE_COSTS.get(travel_class, DEFAULT_BASE_COST) * multiplier
         
-        return f"Estimated {travel_class} class travel from {origin} to {destination}: ${cost:.2f}"
+        return CostResult(origin, destination, travel_class, round(cost, 2))
     except Exception as e:
-        raise ToolException(f"Cost calculation error: {str(e)}")
\ No newline at end of file
+        raise ToolException(f"Cost calculation error: {str(e)}")
+
+async def _acalculate_travel_cost(origin: str, destination: str, travel_class: str = "Economy") -> CostResult:
+    """Async variant of travel_cost_calculator; the mock is CPU-only so it runs inline."""
+    # A real pricing API should be called here through tools.http_client.aget_json
+    return calculate_travel_cost.func(origin, destination, travel_class)
+
+calculate_travel_cost.coroutine = _acalculate_travel_cost
+
+
+def cost_matrix(origins, destinations, travel_classes=("Economy",), rng=None):
+    """
+    Estimate the cost of every origin -> destination route in every class in one vectorized pass.
+    Args:
+        origins (list): N origin cities
+        destinations (list): M destination cities
+        travel_classes (list): K travel classes (Economy, Business, First)
+        rng (numpy.random.Generator): Random source for the mock route multipliers
+    Returns:
+        numpy.ndarray: Costs in USD with shape (N, M, K); a route costs the same multiple
+            of the base fare in every class, so classes compare consistently
+    """
+    if not origins or not destinations or not travel_classes:
+        raise ValueError("origins, destinations and travel_classes must not be empty")
+    cells = len(origins) * len(destinations) * len(travel_classes)
+    if cells > MAX_MATRIX_CELLS:
+        raise ValueError(f"Cost matrix of {cells} cells exceeds the limit of {MAX_MATRIX_CELLS}")
+
+    base = np.array([BASE_COSTS.get(travel_class, DEFAULT_BASE_COST) for travel_class in travel_classes], dtype=float)
+    multipliers = (rng or _rng).uniform(0.8, 1.5, size=(len(origins), len(destinations), 1))
+    costs = multipliers * base
+    # Staying put costs nothing ("NYC" -> "New York" included)
+    origin_keys = [canonical_key(origin) for origin in origins]
+    destination_keys = [canonical_key(destination) for destination in destinations]
+    same = np.array([[origin == destination for destination in destination_keys] for origin in origin_keys])
+    costs[same] = 0.0
+    return costs
+
+
+def summarize_cost_matrix(origins, destinations, travel_classes, costs):
+    """
+    Structured view of a cost matrix for the agent.
+    Returns:
+        CostMatrixResult: The rounded matrix, the cheapest destination per origin and class,
+            and the cheapest route per class overall
+    """
+    rounded = np.round(costs, 2)
+    # Routes to the origin itself are not real options
+    candidates = np.where(rounded > 0, rounded, np.inf)
+    cheapest_by_origin = candidates.argmin(axis=1)  # (N, K) destination indexes
+    result = CostMatrixResult(
+        currency="USD",
+        origins=list(origins),
+        destinations=list(destinations),
+        travel_classes=list(travel_classes),
+        costs=rounded.tolist(),
+        cheapest_by_origin={
+            origin: {
+                travel_class: {
+                    "destination": destinations[cheapest_by_origin[i, k]],
+                    "cost": float(rounded[i, cheapest_by_origin[i, k], k])
+                }
+                for k, travel_class in enumerate(travel_classes)
+                if np.isfinite(candidates[i, cheapest_by_origin[i, k], k])
+            }
+            for i, origin in enumerate(origins)
+        },
+        cheapest_overall={}
+    )
+    for k, travel_class in enumerate(travel_classes):
+        flat = candidates[:, :, k]
+        if np.isinf(flat).all():
+            continue
+        i, j = np.unravel_index(flat.argmin(), flat.shape)
+        result.cheapest_overall[travel_class] = {
+            "origin": origins[i],
+            "destination": destinations[j],
+            "cost": float(rounded[i, j, k])
+        }
+    return result
+
+
+class CostMatrixInput(BaseModel):
+    origins: List[str] = Field(description="Origin cities (e.g. the traveller's possible home cities)")
+    destinations: List[str] = Field(description="Destination cities to compare")
+    travel_classes: List[str] = Field(description="Any of Economy, Business, First", default=["Economy"])
+
+@tool("travel_cost_matrix", args_schema=CostMatrixInput)
+def calculate_cost_matrix(origins: List[str], destinations: List[str], travel_classes: List[str] = ["Economy"]) -> CostMatrixResult:
+    """Compare travel costs for many origin/destination pairs at once. Returns every route's cost plus the cheapest options; use it instead of repeated travel_cost_calculator calls."""
+    try:
+        origins = [canonical_name(origin) for origin in origins]
+        destinations = [canonical_name(destination) for destination in destinations]
+        costs = cost_matrix(origins, destinations, travel_classes)
+        return summarize_cost_matrix(origins, destinations, travel_classes, costs)
+    except Exception as e:
+        raise ToolException(f"Cost matrix error: {str(e)}")
+
+async def _acalculate_cost_matrix(origins: List[str], destinations: List[str], travel_classes: List[str] = ["Economy"]) -> CostMatrixResult:
+    """Async variant of travel_cost_matrix; one vectorized pass, so it runs inline."""
+    return calculate_cost_matrix.func(origins, destinations, travel_classes)
+
+calculate_cost_matrix.coroutine = _acalculate_cost_matrix
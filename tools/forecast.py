@@ -0,0 +1,201 @@
+from langchain.agents import tool
+from pydantic import BaseModel, Field
+from typing import List
+import asyncio
+import datetime
+import random
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from langchain_core.tools import ToolException
+from .cache import RequestCoalescer, create_cache
+from .gazetteer import canonical_key, resolve_place
+from .http_client import get_json, aget_json
+from .results import ForecastResult
+from .weather_tool import _has_api_key, _weather_params
+
+FORECAST_URL = "http://api.openweathermap.org/data/2.5/forecast"
+
+# OpenWeatherMap's free forecast covers five days in 3-hour steps
+FORECAST_DAYS = 5
+
+forecast_cache = create_cache(
+    ttl=Config.FORECAST_CACHE_TTL,
+    max_size=Config.WEATHER_CACHE_SIZE,
+    path=Config.WEATHER_CACHE_PATH and f"{Config.WEATHER_CACHE_PATH}.forecast"
+)
+forecast_requests = RequestCoalescer()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    """Shared pool for batch lookups and prefetches, created on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=Config.WEATHER_BATCH_CONCURRENCY, thread_name_prefix="forecast")
+    return _pool
+
+
+def _daily(entries: list) -> list:
+    """Fold 3-hourly OpenWeatherMap entries into one summary per date."""
+    days = {}
+    for entry in entries:
+        date = entry["dt_txt"][:10]
+        day = days.setdefault(date, {"min": [], "max": [], "descriptions": [], "pop": []})
+        day["min"].append(entry["main"]["temp_min"])
+        day["max"].append(entry["main"]["temp_max"])
+        day["descriptions"].append(entry["weather"][0]["description"])
+        day["pop"].append(entry.get("pop", 0))
+    return [
+        {
+            "date": date,
+            "min_temp": round(min(day["min"]), 1),
+            "max_temp": round(max(day["max"]), 1),
+            "description": Counter(day["descriptions"]).most_common(1)[0][0],
+            "precipitation_chance": round(max(day["pop"]) * 100)
+        }
+        for date, day in sorted(days.items())
+    ]
+
+
+def _mock_forecast(key: str) -> list:
+    """Stable mock forecast: the same place and date always get the same weather."""
+    conditions = ["sunny and clear", "partly cloudy", "overcast", "light rain", "heavy rain", "thunderstorms", "windy"]
+    today = datetime.date.today()
+    days = []
+    for offset in range(FORECAST_DAYS):
+        date = (today + datetime.timedelta(days=offset)).isoformat()
+        rng = random.Random(f"{key}:{date}")
+        low = rng.randint(2, 24)
+        days.append({
+            "date": date,
+            "min_temp": float(low),
+            "max_temp": float(low + rng.randint(3, 11)),
+            "description": rng.choice(conditions),
+            "precipitation_chance": rng.randint(0, 100)
+        })
+    return days
+
+
+def _fetch_forecast(city: str, key: str) -> list:
+    if not _has_api_key():
+        days = _mock_forecast(key)
+    else:
+        days = _daily(get_json(FORECAST_URL, params=_weather_params(city))["list"])
+    forecast_cache.set(key, days)
+    return days
+
+
+async def _afetch_forecast(city: str, key: str) -> list:
+    if not _has_api_key():
+        days = _mock_forecast(key)
+    else:
+        days = _daily((await aget_json(FORECAST_URL, params=_weather_params(city)))["list"])
+    await forecast_cache.aset(key, days)
+    return days
+
+
+def _select(city: str, days: list, start_date: str = "", end_date: str = "") -> dict:
+    place = resolve_place(city)
+    selected = [day for day in days if (not start_date or day["date"] >= start_date) and (not end_date or day["date"] <= end_date)]
+    return {"city": place.name if place else city, "days": selected}
+
+
+def get_forecast(city: str, start_date: str = "", end_date: str = "") -> dict:
+    """
+    Daily forecast for one city, cached and shared with concurrent identical requests.
+    Args:
+        city (str): City name (any spelling the gazetteer knows)
+        start_date (str): First date (YYYY-MM-DD) to include, default today
+        end_date (str): Last date to include, default the end of the forecast
+    Returns:
+        dict: city and a list of days with min_temp, max_temp, description, precipitation_chance
+    """
+    key = canonical_key(city)
+    days = forecast_cache.get(key)
+    if days is None:
+        days = forecast_requests.call(key, _fetch_forecast, city, key)
+    return _select(city, days, start_date, end_date)
+
+
+async def aget_forecast(city: str, start_date: str = "", end_date: str = "") -> dict:
+    """Async version of `get_forecast`."""
+    key = canonical_key(city)
+    days = await forecast_cache.aget(key)
+    if days is None:
+        days = await forecast_requests.acall(key, _afetch_forecast, city, key)
+    return _select(city, days, start_date, end_date)
+
+
+def _batch_result(cities, results) -> ForecastResult:
+    forecasts = {}
+    for city, result in zip(cities, results):
+        forecasts[city] = {"error": str(result)} if isinstance(result, Exception) else result
+    return ForecastResult(forecasts)
+
+
+def get_forecasts(cities: list, start_date: str = "", end_date: str = "") -> ForecastResult:
+    """Forecasts for many cities, fetched concurrently; a failing city reports its error instead of failing the batch."""
+    cities = list(dict.fromkeys(cities))
+    futures = [_get_pool().submit(get_forecast, city, start_date, end_date) for city in cities]
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            results.append(e)
+    return _batch_result(cities, results)
+
+
+async def aget_forecasts(cities: list, start_date: str = "", end_date: str = "") -> ForecastResult:
+    """Async version of `get_forecasts`."""
+    cities = list(dict.fromkeys(cities))
+    results = await asyncio.gather(
+        *(aget_forecast(city, start_date, end_date) for city in cities), return_exceptions=True
+    )
+    return _batch_result(cities, results)
+
+
+def prefetch_forecasts(cities: list):
+    """
+    Start fetching forecasts for `cities` in the background without waiting.
+    Used while the LLM is still planning: a later tool call finds the result
+    cached, or joins the request that is still in flight. The cache is checked
+    on the pool thread, so a caller on an event loop never waits on SQLite.
+    """
+    for city in dict.fromkeys(cities):
+        _get_pool().submit(_prefetch, city)
+
+
+def _prefetch(city: str):
+    try:
+        get_forecast(city)
+    except Exception:
+        # Speculative: the tool call will surface the error if the forecast is actually needed
+        pass
+
+
+class ForecastInput(BaseModel):
+    cities: List[str] = Field(description="Cities to get forecasts for")
+    start_date: str = Field(description="First date as YYYY-MM-DD (optional)", default="")
+    end_date: str = Field(description="Last date as YYYY-MM-DD (optional)", default="")
+
+@tool("weather_forecast", args_schema=ForecastInput)
+def get_weather_forecast(cities: List[str], start_date: str = "", end_date: str = "") -> ForecastResult:
+    """Get daily weather forecasts (next 5 days) for one or more cities in a single call. Prefer this over repeated weather_lookup calls when planning a trip."""
+    if not cities:
+        raise ToolException("Provide at least one city.")
+    return get_forecasts(cities, start_date, end_date)
+
+async def _aget_weather_forecast(cities: List[str], start_date: str = "", end_date: str = "") -> ForecastResult:
+    """Async variant of weather_forecast."""
+    if not cities:
+        raise ToolException("Provide at least one city.")
+    return await aget_forecasts(cities, start_date, end_date)
+
+get_weather_forecast.coroutine = _aget_weather_forecast
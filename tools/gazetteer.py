@@ -0,0 +1,205 @@
+"""
+Offline gazetteer: resolves free-text place names to canonical places.
+
+Names and aliases ("NYC", "New York, US", "new york", "München") are
+normalized and kept in one sorted array of keys, each pointing at the places
+it can mean, most populous first. Lookups are a binary search, so the tools
+can canonicalize every argument they receive: cache keys match across
+spellings and the weather API is queried by coordinates instead of an
+ambiguous name.
+
+The bundled tools/data/gazetteer.tsv covers major travel destinations. Set
+GAZETTEER_PATH to a larger file in the same format, or to a GeoNames dump
+(e.g. cities15000.txt), to cover more places.
+"""
+import bisect
+import os
+import re
+import threading
+import unicodedata
+from collections import namedtuple
+from functools import lru_cache
+
+from config import Config
+
+BUNDLED_PATH = os.path.join(os.path.dirname(__file__), "data", "gazetteer.tsv")
+
+Place = namedtuple("Place", "id name country lat lon population")
+
+# Country names and common abbreviations accepted as qualifiers ("Paris, France", "London UK")
+COUNTRY_ALIASES = {
+    "US": ("united states", "united states of america", "usa", "us", "america"),
+    "GB": ("united kingdom", "uk", "gb", "great britain", "britain", "england", "scotland"),
+    "CA": ("canada",), "MX": ("mexico",), "BR": ("brazil", "brasil"), "AR": ("argentina",),
+    "PE": ("peru",), "IE": ("ireland",), "FR": ("france",), "DE": ("germany", "deutschland"),
+    "NL": ("netherlands", "holland"), "BE": ("belgium",), "CH": ("switzerland",), "AT": ("austria",),
+    "CZ": ("czech republic", "czechia"), "HU": ("hungary",), "PL": ("poland",), "DK": ("denmark",),
+    "SE": ("sweden",), "NO": ("norway",), "FI": ("finland",), "IS": ("iceland",), "ES": ("spain",),
+    "PT": ("portugal",), "IT": ("italy", "italia"), "GR": ("greece",), "TR": ("turkey", "turkiye"),
+    "RU": ("russia",), "EG": ("egypt",), "MA": ("morocco",), "ZA": ("south africa",), "KE": ("kenya",),
+    "AE": ("united arab emirates", "uae"), "IL": ("israel",), "IN": ("india",), "TH": ("thailand",),
+    "SG": ("singapore",), "MY": ("malaysia",), "ID": ("indonesia",), "HK": ("hong kong",),
+    "CN": ("china",), "KR": ("south korea", "korea"), "JP": ("japan",), "AU": ("australia",),
+    "NZ": ("new zealand",)
+}
+
+
+def normalize_name(text):
+    """Lower-case, accent-free, punctuation-free form of a place name ("São Paulo" -> "sao paulo")."""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+
+def country_code(text):
+    """ISO code for a country name, abbreviation or code ("France", "uk", "US"), or None if unknown."""
+    key = normalize_name(text)
+    if len(key) == 2 and key.upper() in COUNTRY_ALIASES:
+        return key.upper()
+    for code, names in COUNTRY_ALIASES.items():
+        if key in names:
+            return code
+    return None
+
+
+class Gazetteer:
+    """Sorted-array index from normalized names and aliases to places."""
+
+    def __init__(self, places, aliases=()):
+        """
+        Build the index.
+        Args:
+            places (list): Place tuples
+            aliases (iterable): (alias, place index) pairs in addition to each place's name
+        """
+        self.places = list(places)
+        self._by_id = {place.id: index for index, place in enumerate(self.places)}
+        owners = {}
+        names = [(place.name, index) for index, place in enumerate(self.places)]
+        for name, index in list(names) + list(aliases):
+            key = normalize_name(name)
+            if key and index not in owners.setdefault(key, []):
+                owners[key].append(index)
+        self._keys = sorted(owners)
+        # Most populous first, so "Paris" means Paris, France unless qualified
+        self._owners = [
+            tuple(sorted(owners[key], key=lambda index: -self.places[index].population)) for key in self._keys
+        ]
+        self._resolve = lru_cache(maxsize=16384)(self._lookup)
+
+    @classmethod
+    def load(cls, path):
+        """Read the bundled TSV format (id, name, country, lat, lon, population, aliases) or a GeoNames dump."""
+        places, aliases = [], []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip() or line.startswith("#"):
+                    continue
+                fields = line.rstrip("\n").split("\t")
+                if len(fields) >= 15:
+                    # GeoNames: geonameid, name, asciiname, alternatenames, lat, lon, ..., country code (8), ..., population (14)
+                    place = Place(fields[0], fields[1], fields[8], float(fields[4]), float(fields[5]),
+                                  int(fields[14] or 0))
+                    names = [fields[2]] + [name for name in fields[3].split(",") if name]
+                else:
+                    place = Place(fields[0], fields[1], fields[2], float(fields[3]), float(fields[4]),
+                                  int(fields[5] or 0))
+                    names = [name for name in (fields[6] if len(fields) > 6 else "").split(",") if name]
+                aliases.extend((name, len(places)) for name in names)
+                places.append(place)
+        return cls(places, aliases)
+
+    def get(self, place_id):
+        """Place with canonical id `place_id`, or None."""
+        index = self._by_id.get(place_id)
+        return None if index is None else self.places[index]
+
+    def candidates(self, name):
+        """All places `name` can refer to, most populous first."""
+        key = normalize_name(name)
+        position = bisect.bisect_left(self._keys, key)
+        if position < len(self._keys) and self._keys[position] == key:
+            return [self.places[index] for index in self._owners[position]]
+        return []
+
+    def complete(self, prefix, limit=10):
+        """Places whose name or alias starts with `prefix`, for autocompletion."""
+        key = normalize_name(prefix)
+        start = bisect.bisect_left(self._keys, key)
+        end = bisect.bisect_left(self._keys, key + "\uffff")
+        seen, results = set(), []
+        for owners in self._owners[start:end]:
+            for index in owners:
+                if index not in seen:
+                    seen.add(index)
+                    results.append(self.places[index])
+        results.sort(key=lambda place: -place.population)
+        return results[:limit]
+
+    def resolve(self, text, country=""):
+        """
+        Canonical place for free text such as "NYC", "Paris, France" or "London UK".
+        Args:
+            text (str): Place name, optionally followed by a country after a comma or space
+            country (str): Optional country name or ISO code
+        Returns:
+            Place: The match (the most populous one if ambiguous), or None (also when the country is unknown)
+        """
+        return self._resolve(text, country)
+
+    def _lookup(self, text, country):
+        whole = self.candidates(text)
+        if whole and not country:
+            # The full text is itself a name or alias ("Paris, Texas", "Washington, D.C.")
+            return whole[0]
+        name, _, qualifier = text.partition(",")
+        qualified = (country or qualifier).strip()
+        code = country_code(qualified) if qualified else None
+        if qualified and not code:
+            # "Paris, TX": an unknown qualifier may name a place we don't have; don't guess Paris, France
+            return None
+        matches = self.candidates(name)
+        if not matches and not qualifier:
+            # "London UK", "Paris France": a trailing country name without a comma
+            words = normalize_name(name).split()
+            for split in range(len(words) - 1, 0, -1):
+                trailing = country_code(" ".join(words[split:]))
+                if trailing:
+                    matches, code = self.candidates(" ".join(words[:split])), code or trailing
+                    break
+        if code:
+            matches = [place for place in matches if place.country == code]
+        return matches[0] if matches else None
+
+
+_gazetteer = None
+_gazetteer_lock = threading.Lock()
+
+
+def get_gazetteer():
+    """The gazetteer from Config.GAZETTEER_PATH (or the bundled file), loaded on first use."""
+    global _gazetteer
+    if _gazetteer is None:
+        with _gazetteer_lock:
+            if _gazetteer is None:
+                _gazetteer = Gazetteer.load(Config.GAZETTEER_PATH or BUNDLED_PATH)
+    return _gazetteer
+
+
+def resolve_place(text, country=""):
+    """Canonical Place for a free-text name, or None if it isn't in the gazetteer."""
+    return get_gazetteer().resolve(text, country)
+
+
+def canonical_key(text, country=""):
+    """Stable key for a place name: its canonical id if known, else the normalized text."""
+    place = resolve_place(text, country)
+    if place is not None:
+        return place.id
+    return "|".join(part for part in (normalize_name(text), normalize_name(country)) if part)
+
+
+def canonical_name(text, country=""):
+    """Display name of the canonical place, or `text` unchanged if it isn't known."""
+    place = resolve_place(text, country)
+    return place.name if place is not None else text
@@ -0,0 +1,105 @@
+import asyncio
+import random
+import threading
+import weakref
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import Config
+
+# Upstream responses worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_session = None
+_session_lock = threading.Lock()
+# One async client per event loop: httpx connections cannot be shared across loops
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_session() -> requests.Session:
+    """Return the process-wide pooled requests session, creating it on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                retry = Retry(
+                    total=Config.HTTP_MAX_RETRIES,
+                    backoff_factor=Config.HTTP_BACKOFF_FACTOR,
+                    status_forcelist=RETRY_STATUSES,
+                    allowed_methods=("GET",),
+                    respect_retry_after_header=True
+                )
+                adapter = HTTPAdapter(
+                    pool_connections=Config.HTTP_POOL_SIZE,
+                    pool_maxsize=Config.HTTP_POOL_SIZE,
+                    max_retries=retry
+                )
+                session = requests.Session()
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+
+def get_json(url: str, params: dict = None, timeout: float = None) -> dict:
+    """GET `url` through the pooled session and return the decoded JSON body."""
+    response = get_session().get(url, params=params, timeout=timeout or Config.HTTP_TIMEOUT)
+    response.raise_for_status()
+    return response.json()
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Return the pooled async client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=Config.HTTP_POOL_SIZE,
+                max_keepalive_connections=Config.HTTP_POOL_SIZE
+            ),
+            timeout=Config.HTTP_TIMEOUT
+        )
+        _async_clients[loop] = client
+    return client
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, Config.HTTP_BACKOFF_FACTOR * (2 ** attempt))
+
+
+async def aget_json(url: str, params: dict = None, timeout: float = None) -> dict:
+    """GET `url` through the pooled async client, retrying transient failures with backoff."""
+    client = get_async_client()
+    for attempt in range(Config.HTTP_MAX_RETRIES + 1):
+        last_attempt = attempt == Config.HTTP_MAX_RETRIES
+        try:
+            response = await client.get(url, params=params, timeout=timeout or Config.HTTP_TIMEOUT)
+        except httpx.TransportError:
+            if last_attempt:
+                raise
+        else:
+            if response.status_code not in RETRY_STATUSES or last_attempt:
+                response.raise_for_status()
+                return response.json()
+        await asyncio.sleep(_backoff_delay(attempt))
+
+
+def close():
+    """Close the pooled requests session."""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+async def aclose():
+    """Close the async client bound to the running event loop."""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
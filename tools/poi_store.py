@@ -0,0 +1,391 @@
+"""
+Columnar, memory-mapped store of points of interest (attractions, restaurants, hotels).
+
+A store is a directory of NumPy arrays written once by `build_poi_store`:
+records are sorted by (city, category, rating descending), so the best k
+places of a city and category are the first k rows of a precomputed range,
+and a geo-cell index maps grid cells to row ranges for "near me" lookups.
+Opening a store only maps the files; rows are read (and names decoded)
+when a query touches them.
+
+A city is a (name, country) pair, so namesakes such as Paris, France and
+Paris, Texas keep separate rows; record cities are canonicalized through the
+gazetteer, and an optional country column (or "City, Country") tells them apart.
+
+Build one from a CSV with columns name,city,category,lat,lon,rating[,country]:
+    python -m tools.poi_store build pois.csv data/poi
+or a synthetic dataset for testing:
+    python -m tools.poi_store build --synthetic 300000 data/poi
+"""
+import bisect
+import csv
+import difflib
+import json
+import os
+import threading
+from functools import lru_cache
+
+import numpy as np
+
+from config import Config
+from .gazetteer import country_code, normalize_name, resolve_place
+
+CATEGORIES = ("attractions", "restaurants", "hotels")
+
+# Grid cell edge in degrees for the geo index (about 11 km of latitude)
+DEFAULT_CELL_SIZE = 0.1
+
+FORMAT_VERSION = 1
+
+COLUMNS = ("lat", "lon", "rating", "city", "category", "cell", "name_offsets", "group_offsets",
+           "cell_keys", "cell_starts", "cell_rows")
+
+
+def normalize_city(text):
+    """Lower-case, accent-free city name without country suffix ("New York, US" -> "new york")."""
+    return normalize_name(text.split(",")[0])
+
+
+def _record_city(city, country=""):
+    """(display name, country code) of a record's city; the code is "" when the country isn't known."""
+    place = resolve_place(city, country)
+    if place is not None:
+        return place.name, place.country
+    name, _, qualifier = city.partition(",")
+    qualifier = country or qualifier
+    code = country_code(qualifier) if qualifier.strip() else None
+    return " ".join(name.split()), code or ""
+
+
+def match_category(text):
+    """Index into CATEGORIES for a category name, accepting singulars and prefixes ("Hotel", "rest")."""
+    key = text.strip().lower()
+    if not key:
+        return None
+    for index, category in enumerate(CATEGORIES):
+        if category.startswith(key) or key.startswith(category.rstrip("s")):
+            return index
+    return None
+
+
+def _cell_ids(lat, lon, cell_size):
+    """Grid cell of each coordinate as one integer (row-major over latitude bands)."""
+    columns = int(np.ceil(360 / cell_size))
+    rows = np.floor((np.asarray(lat, dtype=np.float64) + 90) / cell_size).astype(np.int64)
+    cols = np.floor((np.asarray(lon, dtype=np.float64) + 180) / cell_size).astype(np.int64) % columns
+    return rows * columns + cols
+
+
+def _haversine_km(lat, lon, lat0, lon0):
+    lat, lon = np.radians(lat), np.radians(lon)
+    lat0, lon0 = np.radians(lat0), np.radians(lon0)
+    a = np.sin((lat - lat0) / 2) ** 2 + np.cos(lat) * np.cos(lat0) * np.sin((lon - lon0) / 2) ** 2
+    return 6371.0 * 2 * np.arcsin(np.sqrt(a))
+
+
+def build_poi_store(records, path, cell_size=DEFAULT_CELL_SIZE):
+    """
+    Write a POI store.
+    Args:
+        records (iterable): dicts (or tuples in this order) with name, city, category, lat, lon, rating
+            and optionally country
+        path (str): Directory to write (created if missing)
+        cell_size (float): Geo index cell edge in degrees
+    Returns:
+        int: Number of records written (rows with an unknown category are skipped)
+    """
+    names, cities, categories, lats, lons, ratings = [], [], [], [], [], []
+    city_ids, city_names, city_countries = {}, [], []
+    # Raw (city, country) text -> city id; most records repeat a handful of spellings
+    seen = {}
+    for record in records:
+        if not isinstance(record, dict):
+            record = dict(zip(("name", "city", "category", "lat", "lon", "rating", "country"), record))
+        category = match_category(str(record["category"]))
+        if category is None:
+            continue
+        raw = (str(record["city"]), str(record.get("country") or ""))
+        if raw not in seen:
+            display, country = _record_city(*raw)
+            key = (normalize_city(display), country)
+            if key not in city_ids:
+                city_ids[key] = len(city_names)
+                city_names.append(display)
+                city_countries.append(country)
+            seen[raw] = city_ids[key]
+        names.append(str(record["name"]))
+        cities.append(seen[raw])
+        categories.append(category)
+        lats.append(float(record["lat"]))
+        lons.append(float(record["lon"]))
+        ratings.append(float(record.get("rating") or 0))
+
+    city = np.array(cities, dtype=np.int32)
+    category = np.array(categories, dtype=np.uint8)
+    rating = np.array(ratings, dtype=np.float32)
+    # Primary key city, then category, then best rating first
+    order = np.lexsort((-rating, category, city))
+    city, category, rating = city[order], category[order], rating[order]
+    lat = np.array(lats, dtype=np.float32)[order]
+    lon = np.array(lons, dtype=np.float32)[order]
+    encoded = [names[i].encode("utf-8") for i in order]
+
+    # group_offsets[c, k] .. group_offsets[c, k + 1] are the rows of city c, category k
+    group = city.astype(np.int64) * len(CATEGORIES) + category
+    boundaries = np.arange(len(city_names) * len(CATEGORIES) + 1)
+    group_offsets = np.searchsorted(group, boundaries).astype(np.int64)
+
+    cell = _cell_ids(lat, lon, cell_size)
+    cell_rows = np.argsort(cell, kind="stable").astype(np.int64)
+    cell_keys, cell_starts = np.unique(cell[cell_rows], return_index=True)
+    cell_starts = np.append(cell_starts, len(cell_rows)).astype(np.int64)
+
+    name_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    name_offsets[1:] = np.cumsum([len(name) for name in encoded])
+
+    os.makedirs(path, exist_ok=True)
+    arrays = {
+        "lat": lat, "lon": lon, "rating": rating, "city": city, "category": category, "cell": cell,
+        "name_offsets": name_offsets, "group_offsets": group_offsets,
+        "cell_keys": cell_keys, "cell_starts": cell_starts, "cell_rows": cell_rows
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(path, f"{name}.npy"), array)
+    with open(os.path.join(path, "names.bin"), "wb") as f:
+        f.write(b"".join(encoded))
+    with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "version": FORMAT_VERSION,
+            "count": len(encoded),
+            "categories": list(CATEGORIES),
+            "cell_size": cell_size,
+            "cities": city_names,
+            "countries": city_countries
+        }, f)
+    return len(encoded)
+
+
+def synthetic_records(count, cities=None, seed=0):
+    """Random but plausible POIs around a handful of real city centres, for tests and benchmarks."""
+    centres = cities or {
+        "Paris": (48.857, 2.352), "London": (51.507, -0.128), "Tokyo": (35.690, 139.692),
+        "New York": (40.713, -74.006), "Rome": (41.903, 12.496), "Berlin": (52.520, 13.405),
+        "Barcelona": (41.385, 2.173), "Lisbon": (38.722, -9.139), "Sydney": (-33.869, 151.209),
+        "Bangkok": (13.756, 100.502)
+    }
+    kinds = {
+        "attractions": ("Museum", "Gardens", "Cathedral", "Market", "Tower", "Park", "Gallery"),
+        "restaurants": ("Bistro", "Grill", "Cafe", "Trattoria", "Kitchen", "Noodle Bar", "Brasserie"),
+        "hotels": ("Hotel", "Inn", "Suites", "Hostel", "Residence", "Lodge", "Palace")
+    }
+    rng = np.random.default_rng(seed)
+    names = list(centres)
+    for i in range(count):
+        city = names[i % len(names)]
+        lat0, lon0 = centres[city]
+        category = CATEGORIES[int(rng.integers(len(CATEGORIES)))]
+        kind = kinds[category][int(rng.integers(len(kinds[category])))]
+        yield {
+            "name": f"{city} {kind} {i}",
+            "city": city,
+            "category": category,
+            "lat": lat0 + rng.normal(0, 0.05),
+            "lon": lon0 + rng.normal(0, 0.05),
+            "rating": round(float(rng.uniform(2.5, 5.0)), 1)
+        }
+
+
+class POIStore:
+    """Read-only view of a store written by `build_poi_store`."""
+
+    def __init__(self, path):
+        """
+        Open a store. Only metadata is read; columns are memory-mapped.
+        Args:
+            path (str): Directory written by `build_poi_store`
+        """
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported POI store version: {meta.get('version')}")
+        self.path = path
+        self.count = meta["count"]
+        self.cell_size = meta["cell_size"]
+        self.cities = meta["cities"]
+        # Stores written before countries were recorded treat every city's country as unknown
+        self.countries = meta.get("countries") or [""] * len(self.cities)
+        # Plain ndarray views of the maps: slicing np.memmap objects costs microseconds per call
+        for name in COLUMNS:
+            setattr(self, f"_{name}", np.asarray(np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")))
+        self._names = np.asarray(np.memmap(os.path.join(path, "names.bin"), dtype=np.uint8, mode="r")) if self.count else b""
+        # Sorted normalized names for exact and prefix lookups
+        keyed = sorted((normalize_city(name), index) for index, name in enumerate(self.cities))
+        self._city_keys = [key for key, _ in keyed]
+        self._city_ids = [index for _, index in keyed]
+        self._distinct_keys = sorted(set(self._city_keys))
+        self._match_city = lru_cache(maxsize=4096)(self._resolve_city)
+
+    def match_city(self, text):
+        """
+        City id for `text`: the gazetteer's canonical place ("NYC" -> New York, US; "Paris, Texas" ->
+        Paris, US) if the store has it, else an exact match, else the shortest prefix match, else the
+        closest spelling. A known country never matches a namesake in another country, and an unknown
+        country qualifier matches nothing.
+        """
+        place = resolve_place(text)
+        if place is not None:
+            city = self._match_city(normalize_city(place.name), place.country)
+            if city is not None:
+                return city
+            return self._match_city(normalize_city(text), place.country)
+        name, _, qualifier = text.partition(",")
+        if not qualifier.strip():
+            return self._match_city(normalize_city(text), None)
+        country = country_code(qualifier)
+        return self._match_city(normalize_city(name), country) if country else None
+
+    def _resolve_city(self, key, country):
+        if not key:
+            return None
+
+        def allowed(city):
+            # Cities stored without a country may be any namesake
+            return country is None or self.countries[city] in (country, "")
+
+        start = bisect.bisect_left(self._city_keys, key)
+        end = bisect.bisect_right(self._city_keys, key)
+        exact = [city for city in self._city_ids[start:end] if allowed(city)]
+        if exact:
+            # Prefer the stored country over an unknown one
+            return min(exact, key=lambda city: self.countries[city] != country)
+        prefixed = [city for city in self.cities_with_prefix(key, limit=None) if allowed(city)]
+        if prefixed:
+            return min(prefixed, key=lambda city: len(self.cities[city]))
+        for close in difflib.get_close_matches(key, self._distinct_keys, n=3, cutoff=0.8):
+            start = bisect.bisect_left(self._city_keys, close)
+            end = bisect.bisect_right(self._city_keys, close)
+            matches = [city for city in self._city_ids[start:end] if allowed(city)]
+            if matches:
+                return matches[0]
+        return None
+
+    def cities_with_prefix(self, prefix, limit=10):
+        """Ids of cities whose normalized name starts with `prefix`."""
+        key = normalize_city(prefix)
+        start = bisect.bisect_left(self._city_keys, key)
+        end = bisect.bisect_left(self._city_keys, key + "\uffff")
+        ids = self._city_ids[start:end]
+        return ids if limit is None else ids[:limit]
+
+    def top(self, city, category, k=5):
+        """
+        Best rated places of a city and category.
+        Args:
+            city (str | int): City name (matched fuzzily) or id
+            category (str | int): Category name or index into CATEGORIES
+            k (int): Number of results
+        Returns:
+            list: dicts with name, city, category, rating, lat, lon (empty if nothing matches)
+        """
+        city_id = city if isinstance(city, (int, np.integer)) else self.match_city(city)
+        category_id = category if isinstance(category, (int, np.integer)) else match_category(category)
+        if city_id is None or category_id is None:
+            return []
+        group = city_id * len(CATEGORIES) + category_id
+        start, end = int(self._group_offsets[group]), int(self._group_offsets[group + 1])
+        return self._rows(slice(start, min(end, start + k)))
+
+    def near(self, lat, lon, radius_km=2.0, category=None, k=5):
+        """Best rated places within `radius_km` of a point, optionally of one category."""
+        category_id = None if category is None else match_category(category)
+        if category is not None and category_id is None:
+            return []
+        lat_span = radius_km / 111.0
+        lon_span = radius_km / (111.0 * max(np.cos(np.radians(lat)), 0.01))
+        rows = []
+        columns = int(np.ceil(360 / self.cell_size))
+        first, last = _cell_ids([lat - lat_span, lat + lat_span], [lon - lon_span, lon + lon_span], self.cell_size)
+        for band in range(int(first // columns), int(last // columns) + 1):
+            # One contiguous range of cell ids per latitude band (the wrap at 180° is ignored)
+            low = band * columns + int(first % columns)
+            high = band * columns + int(last % columns)
+            start = np.searchsorted(self._cell_keys, low)
+            end = np.searchsorted(self._cell_keys, high, side="right")
+            if end > start:
+                rows.append(self._cell_rows[self._cell_starts[start]:self._cell_starts[end]])
+        if not rows:
+            return []
+        rows = np.concatenate(rows)
+        if category_id is not None:
+            rows = rows[self._category[rows] == category_id]
+        distance = _haversine_km(self._lat[rows], self._lon[rows], lat, lon)
+        rows = rows[distance <= radius_km]
+        if len(rows) > k:
+            rows = rows[np.argpartition(-self._rating[rows], k - 1)[:k]]
+        rows = rows[np.argsort(-self._rating[rows], kind="stable")]
+        return self._rows(rows)
+
+    def _rows(self, rows):
+        """Materialize rows (a slice or index array), reading each column once."""
+        lat, lon = self._lat[rows].tolist(), self._lon[rows].tolist()
+        rating, city, category = self._rating[rows].tolist(), self._city[rows].tolist(), self._category[rows].tolist()
+        if isinstance(rows, slice):
+            offsets = self._name_offsets[rows.start:rows.stop + 1].tolist()
+            bounds = zip(offsets, offsets[1:])
+        else:
+            bounds = zip(self._name_offsets[rows].tolist(), self._name_offsets[rows + 1].tolist())
+        return [
+            {
+                "name": bytes(self._names[start:end]).decode("utf-8"),
+                "city": self.cities[city[i]],
+                "category": CATEGORIES[category[i]],
+                "rating": round(rating[i], 1),
+                "lat": lat[i],
+                "lon": lon[i]
+            }
+            for i, (start, end) in enumerate(bounds)
+        ]
+
+    def __len__(self):
+        return self.count
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_poi_store():
+    """The store at Config.POI_STORE_PATH, opened on first use; None if there is no store there."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None and Config.POI_STORE_PATH and os.path.exists(
+                    os.path.join(Config.POI_STORE_PATH, "meta.json")):
+                _store = POIStore(Config.POI_STORE_PATH)
+    return _store
+
+
+def _read_csv(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        yield from csv.DictReader(f)
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Build a POI store")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Write a store from a CSV (name,city,category,lat,lon,rating)")
+    build.add_argument("source", nargs="?", help="CSV file")
+    build.add_argument("path", help="Output directory")
+    build.add_argument("--synthetic", type=int, metavar="N", help="Generate N synthetic records instead of reading a CSV")
+    build.add_argument("--cell-size", type=float, default=DEFAULT_CELL_SIZE)
+    args = parser.parse_args()
+
+    if args.synthetic is None and not args.source:
+        parser.error("a CSV source or --synthetic N is required")
+    started = time.perf_counter()
+    records = synthetic_records(args.synthetic) if args.synthetic is not None else _read_csv(args.source)
+    count = build_poi_store(records, args.path, cell_size=args.cell_size)
+    print(f"Wrote {count} places to {args.path} in {time.perf_counter() - started:.1f}s")
@@ -2,24 +2,50 @@ from langchain.agents import tool
 from pydantic import BaseModel, Field
 from typing import List
 from langchain_core.tools import ToolException
+from .gazetteer import resolve_place
+from .poi_store import CATEGORIES, get_poi_store, match_category
+from .results import RecommendationResult
+
+# Built-in sample lists, used when no POI store has been built
+SAMPLE_RECOMMENDATIONS = {
+    "attractions": ["City Museum", "Historic District", "Botanical Gardens"],
+    "restaurants": ["Local Cuisine Bistro", "Seafood Grill", "Rooftop Cafe"],
+    "hotels": ["Grand Plaza Hotel", "Riverside Inn", "City Center Suites"]
+}
 
 class RecommendationInput(BaseModel):
     location: str = Field(description="City and country for recommendations")
     category: str = Field(description="Type: attractions, restaurants, or hotels")
+    limit: int = Field(description="Number of places to return", default=5)
 
 @tool("destination_recommendations", args_schema=RecommendationInput)
-def get_recommendations(location: str, category: str) -> str:
+def get_recommendations(location: str, category: str, limit: int = 5) -> RecommendationResult:
     """Get recommendations for attractions, restaurants, or hotels"""
     try:
-        # Mock implementation
-        recommendations = {
-            "attractions": ["City Museum", "Historic District", "Botanical Gardens"],
-            "restaurants": ["Local Cuisine Bistro", "Seafood Grill", "Rooftop Cafe"],
-            "hotels": ["Grand Plaza Hotel", "Riverside Inn", "City Center Suites"]
-        }
-        
-        return f"Top {category} in {location}:\n" + "\n".join(
-            f"- {item}" for item in recommendations.get(category.lower(), [])
+        # "paris, fr", "NYC": report the canonical name, and keep its country so the store tells namesakes apart
+        place = resolve_place(location)
+        if place is not None:
+            location, query = place.name, f"{place.name}, {place.country}"
+        else:
+            query = location
+
+        store = get_poi_store()
+        if store is None:
+            # Mock implementation
+            category_id = match_category(category)
+            items = SAMPLE_RECOMMENDATIONS[CATEGORIES[category_id]] if category_id is not None else []
+            return RecommendationResult(location, category, [(item, None) for item in items[:limit]])
+
+        places = store.top(query, category, k=max(1, min(limit, 20)))
+        return RecommendationResult(
+            places[0]["city"] if places else location, category,
+            [(place["name"], place["rating"]) for place in places]
         )
     except Exception as e:
-        raise ToolException(f"Recommendation error: {str(e)}")
\ No newline at end of file
+        raise ToolException(f"Recommendation error: {str(e)}")
+
+async def _aget_recommendations(location: str, category: str, limit: int = 5) -> RecommendationResult:
+    """Async variant of destination_recommendations; store lookups take microseconds so they run inline."""
+    return get_recommendations.func(location, category, limit)
+
+get_recommendations.coroutine = _aget_recommendations
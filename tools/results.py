@@ -0,0 +1,170 @@
+"""
+Structured tool results.
+
+Every tool returns one of these small `__slots__` objects instead of prose or
+JSON. `str(result)` is the compact form the agent sees in its scratchpad
+("Paris: light rain, 14C, humidity 81%"): it is re-sent with every later LLM
+call of the run, so it keeps only values and the few words that label them. `describe()` gives the friendly sentence for people (the
+fast path answers with it), and `to_dict`/`from_dict` round-trip a result
+through JSON.
+"""
+
+_KINDS = {}
+
+
+def _format(value):
+    if isinstance(value, float):
+        return f"{value:.2f}".rstrip("0").rstrip(".")
+    if isinstance(value, (list, tuple)):
+        return ", ".join(_format(item) for item in value)
+    return str(value)
+
+
+class ToolResult:
+    """Base class: subclasses set `kind`, list their fields in `__slots__` and usually write a tighter `compact`."""
+
+    __slots__ = ()
+    kind = ""
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        _KINDS[cls.kind] = cls
+
+    def __init__(self, *args, **kwargs):
+        for name, value in zip(self.__slots__, args):
+            setattr(self, name, value)
+        for name in self.__slots__[len(args):]:
+            setattr(self, name, kwargs.pop(name))
+        if kwargs:
+            raise TypeError(f"Unexpected fields for {type(self).__name__}: {', '.join(kwargs)}")
+
+    def compact(self) -> str:
+        """Minimal key=value form for the model; empty fields are left out."""
+        return "; ".join(
+            f"{name}={_format(getattr(self, name))}" for name in self.__slots__
+            if getattr(self, name) not in (None, "", [], {})
+        )
+
+    def describe(self) -> str:
+        """Friendly text for people; defaults to the compact form."""
+        return self.compact()
+
+    def to_dict(self) -> dict:
+        return {"kind": self.kind, **{name: getattr(self, name) for name in self.__slots__}}
+
+    def __str__(self):
+        return self.compact()
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__)})"
+
+    def __eq__(self, other):
+        return type(other) is type(self) and self.to_dict() == other.to_dict()
+
+
+def from_dict(data: dict) -> ToolResult:
+    """Rebuild a result from `ToolResult.to_dict` output."""
+    fields = dict(data)
+    return _KINDS[fields.pop("kind")](**fields)
+
+
+class WeatherResult(ToolResult):
+    __slots__ = ("city", "description", "temp_c", "humidity_pct")
+    kind = "weather"
+
+    def compact(self):
+        return f"{self.city}: {self.description}, {_format(self.temp_c)}C, humidity {self.humidity_pct}%"
+
+    def describe(self):
+        return f"Current weather in {self.city}: {self.description}, {_format(self.temp_c)}°C, {self.humidity_pct}% humidity"
+
+
+class CostResult(ToolResult):
+    __slots__ = ("origin", "destination", "travel_class", "usd")
+    kind = "travel_cost"
+
+    def compact(self):
+        return f"{self.origin}->{self.destination} {self.travel_class}: {_format(self.usd)} USD"
+
+    def describe(self):
+        return f"Estimated {self.travel_class} class travel from {self.origin} to {self.destination}: ${self.usd:.2f}"
+
+
+class RecommendationResult(ToolResult):
+    """`places` are (name, rating) pairs; rating is None for the built-in samples."""
+
+    __slots__ = ("location", "category", "places")
+    kind = "recommendations"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.places = [tuple(place) for place in self.places]
+
+    def compact(self):
+        places = "; ".join(name if rating is None else f"{name} {rating}" for name, rating in self.places)
+        return f"{self.category} in {self.location}: {places or 'none found'}"
+
+    def describe(self):
+        if not self.places:
+            return f"No {self.category} found for {self.location}."
+        return f"Top {self.category} in {self.location}:\n" + "\n".join(
+            f"- {name}" if rating is None else f"- {name} ({rating}★)" for name, rating in self.places
+        )
+
+
+class ForecastResult(ToolResult):
+    """`forecasts` maps each requested city to {"city", "days"} or {"error"}."""
+
+    __slots__ = ("forecasts",)
+    kind = "forecast"
+
+    def compact(self):
+        cities = []
+        for city, forecast in self.forecasts.items():
+            if "error" in forecast:
+                cities.append(f"{city}: error {forecast['error']}")
+                continue
+            days = "; ".join(
+                f"{day['date']} {day['description']} {_format(day['min_temp'])}-{_format(day['max_temp'])}C "
+                f"rain {day['precipitation_chance']}%"
+                for day in forecast["days"]
+            )
+            cities.append(f"{forecast['city']}: {days or 'no days in range'}")
+        return " | ".join(cities)
+
+    def describe(self):
+        lines = []
+        for forecast in self.forecasts.values():
+            if "error" in forecast:
+                lines.append(forecast["error"])
+                continue
+            lines.append(f"Forecast for {forecast['city']}:")
+            lines.extend(
+                f"- {day['date']}: {day['description']}, {day['min_temp']:.0f}–{day['max_temp']:.0f}°C, "
+                f"{day['precipitation_chance']}% chance of rain"
+                for day in forecast["days"]
+            )
+        return "\n".join(lines)
+
+
+class CostMatrixResult(ToolResult):
+    """Output of `summarize_cost_matrix`; `costs[i][j][k]` is origin i -> destination j in class k."""
+
+    __slots__ = ("currency", "origins", "destinations", "travel_classes", "costs", "cheapest_by_origin", "cheapest_overall")
+    kind = "cost_matrix"
+
+    def compact(self):
+        parts = []
+        for k, travel_class in enumerate(self.travel_classes):
+            routes = ", ".join(
+                f"{origin}->{destination} {_format(self.costs[i][j][k])}"
+                for i, origin in enumerate(self.origins)
+                for j, destination in enumerate(self.destinations)
+                if self.costs[i][j][k] > 0
+            )
+            part = f"{travel_class} {self.currency}: {routes or 'no routes'}"
+            cheapest = self.cheapest_overall.get(travel_class)
+            if cheapest:
+                part += f"; cheapest {cheapest['origin']}->{cheapest['destination']} {_format(cheapest['cost'])}"
+            parts.append(part)
+        return " | ".join(parts)
@@ -2,57 +2,127 @@ from langchain.agents import tool
 from pydantic import BaseModel, Field
 import random
 from typing import Optional
-import requests
 from config import Config
 from langchain_core.tools import ToolException
+from .cache import RequestCoalescer, create_cache
+from .gazetteer import canonical_key, resolve_place
+from .http_client import get_json, aget_json
+from .results import WeatherResult
+
+WEATHER_URL = "http://api.openweathermap.org/data/2.5/weather"
+
+# Shared by all agents in the process (and across processes with WEATHER_CACHE_PATH)
+weather_cache = create_cache(
+    ttl=Config.WEATHER_CACHE_TTL,
+    max_size=Config.WEATHER_CACHE_SIZE,
+    path=Config.WEATHER_CACHE_PATH
+)
+# Identical lookups in flight at once (e.g. a prefetch and the agent's tool call) share one request
+weather_requests = RequestCoalescer()
 
 class WeatherInput(BaseModel):
     city: str = Field(description="The city name to get weather for")
     country: str = Field(description="The country code (optional)", default="")
 
 @tool("weather_lookup", args_schema=WeatherInput)
-def get_weather(city: str, country: str = "") -> str:
+def get_weather(city: str, country: str = "") -> WeatherResult:
     """Get current weather information for a specific city."""
     try:
         # If you have a real weather API key, use this:
-        if Config.WEATHER_API_KEY and Config.WEATHER_API_KEY != "your_weather_api_key_here":
+        if _has_api_key():
             return get_real_weather(city, country)
-        
-        # Mock weather API call for demo
-        weather_conditions = [
-            "sunny and clear", "partly cloudy", "overcast", 
-            "light rain", "heavy rain", "thunderstorms",
-            "snow", "foggy", "windy"
-        ]
-        temp = random.randint(5, 35)
-        condition = random.choice(weather_conditions)
-        humidity = random.randint(30, 90)
-        
-        return f"Weather in {city}: {condition}, {temp}°C, {humidity}% humidity. Perfect for exploring the city!"
+
+        return _mock_weather(city)
+    except Exception as e:
+        raise ToolException(f"Unable to fetch weather for {city}. Error: {str(e)}. Please try again later.")
+
+async def _aget_weather(city: str, country: str = "") -> WeatherResult:
+    """Async variant of weather_lookup used by the agent's async path."""
+    try:
+        if _has_api_key():
+            return await aget_real_weather(city, country)
+
+        return _mock_weather(city)
     except Exception as e:
         raise ToolException(f"Unable to fetch weather for {city}. Error: {str(e)}. Please try again later.")
 
-def get_real_weather(city: str, country: str = "") -> str:
+get_weather.coroutine = _aget_weather
+
+def _has_api_key() -> bool:
+    return bool(Config.WEATHER_API_KEY) and Config.WEATHER_API_KEY != "your_weather_api_key_here"
+
+def _mock_weather(city: str) -> WeatherResult:
+    """Mock weather API call for demo."""
+    weather_conditions = [
+        "sunny and clear", "partly cloudy", "overcast",
+        "light rain", "heavy rain", "thunderstorms",
+        "snow", "foggy", "windy"
+    ]
+    temp = random.randint(5, 35)
+    condition = random.choice(weather_conditions)
+    humidity = random.randint(30, 90)
+
+    return WeatherResult(_display_name(city), condition, temp, humidity)
+
+def _cache_key(city: str, country: str = "") -> str:
+    """Canonical place id (or normalized text) so "NYC" and "New York, US" share a cache entry."""
+    return canonical_key(city, country)
+
+def _weather_params(city: str, country: str = "") -> dict:
+    """Query by coordinates when the gazetteer knows the place, so ambiguous names can't fail or mismatch."""
+    params = {"appid": Config.WEATHER_API_KEY, "units": "metric"}
+    place = resolve_place(city, country)
+    if place is not None:
+        params.update(lat=place.lat, lon=place.lon)
+    else:
+        params["q"] = f"{city},{country}" if country else city
+    return params
+
+def _display_name(city: str, country: str = "") -> str:
+    place = resolve_place(city, country)
+    return place.name if place is not None else city
+
+def _parse_weather(data: dict) -> dict:
+    """Extract the fields the tool reports from an OpenWeatherMap response."""
+    return {
+        "description": data["weather"][0]["description"],
+        "temp": data["main"]["temp"],
+        "humidity": data["main"]["humidity"]
+    }
+
+def _format_weather(city: str, weather: dict) -> WeatherResult:
+    return WeatherResult(city, weather["description"], weather["temp"], weather["humidity"])
+
+def _fetch_weather(city: str, country: str = "") -> dict:
+    weather = _parse_weather(get_json(WEATHER_URL, params=_weather_params(city, country)))
+    weather_cache.set(_cache_key(city, country), weather)
+    return weather
+
+async def _afetch_weather(city: str, country: str = "") -> dict:
+    weather = _parse_weather(await aget_json(WEATHER_URL, params=_weather_params(city, country)))
+    await weather_cache.aset(_cache_key(city, country), weather)
+    return weather
+
+def get_real_weather(city: str, country: str = "") -> WeatherResult:
     """Get real weather data from OpenWeatherMap API."""
     try:
-        base_url = "http://api.openweathermap.org/data/2.5/weather"
-        location = f"{city},{country}" if country else city
-        
-        params = {
-            "q": location,
-            "appid": Config.WEATHER_API_KEY,
-            "units": "metric"
-        }
-        
-        response = requests.get(base_url, params=params, timeout=10)
-        response.raise_for_status()
-        
-        data = response.json()
-        
-        weather = data["weather"][0]["description"]
-        temp = data["main"]["temp"]
-        humidity = data["main"]["humidity"]
-        
-        return f"Current weather in {city}: {weather}, {temp}°C, {humidity}% humidity"
+        key = _cache_key(city, country)
+        weather = weather_cache.get(key)
+        if weather is None:
+            weather = weather_requests.call(key, _fetch_weather, city, country)
+
+        return _format_weather(_display_name(city, country), weather)
+    except Exception as e:
+        raise ToolException(f"Unable to fetch real weather data for {city}: {str(e)}")
+
+async def aget_real_weather(city: str, country: str = "") -> WeatherResult:
+    """Get real weather data from OpenWeatherMap API without blocking the event loop."""
+    try:
+        key = _cache_key(city, country)
+        weather = await weather_cache.aget(key)
+        if weather is None:
+            weather = await weather_requests.acall(key, _afetch_weather, city, country)
+
+        return _format_weather(_display_name(city, country), weather)
     except Exception as e:
-        raise ToolException(f"Unable to fetch real weather data for {city}: {str(e)}") 
\ No newline at end of file
+        raise ToolException(f"Unable to fetch real weather data for {city}: {str(e)}")